@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Copyright 2025 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measure the cost of call-heavy snippets in the local interpreter, dominated by the safety checks of each call.
+
+Usage:
+    python benchmarks/local_python_executor_calls.py
+"""
+
+import time
+from textwrap import dedent
+
+from smolagents.local_python_executor import BASE_PYTHON_TOOLS, evaluate_python_code
+
+
+SNIPPETS = {
+    "builtin calls": dedent("""\
+        total = 0
+        for i in range(5000):
+            total += abs(min(i, 10)) + len(str(i))
+        """),
+    "function calls": dedent("""\
+        def add(a, b):
+            return a + b
+        total = 0
+        for i in range(5000):
+            total = add(total, i)
+        """),
+    "method calls": dedent("""\
+        values = []
+        for i in range(5000):
+            values.append(i)
+            values.pop()
+        """),
+    "module functions": dedent("""\
+        import math
+        total = 0
+        for i in range(5000):
+            total += math.floor(math.sqrt(i))
+        """),
+    "tool calls": dedent("""\
+        total = 0
+        for i in range(5000):
+            total += tool(i)
+        """),
+}
+
+
+def time_snippet(code: str, compile_code: bool, repeat: int = 10) -> float:
+    static_tools = {**BASE_PYTHON_TOOLS, "tool": lambda x: x}
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        evaluate_python_code(code, static_tools, state={}, compile_code=compile_code)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def main():
+    print(f"{'snippet':<16} {'ast':>10} {'compiled':>10}")
+    for name, code in SNIPPETS.items():
+        timings = [time_snippet(code, compile_code) for compile_code in [False, True]]
+        print(f"{name:<16}" + "".join(f"{timing * 1000:>8.1f}ms" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Copyright 2025 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measure how the cost of function calls and comprehensions in the local interpreter grows with the namespace size.
+
+Usage:
+    python benchmarks/local_python_executor_scopes.py
+"""
+
+import time
+from textwrap import dedent
+
+from smolagents.local_python_executor import BASE_PYTHON_TOOLS, evaluate_python_code
+
+
+SNIPPETS = {
+    "recursive function": dedent("""\
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+        result = fib(15)
+        """),
+    "list comprehension": "result = [x * 2 for x in range(5000) if x % 2]",
+    "dict comprehension": "result = {x: x * 2 for x in range(5000)}",
+    "lambda calls": "result = sorted(range(5000), key=lambda x: -x)",
+}
+NAMESPACE_SIZES = [0, 1_000, 10_000, 100_000]
+
+
+def time_snippet(code: str, namespace_size: int, compile_code: bool, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        state = {f"variable_{i}": i for i in range(namespace_size)}
+        start_time = time.perf_counter()
+        evaluate_python_code(code, dict(BASE_PYTHON_TOOLS), state=state, compile_code=compile_code)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def main():
+    print(f"{'snippet':<20} {'engine':<9}" + "".join(f"{f'{size:,} vars':>14}" for size in NAMESPACE_SIZES))
+    for name, code in SNIPPETS.items():
+        for compile_code in [False, True]:
+            timings = [time_snippet(code, size, compile_code) for size in NAMESPACE_SIZES]
+            engine = "compiled" if compile_code else "ast"
+            print(f"{name:<20} {engine:<9}" + "".join(f"{timing * 1000:>12.1f}ms" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
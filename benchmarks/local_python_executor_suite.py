@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Copyright 2025 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark typical agent snippets in each engine of the local interpreter, compared to native CPython.
+
+Runs offline. Reports the latency percentiles and the runs per second of each snippet, and optionally writes them to a
+JSON file to track them over time.
+
+Usage:
+    python benchmarks/local_python_executor_suite.py [--repeat 20] [--snippets loop ...] [--json results.json]
+    make benchmark
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from textwrap import dedent
+
+import smolagents
+from smolagents.local_python_executor import BASE_PYTHON_TOOLS, evaluate_python_code
+
+
+SNIPPETS = {
+    "loop": dedent("""\
+        total = 0
+        for i in range(10000):
+            if i % 3 == 0:
+                total += i
+        """),
+    "while loop": dedent("""\
+        n, steps = 27, 0
+        while n != 1:
+            n = n // 2 if n % 2 == 0 else 3 * n + 1
+            steps += 1
+        """),
+    "comprehensions": dedent("""\
+        squares = [x * x for x in range(5000) if x % 2]
+        index = {x: str(x) for x in range(2000)}
+        pairs = sum(1 for x in range(100) for y in range(20) if x > y)
+        """),
+    "string building": dedent("""\
+        lines = []
+        for i in range(2000):
+            lines.append(f"{i}: " + "item-" + str(i).zfill(5))
+        text = "\\n".join(lines).upper()
+        words = text.split()
+        """),
+    "recursive function": dedent("""\
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+        result = fib(16)
+        """),
+    "class definition": dedent("""\
+        class Point:
+            def __init__(self, x, y):
+                self.x = x
+                self.y = y
+
+            def norm(self):
+                return (self.x ** 2 + self.y ** 2) ** 0.5
+
+        points = [Point(i, i + 1) for i in range(1000)]
+        total = sum(point.norm() for point in points)
+        """),
+    "heavy print": dedent("""\
+        for i in range(2000):
+            print("Processing item", i, "of", 2000)
+        """),
+    "tool calls": dedent("""\
+        results = []
+        for i in range(2000):
+            results.append(tool(i))
+        """),
+    "numpy": dedent("""\
+        import numpy as np
+        array = np.arange(10000).reshape(100, 100)
+        result = float(array.dot(array.T).mean())
+        """),
+    "pandas": dedent("""\
+        import pandas as pd
+        frame = pd.DataFrame({"group": [i % 10 for i in range(5000)], "value": list(range(5000))})
+        summary = frame.groupby("group")["value"].agg(["mean", "max"])
+        """),
+}
+REQUIRED_MODULES = {"numpy": "numpy", "pandas": "pandas"}
+ENGINES = ["ast", "compiled", "native", "cpython"]
+
+
+def tool(x):
+    return x
+
+
+def run_snippet(code: str, engine: str):
+    if engine == "cpython":
+        namespace = {"tool": tool}
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(compile(code, "<snippet>", "exec"), namespace)
+        return
+    evaluate_python_code(
+        code,
+        {**BASE_PYTHON_TOOLS, "tool": tool},
+        state={},
+        authorized_imports=list(REQUIRED_MODULES),
+        compile_code=engine == "compiled",
+        native_code=engine == "native",
+    )
+
+
+def percentile(sorted_timings: list, fraction: float) -> float:
+    """Nearest-rank percentile of sorted timings."""
+    return sorted_timings[min(len(sorted_timings) - 1, max(0, round(fraction * len(sorted_timings)) - 1))]
+
+
+def time_snippet(code: str, engine: str, repeat: int) -> dict:
+    run_snippet(code, engine)  # Warm-up: imports and code caches
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        run_snippet(code, engine)
+        timings.append(time.perf_counter() - start_time)
+    timings.sort()
+    mean = statistics.fmean(timings)
+    return {
+        "runs": repeat,
+        "mean_ms": mean * 1000,
+        "p50_ms": percentile(timings, 0.5) * 1000,
+        "p90_ms": percentile(timings, 0.9) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "ops_per_sec": 1 / mean,
+    }
+
+
+def run_suite(snippets: list, engines: list, repeat: int) -> list:
+    results = []
+    for name in snippets:
+        module = REQUIRED_MODULES.get(name)
+        if module is not None and importlib.util.find_spec(module) is None:
+            print(f"Skipping {name}: {module} is not installed", file=sys.stderr)
+            continue
+        timings = {engine: time_snippet(SNIPPETS[name], engine, repeat) for engine in engines}
+        for engine, timing in timings.items():
+            if "cpython" in timings:
+                timing["slowdown_vs_cpython"] = timing["mean_ms"] / timings["cpython"]["mean_ms"]
+            results.append({"snippet": name, "engine": engine, **timing})
+    return results
+
+
+def print_results(results: list):
+    print(f"{'snippet':<20} {'engine':<9} {'p50':>10} {'p90':>10} {'p99':>10} {'runs/s':>10} {'vs cpython':>11}")
+    for result in results:
+        slowdown = result.get("slowdown_vs_cpython")
+        print(
+            f"{result['snippet']:<20} {result['engine']:<9}"
+            + "".join(f"{result[key]:>8.2f}ms" for key in ["p50_ms", "p90_ms", "p99_ms"])
+            + f"{result['ops_per_sec']:>11.1f}"
+            + (f"{slowdown:>11.1f}x" if slowdown is not None else "")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="Number of timed runs of each snippet and engine.")
+    parser.add_argument("--snippets", nargs="+", choices=list(SNIPPETS), default=list(SNIPPETS))
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--json", help="Path of a JSON file to write the results to.")
+    args = parser.parse_args()
+
+    results = run_suite(args.snippets, args.engines, args.repeat)
+    print_results(results)
+    if args.json:
+        report = {
+            "metadata": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "smolagents_version": smolagents.__version__,
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+from smolagents import launch_gradio_demo
+from tool import SuccessTool
+
+tool = SuccessTool()
+
+launch_gradio_demo(tool)
@@ -0,0 +1,21 @@
+from typing import Any, Optional
+from smolagents.tools import Tool
+import numpy
+
+class SuccessTool(Tool):
+    name = "specific"
+    description = "test description"
+    inputs = {'string_input': {'type': 'string', 'description': 'input description'}}
+    output_type = "string"
+
+    def useless_method(self):
+        import numpy as np
+
+        self.client = np.random.random()
+        return ""
+
+    def forward(self, string_input):
+        return self.useless_method() + string_input
+
+    def __init__(self, *args, **kwargs):
+        self.is_initialized = False
@@ -14,18 +14,23 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
+import contextvars
 import importlib
 import inspect
 import json
 import os
+import queue
 import re
 import tempfile
 import textwrap
+import threading
 import time
 from collections import deque
+from functools import partial
 from logging import getLogger
 from pathlib import Path
-from typing import Any, Callable, Dict, Generator, List, Optional, Set, Tuple, TypedDict, Union
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Set, Tuple, TypedDict, Union
 
 import jinja2
 import yaml
@@ -38,8 +43,25 @@ from rich.text import Text
 
 from .agent_types import AgentAudio, AgentImage, AgentType, handle_agent_output_types
 from .default_tools import TOOL_MAPPING, FinalAnswerTool
-from .local_python_executor import BASE_BUILTIN_MODULES, LocalPythonExecutor, PythonExecutor, fix_final_answer_code
-from .memory import ActionStep, AgentMemory, PlanningStep, SystemPromptStep, TaskStep, ToolCall
+from .local_python_executor import (
+    BASE_BUILTIN_MODULES,
+    DEFAULT_PARALLEL_WORKERS,
+    LocalPythonExecutor,
+    PythonExecutor,
+    fix_final_answer_code,
+    run_concurrently,
+)
+from .memory import (
+    ActionStep,
+    AgentMemory,
+    ContextCompactor,
+    ExecutionLogsDelta,
+    PlanningStep,
+    SystemPromptStep,
+    TaskStep,
+    ToolCall,
+    get_token_counter,
+)
 from .models import (
     ChatMessage,
     MessageRole,
@@ -51,7 +73,7 @@ from .monitoring import (
     LogLevel,
     Monitor,
 )
-from .remote_executors import DockerExecutor, E2BExecutor
+from .remote_executors import DockerExecutor, E2BExecutor, SubprocessExecutor
 from .tools import Tool
 from .utils import (
     AgentError,
@@ -182,6 +204,9 @@ class MultiStepAgent:
         description (`str`, *optional*): Necessary for a managed agent only - the description of this agent.
         provide_run_summary (`bool`, *optional*): Whether to provide a run summary when called as a managed agent.
         final_answer_checks (`list`, *optional*): List of Callables to run before returning a final answer for checking validity.
+        max_context_tokens (`int`, *optional*): Token budget of the messages written from memory: older observations
+            are compacted to fit it, see [`ContextCompactor`]. Tokens are counted with the tokenizer of the model if it
+            has one. No limit if unset.
     """
 
     def __init__(
@@ -201,6 +226,7 @@ class MultiStepAgent:
         description: Optional[str] = None,
         provide_run_summary: bool = False,
         final_answer_checks: Optional[List[Callable]] = None,
+        max_context_tokens: Optional[int] = None,
     ):
         self.agent_name = self.__class__.__name__
         self.model = model
@@ -224,6 +250,8 @@ class MultiStepAgent:
         self.input_messages = None
         self.task = None
         self.memory = AgentMemory(self.system_prompt)
+        if max_context_tokens is not None:
+            self.memory.context_compactor = ContextCompactor(max_context_tokens, count_tokens=get_token_counter(model))
         self.logger = AgentLogger(level=verbosity_level)
         self.monitor = Monitor(self.model, self.logger)
         self.step_callbacks = step_callbacks if step_callbacks is not None else []
@@ -290,6 +318,59 @@ class MultiStepAgent:
         ```
         """
         max_steps = max_steps or self.max_steps
+        self._setup_run(task, reset, images, additional_args)
+        if stream:
+            # The steps are returned as they are executed through a generator to iterate on.
+            return self._run(task=self.task, max_steps=max_steps, images=images)
+        # Outputs are returned only at the end. We only look at the last step.
+        return deque(self._run(task=self.task, max_steps=max_steps, images=images), maxlen=1)[0]
+
+    async def arun(
+        self,
+        task: str,
+        reset: bool = True,
+        images: Optional[List[str]] = None,
+        additional_args: Optional[Dict] = None,
+        max_steps: Optional[int] = None,
+    ):
+        """
+        Run the agent for the given task from an event loop, see `run` for the arguments.
+
+        The model and the tools are awaited when they support it, see [`Model.acall`] and [`Tool.acall`], so that one
+        event loop can run many agents concurrently. Other calls, like planning steps and code execution, run in worker
+        threads.
+
+        Example:
+        ```py
+        from smolagents import ToolCallingAgent
+        agent = ToolCallingAgent(tools=[])
+        await agent.arun("What is the result of 2 power 3.7384?")
+        ```
+        """
+        output = None
+        async for output in self.astream(
+            task, reset=reset, images=images, additional_args=additional_args, max_steps=max_steps
+        ):
+            pass
+        return output
+
+    def astream(
+        self,
+        task: str,
+        reset: bool = True,
+        images: Optional[List[str]] = None,
+        additional_args: Optional[Dict] = None,
+        max_steps: Optional[int] = None,
+    ) -> AsyncGenerator[ActionStep | AgentType, None]:
+        """
+        Run the agent for the given task from an event loop, like `arun`, returning an async generator of the steps
+        as they are executed, followed by the final answer.
+        """
+        max_steps = max_steps or self.max_steps
+        self._setup_run(task, reset, images, additional_args)
+        return self._arun(task=self.task, max_steps=max_steps, images=images)
+
+    def _setup_run(self, task: str, reset: bool, images: Optional[List[str]], additional_args: Optional[Dict]):
         self.task = task
         if additional_args is not None:
             self.state.update(additional_args)
@@ -315,12 +396,6 @@ You have been provided with these additional arguments, that you can access usin
             self.python_executor.send_variables(variables=self.state)
             self.python_executor.send_tools({**self.tools, **self.managed_agents})
 
-        if stream:
-            # The steps are returned as they are executed through a generator to iterate on.
-            return self._run(task=self.task, max_steps=max_steps, images=images)
-        # Outputs are returned only at the end. We only look at the last step.
-        return deque(self._run(task=self.task, max_steps=max_steps, images=images), maxlen=1)[0]
-
     def _run(
         self, task: str, max_steps: int, images: List[str] | None = None
     ) -> Generator[ActionStep | AgentType, None, None]:
@@ -343,6 +418,29 @@ You have been provided with these additional arguments, that you can access usin
             yield memory_step
         yield handle_agent_output_types(final_answer)
 
+    async def _arun(
+        self, task: str, max_steps: int, images: List[str] | None = None
+    ) -> AsyncGenerator[ActionStep | AgentType, None]:
+        final_answer = None
+        self.step_number = 1
+        while final_answer is None and self.step_number <= max_steps:
+            step_start_time = time.time()
+            memory_step = self._create_memory_step(step_start_time, images)
+            try:
+                final_answer = await self._aexecute_step(task, memory_step)
+            except AgentError as e:
+                memory_step.error = e
+            finally:
+                self._finalize_step(memory_step, step_start_time)
+            yield memory_step
+            self.step_number += 1
+
+        if final_answer is None and self.step_number == max_steps + 1:
+            final_answer = await self.aprovide_final_answer(task, images)
+            self._record_max_steps_step(final_answer, step_start_time)
+            yield memory_step
+        yield handle_agent_output_types(final_answer)
+
     def _create_memory_step(self, step_start_time: float, images: List[str] | None) -> ActionStep:
         return ActionStep(step_number=self.step_number, start_time=step_start_time, observations_images=images)
 
@@ -355,6 +453,17 @@ You have been provided with these additional arguments, that you can access usin
             self._validate_final_answer(final_answer)
         return final_answer
 
+    async def _aexecute_step(self, task: str, memory_step: ActionStep) -> Union[None, Any]:
+        if self.planning_interval is not None and self.step_number % self.planning_interval == 1:
+            await asyncio.to_thread(
+                self.planning_step, task, is_first_step=(self.step_number == 1), step=self.step_number
+            )
+        self.logger.log_rule(f"Step {self.step_number}", level=LogLevel.INFO)
+        final_answer = await self.astep(memory_step)
+        if final_answer is not None and self.final_answer_checks:
+            self._validate_final_answer(final_answer)
+        return final_answer
+
     def _validate_final_answer(self, final_answer: Any):
         for check_function in self.final_answer_checks:
             try:
@@ -374,6 +483,10 @@ You have been provided with these additional arguments, that you can access usin
 
     def _handle_max_steps_reached(self, task: str, images: List[str], step_start_time: float) -> Any:
         final_answer = self.provide_final_answer(task, images)
+        self._record_max_steps_step(final_answer, step_start_time)
+        return final_answer
+
+    def _record_max_steps_step(self, final_answer: Any, step_start_time: float):
         final_memory_step = ActionStep(
             step_number=self.step_number, error=AgentMaxStepsError("Reached max steps.", self.logger)
         )
@@ -385,7 +498,6 @@ You have been provided with these additional arguments, that you can access usin
             callback(final_memory_step) if len(inspect.signature(callback).parameters) == 1 else callback(
                 final_memory_step, agent=self
             )
-        return final_answer
 
     def planning_step(self, task, is_first_step: bool, step: int) -> None:
         input_messages, facts_message, plan_message = (
@@ -525,11 +637,10 @@ You have been provided with these additional arguments, that you can access usin
         Reads past llm_outputs, actions, and observations or errors from the memory into a series of messages
         that can be used as input to the LLM. Adds a number of keywords (such as PLAN, error, etc) to help
         the LLM.
+
+        The messages of the steps are rendered once and cached by the memory, see [`AgentMemory.get_messages`].
         """
-        messages = self.memory.system_prompt.to_messages(summary_mode=summary_mode)
-        for memory_step in self.memory.steps:
-            messages.extend(memory_step.to_messages(summary_mode=summary_mode))
-        return messages
+        return self.memory.get_messages(summary_mode=bool(summary_mode))
 
     def visualize(self):
         """Creates a rich tree visualization of the agent's structure."""
@@ -567,6 +678,21 @@ You have been provided with these additional arguments, that you can access usin
         Returns:
             `str`: Final answer to the task.
         """
+        try:
+            chat_message: ChatMessage = self.model(self._get_final_answer_messages(task, images))
+            return chat_message.content
+        except Exception as e:
+            return f"Error in generating final LLM output:\n{e}"
+
+    async def aprovide_final_answer(self, task: str, images: Optional[list[str]]) -> str:
+        """Async counterpart of `provide_final_answer`."""
+        try:
+            chat_message: ChatMessage = await self._agenerate(self._get_final_answer_messages(task, images))
+            return chat_message.content
+        except Exception as e:
+            return f"Error in generating final LLM output:\n{e}"
+
+    def _get_final_answer_messages(self, task: str, images: Optional[list[str]]) -> List[Dict[str, Any]]:
         messages = [
             {
                 "role": MessageRole.SYSTEM,
@@ -594,11 +720,17 @@ You have been provided with these additional arguments, that you can access usin
                 ],
             }
         ]
-        try:
-            chat_message: ChatMessage = self.model(messages)
-            return chat_message.content
-        except Exception as e:
-            return f"Error in generating final LLM output:\n{e}"
+        return messages
+
+    async def _agenerate(self, messages: List[Dict[str, Any]], **kwargs) -> ChatMessage:
+        """Calls the model from an event loop: awaits its `acall` method if it has one, else calls it in a thread."""
+        if hasattr(self.model, "acall"):
+            return await self.model.acall(messages, **kwargs)
+        if inspect.iscoroutinefunction(self.model) or inspect.iscoroutinefunction(
+            getattr(self.model, "__call__", None)
+        ):
+            return await self.model(messages, **kwargs)
+        return await asyncio.to_thread(partial(self.model, messages, **kwargs))
 
     def execute_tool_call(self, tool_name: str, arguments: Union[Dict[str, str], str]) -> Any:
         """
@@ -609,48 +741,78 @@ You have been provided with these additional arguments, that you can access usin
             tool_name (`str`): Name of the Tool to execute (should be one from self.tools).
             arguments (Dict[str, str]): Arguments passed to the Tool.
         """
+        tool = self._get_tool(tool_name)
+        try:
+            args, kwargs = self._prepare_tool_arguments(tool_name, arguments)
+            return tool(*args, **kwargs)
+        except Exception as e:
+            raise self._get_tool_call_error(tool_name, arguments, e)
+
+    async def aexecute_tool_call(self, tool_name: str, arguments: Union[Dict[str, str], str]) -> Any:
+        """
+        Async counterpart of `execute_tool_call`: tools and managed agents are awaited through their `acall` method.
+        """
+        tool = self._get_tool(tool_name)
+        try:
+            args, kwargs = self._prepare_tool_arguments(tool_name, arguments)
+            if hasattr(tool, "acall"):
+                return await tool.acall(*args, **kwargs)
+            return await asyncio.to_thread(partial(tool, *args, **kwargs))
+        except Exception as e:
+            raise self._get_tool_call_error(tool_name, arguments, e)
+
+    def _get_tool(self, tool_name: str) -> Union[Tool, "MultiStepAgent"]:
         available_tools = {**self.tools, **self.managed_agents}
         if tool_name not in available_tools:
             error_msg = f"Unknown tool {tool_name}, should be instead one of {list(available_tools.keys())}."
             raise AgentExecutionError(error_msg, self.logger)
+        return available_tools[tool_name]
+
+    def _prepare_tool_arguments(self, tool_name: str, arguments: Union[Dict[str, str], str]) -> Tuple[tuple, dict]:
+        extra_kwargs = {} if tool_name in self.managed_agents else {"sanitize_inputs_outputs": True}
+        if isinstance(arguments, str):
+            return (arguments,), extra_kwargs
+        elif isinstance(arguments, dict):
+            for key, value in arguments.items():
+                if isinstance(value, str) and value in self.state:
+                    arguments[key] = self.state[value]
+            return (), {**arguments, **extra_kwargs}
+        else:
+            error_msg = f"Arguments passed to tool should be a dict or string: got a {type(arguments)}."
+            raise AgentExecutionError(error_msg, self.logger)
 
-        try:
-            if isinstance(arguments, str):
-                if tool_name in self.managed_agents:
-                    observation = available_tools[tool_name].__call__(arguments)
-                else:
-                    observation = available_tools[tool_name].__call__(arguments, sanitize_inputs_outputs=True)
-            elif isinstance(arguments, dict):
-                for key, value in arguments.items():
-                    if isinstance(value, str) and value in self.state:
-                        arguments[key] = self.state[value]
-                if tool_name in self.managed_agents:
-                    observation = available_tools[tool_name].__call__(**arguments)
-                else:
-                    observation = available_tools[tool_name].__call__(**arguments, sanitize_inputs_outputs=True)
-            else:
-                error_msg = f"Arguments passed to tool should be a dict or string: got a {type(arguments)}."
-                raise AgentExecutionError(error_msg, self.logger)
-            return observation
-        except Exception as e:
-            if tool_name in self.tools:
-                tool = self.tools[tool_name]
-                error_msg = (
-                    f"Error when executing tool {tool_name} with arguments {arguments}: {type(e).__name__}: {e}\nYou should only use this tool with a correct input.\n"
-                    f"As a reminder, this tool's description is the following: '{tool.description}'.\nIt takes inputs: {tool.inputs} and returns output type {tool.output_type}"
-                )
-                raise AgentExecutionError(error_msg, self.logger)
-            elif tool_name in self.managed_agents:
-                error_msg = (
-                    f"Error in calling team member: {e}\nYou should only ask this team member with a correct request.\n"
-                    f"As a reminder, this team member's description is the following:\n{available_tools[tool_name]}"
-                )
-                raise AgentExecutionError(error_msg, self.logger)
+    def _get_tool_call_error(self, tool_name: str, arguments: Any, error: Exception) -> AgentExecutionError:
+        if tool_name in self.tools:
+            tool = self.tools[tool_name]
+            error_msg = (
+                f"Error when executing tool {tool_name} with arguments {arguments}: {type(error).__name__}: {error}\nYou should only use this tool with a correct input.\n"
+                f"As a reminder, this tool's description is the following: '{tool.description}'.\nIt takes inputs: {tool.inputs} and returns output type {tool.output_type}"
+            )
+        else:
+            error_msg = (
+                f"Error in calling team member: {error}\nYou should only ask this team member with a correct request.\n"
+                f"As a reminder, this team member's description is the following:\n{self.managed_agents[tool_name]}"
+            )
+        return AgentExecutionError(error_msg, self.logger)
 
     def step(self, memory_step: ActionStep) -> Union[None, Any]:
         """To be implemented in children classes. Should return either None if the step is not final."""
         pass
 
+    async def astep(self, memory_step: ActionStep) -> Union[None, Any]:
+        """
+        Async counterpart of `step`, used by `arun`. Children classes can implement it to await the model and the
+        tools, by default `step` is run in a worker thread.
+        """
+        return await asyncio.to_thread(self.step, memory_step)
+
+    def _start_step(self, memory_step: ActionStep) -> List[Dict[str, Any]]:
+        memory_messages = self.write_memory_to_messages()
+        self.input_messages = memory_messages.copy()
+        # Add new step in logs
+        memory_step.model_input_messages = self.memory.reference_messages(memory_messages)
+        return memory_messages
+
     def replay(self, detailed: bool = False):
         """Prints a pretty replay of the agent's steps.
 
@@ -664,11 +826,21 @@ You have been provided with these additional arguments, that you can access usin
         """Adds additional prompting for the managed agent, runs it, and wraps the output.
         This method is called only by a managed agent.
         """
-        full_task = populate_template(
+        report = self.run(self._get_managed_agent_task(task), **kwargs)
+        return self._get_managed_agent_answer(report)
+
+    async def acall(self, task: str, **kwargs):
+        """Async counterpart of `__call__`, called by a manager agent run with `arun`."""
+        report = await self.arun(self._get_managed_agent_task(task), **kwargs)
+        return self._get_managed_agent_answer(report)
+
+    def _get_managed_agent_task(self, task: str) -> str:
+        return populate_template(
             self.prompt_templates["managed_agent"]["task"],
             variables=dict(name=self.name, task=task),
         )
-        report = self.run(full_task, **kwargs)
+
+    def _get_managed_agent_answer(self, report: Any) -> str:
         answer = populate_template(
             self.prompt_templates["managed_agent"]["report"], variables=dict(name=self.name, final_answer=report)
         )
@@ -1005,6 +1177,9 @@ class ToolCallingAgent(MultiStepAgent):
         model (`Callable[[list[dict[str, str]]], ChatMessage]`): Model that will generate the agent's actions.
         prompt_templates ([`~agents.PromptTemplates`], *optional*): Prompt templates.
         planning_interval (`int`, *optional*): Interval at which the agent will run a planning step.
+        max_tool_threads (`int`, *optional*): Maximum number of threads running the tool calls returned by the model
+            in one step concurrently. Only the calls to tools declaring themselves `thread_safe` run concurrently, the
+            calls to each other tool or managed agent run one after the other. Defaults to 8.
         **kwargs: Additional keyword arguments.
     """
 
@@ -1014,8 +1189,10 @@ class ToolCallingAgent(MultiStepAgent):
         model: Callable[[List[Dict[str, str]]], ChatMessage],
         prompt_templates: Optional[PromptTemplates] = None,
         planning_interval: Optional[int] = None,
+        max_tool_threads: Optional[int] = None,
         **kwargs,
     ):
+        self.max_tool_threads = max_tool_threads or DEFAULT_PARALLEL_WORKERS
         prompt_templates = prompt_templates or yaml.safe_load(
             importlib.resources.files("smolagents.prompts").joinpath("toolcalling_agent.yaml").read_text()
         )
@@ -1039,83 +1216,209 @@ class ToolCallingAgent(MultiStepAgent):
         Perform one step in the ReAct framework: the agent thinks, acts, and observes the result.
         Returns None if the step is not final.
         """
-        memory_messages = self.write_memory_to_messages()
-
-        self.input_messages = memory_messages
-
-        # Add new step in logs
-        memory_step.model_input_messages = memory_messages.copy()
-
+        memory_messages = self._start_step(memory_step)
         try:
             model_message: ChatMessage = self.model(
                 memory_messages,
                 tools_to_call_from=list(self.tools.values()),
                 stop_sequences=["Observation:"],
             )
-            memory_step.model_output_message = model_message
-            if model_message.tool_calls is None or len(model_message.tool_calls) == 0:
-                raise Exception("Model did not call any tools. Call `final_answer` tool to return a final answer.")
-            tool_call = model_message.tool_calls[0]
-            tool_name, tool_call_id = tool_call.function.name, tool_call.id
-            tool_arguments = tool_call.function.arguments
+        except Exception as e:
+            raise AgentGenerationError(f"Error in generating tool call with model:\n{e}", self.logger) from e
 
+        final_answer_call, other_calls = self._parse_tool_calls(memory_step, model_message)
+        if other_calls:
+            self.execute_tool_calls(memory_step, other_calls)
+        return self._get_final_answer(memory_step, final_answer_call)
+
+    async def astep(self, memory_step: ActionStep) -> Union[None, Any]:
+        """Async counterpart of `step`: the model and the tools are awaited."""
+        memory_messages = self._start_step(memory_step)
+        try:
+            model_message: ChatMessage = await self._agenerate(
+                memory_messages,
+                tools_to_call_from=list(self.tools.values()),
+                stop_sequences=["Observation:"],
+            )
         except Exception as e:
             raise AgentGenerationError(f"Error in generating tool call with model:\n{e}", self.logger) from e
 
-        memory_step.tool_calls = [ToolCall(name=tool_name, arguments=tool_arguments, id=tool_call_id)]
+        final_answer_call, other_calls = self._parse_tool_calls(memory_step, model_message)
+        if other_calls:
+            await self.aexecute_tool_calls(memory_step, other_calls)
+        return self._get_final_answer(memory_step, final_answer_call)
+
+    def _parse_tool_calls(
+        self, memory_step: ActionStep, model_message: ChatMessage
+    ) -> Tuple[Optional[ToolCall], List[ToolCall]]:
+        """Records the tool calls of the model message, and returns its final answer call if any and the other calls."""
+        memory_step.model_output_message = model_message
+        if model_message.tool_calls is None or len(model_message.tool_calls) == 0:
+            raise AgentGenerationError(
+                "Error in generating tool call with model:\n"
+                "Model did not call any tools. Call `final_answer` tool to return a final answer.",
+                self.logger,
+            )
+        tool_calls = [
+            ToolCall(name=tool_call.function.name, arguments=tool_call.function.arguments, id=tool_call.id)
+            for tool_call in model_message.tool_calls
+        ]
+        memory_step.tool_calls = tool_calls
 
-        # Execute
-        self.logger.log(
-            Panel(Text(f"Calling tool: '{tool_name}' with arguments: {tool_arguments}")),
-            level=LogLevel.INFO,
-        )
-        if tool_name == "final_answer":
-            if isinstance(tool_arguments, dict):
-                if "answer" in tool_arguments:
-                    answer = tool_arguments["answer"]
-                else:
-                    answer = tool_arguments
+        for tool_call in tool_calls:
+            self.logger.log(
+                Panel(Text(f"Calling tool: '{tool_call.name}' with arguments: {tool_call.arguments}")),
+                level=LogLevel.INFO,
+            )
+        final_answer_calls = [tool_call for tool_call in tool_calls if tool_call.name == "final_answer"]
+        if len(final_answer_calls) > 1:
+            raise AgentExecutionError("Only one final answer should be returned, but several were.", self.logger)
+        other_calls = [tool_call for tool_call in tool_calls if tool_call.name != "final_answer"]
+        return (final_answer_calls[0] if final_answer_calls else None), other_calls
+
+    def _get_final_answer(self, memory_step: ActionStep, final_answer_call: Optional[ToolCall]) -> Any:
+        if final_answer_call is None:
+            return None
+        final_answer = self.extract_final_answer(final_answer_call.arguments)
+        memory_step.action_output = final_answer
+        return final_answer
+
+    def extract_final_answer(self, tool_arguments: Any) -> Any:
+        if isinstance(tool_arguments, dict):
+            if "answer" in tool_arguments:
+                answer = tool_arguments["answer"]
             else:
                 answer = tool_arguments
-            if (
-                isinstance(answer, str) and answer in self.state.keys()
-            ):  # if the answer is a state variable, return the value
-                final_answer = self.state[answer]
-                self.logger.log(
-                    f"[bold {YELLOW_HEX}]Final answer:[/bold {YELLOW_HEX}] Extracting key '{answer}' from state to return value '{final_answer}'.",
-                    level=LogLevel.INFO,
-                )
-            else:
-                final_answer = answer
-                self.logger.log(
-                    Text(f"Final answer: {final_answer}", style=f"bold {YELLOW_HEX}"),
-                    level=LogLevel.INFO,
-                )
+        else:
+            answer = tool_arguments
+        if (
+            isinstance(answer, str) and answer in self.state.keys()
+        ):  # if the answer is a state variable, return the value
+            final_answer = self.state[answer]
+            self.logger.log(
+                f"[bold {YELLOW_HEX}]Final answer:[/bold {YELLOW_HEX}] Extracting key '{answer}' from state to return value '{final_answer}'.",
+                level=LogLevel.INFO,
+            )
+        else:
+            final_answer = answer
+            self.logger.log(
+                Text(f"Final answer: {final_answer}", style=f"bold {YELLOW_HEX}"),
+                level=LogLevel.INFO,
+            )
+        return final_answer
+
+    def execute_tool_calls(self, memory_step: ActionStep, tool_calls: List[ToolCall]):
+        """
+        Executes the tool calls and records their observations in the memory step, each preceded by its call id. Calls
+        to tools declaring themselves `thread_safe` run concurrently on at most `max_tool_threads` threads, while the
+        calls to each other tool or managed agent run one after the other, see `_group_tool_calls`. If calls fail, the
+        observations of the successful ones are still recorded, then the error of the first failing call is raised.
+        """
+
+        def execute(tool_call: ToolCall) -> Tuple[Any, Optional[AgentExecutionError]]:
+            try:
+                return self.execute_tool_call(tool_call.name, tool_call.arguments or {}), None
+            except AgentExecutionError as e:
+                return None, e
 
-            memory_step.action_output = final_answer
-            return final_answer
+        def execute_group(indices: List[int]) -> List[Tuple[Any, Optional[AgentExecutionError]]]:
+            return [execute(tool_calls[index]) for index in indices]
+
+        groups = self._group_tool_calls(tool_calls)
+        if len(groups) == 1:
+            group_outcomes = [execute_group(groups[0])]
         else:
-            if tool_arguments is None:
-                tool_arguments = {}
-            observation = self.execute_tool_call(tool_name, tool_arguments)
-            observation_type = type(observation)
-            if observation_type in [AgentImage, AgentAudio]:
-                if observation_type == AgentImage:
-                    observation_name = "image.png"
-                elif observation_type == AgentAudio:
-                    observation_name = "audio.mp3"
-                # TODO: observation naming could allow for different names of same type
-
-                self.state[observation_name] = observation
-                updated_information = f"Stored '{observation_name}' in memory."
+            calls = [partial(execute_group, indices) for indices in groups]
+            group_outcomes = [future.result() for future in run_concurrently(calls, self.max_tool_threads)]
+        self._record_tool_outcomes(memory_step, tool_calls, self._ungroup_outcomes(groups, group_outcomes))
+
+    async def aexecute_tool_calls(self, memory_step: ActionStep, tool_calls: List[ToolCall]):
+        """
+        Async counterpart of `execute_tool_calls`: the groups of tool calls are awaited concurrently, at most
+        `max_tool_threads` at a time.
+        """
+        semaphore = asyncio.Semaphore(self.max_tool_threads)
+
+        async def execute_group(indices: List[int]) -> List[Tuple[Any, Optional[AgentExecutionError]]]:
+            outcomes = []
+            async with semaphore:
+                for index in indices:
+                    tool_call = tool_calls[index]
+                    try:
+                        outcomes.append(
+                            (await self.aexecute_tool_call(tool_call.name, tool_call.arguments or {}), None)
+                        )
+                    except AgentExecutionError as e:
+                        outcomes.append((None, e))
+            return outcomes
+
+        groups = self._group_tool_calls(tool_calls)
+        group_outcomes = await asyncio.gather(*[execute_group(indices) for indices in groups])
+        self._record_tool_outcomes(memory_step, tool_calls, self._ungroup_outcomes(groups, group_outcomes))
+
+    def _group_tool_calls(self, tool_calls: List[ToolCall]) -> List[List[int]]:
+        """
+        Returns the indices of the tool calls in groups that can run concurrently: each call to a `thread_safe` tool is
+        a group of its own, and the calls to any other tool or managed agent, which may be stateful, form one group.
+        """
+        groups, groups_by_name = [], {}
+        for index, tool_call in enumerate(tool_calls):
+            if getattr(self.tools.get(tool_call.name), "thread_safe", False):
+                groups.append([index])
+            elif tool_call.name in groups_by_name:
+                groups_by_name[tool_call.name].append(index)
             else:
-                updated_information = str(observation).strip()
+                groups_by_name[tool_call.name] = [index]
+                groups.append(groups_by_name[tool_call.name])
+        return groups
+
+    @staticmethod
+    def _ungroup_outcomes(
+        groups: List[List[int]], group_outcomes: List[List[Tuple[Any, Optional[AgentExecutionError]]]]
+    ) -> List[Tuple[Any, Optional[AgentExecutionError]]]:
+        outcomes = [None] * sum(len(indices) for indices in groups)
+        for indices, outcomes_of_group in zip(groups, group_outcomes):
+            for index, outcome in zip(indices, outcomes_of_group):
+                outcomes[index] = outcome
+        return outcomes
+
+    def _record_tool_outcomes(
+        self,
+        memory_step: ActionStep,
+        tool_calls: List[ToolCall],
+        outcomes: List[Tuple[Any, Optional[AgentExecutionError]]],
+    ):
+        observations = []
+        for tool_call, (observation, error) in zip(tool_calls, outcomes):
+            if error is not None:
+                continue
+            updated_information = self.process_tool_observation(observation)
             self.logger.log(
                 f"Observations: {updated_information.replace('[', '|')}",  # escape potential rich-tag-like components
                 level=LogLevel.INFO,
             )
-            memory_step.observations = updated_information
-            return None
+            if len(tool_calls) > 1:
+                updated_information = f"Call id: {tool_call.id}\n{updated_information}"
+            observations.append(updated_information)
+        if observations:
+            memory_step.observations = "\n\n".join(observations)
+        for tool_call, (_, error) in zip(tool_calls, outcomes):
+            if error is not None:
+                memory_step.error_tool_call_id = tool_call.id
+                raise error
+
+    def process_tool_observation(self, observation: Any) -> str:
+        observation_type = type(observation)
+        if observation_type in [AgentImage, AgentAudio]:
+            if observation_type == AgentImage:
+                observation_name = "image.png"
+            elif observation_type == AgentAudio:
+                observation_name = "audio.mp3"
+            # TODO: observation naming could allow for different names of same type
+
+            self.state[observation_name] = observation
+            return f"Stored '{observation_name}' in memory."
+        return str(observation).strip()
 
 
 class CodeAgent(MultiStepAgent):
@@ -1129,9 +1432,12 @@ class CodeAgent(MultiStepAgent):
         grammar (`dict[str, str]`, *optional*): Grammar used to parse the LLM output.
         additional_authorized_imports (`list[str]`, *optional*): Additional authorized imports for the agent.
         planning_interval (`int`, *optional*): Interval at which the agent will run a planning step.
-        executor_type (`str`, default `"local"`): Which executor type to use between `"local"`, `"e2b"`, or `"docker"`.
+        executor_type (`str`, default `"local"`): Which executor type to use between `"local"`, `"subprocess"`, `"e2b"`,
+            or `"docker"`. `"subprocess"` runs the local interpreter in a pool of worker processes.
         executor_kwargs (`dict`, *optional*): Additional arguments to pass to initialize the executor.
         max_print_outputs_length (`int`, *optional*): Maximum length of the print outputs.
+        stream_outputs (`bool`, default `False`): Whether `run(stream=True)` should also yield the print outputs of
+            the code actions as [`~memory.ExecutionLogsDelta`] while they are running, instead of only the final steps.
         **kwargs: Additional keyword arguments.
 
     """
@@ -1147,11 +1453,13 @@ class CodeAgent(MultiStepAgent):
         executor_type: str = "local",
         executor_kwargs: Optional[Dict[str, Any]] = None,
         max_print_outputs_length: Optional[int] = None,
+        stream_outputs: bool = False,
         **kwargs,
     ):
         self.additional_authorized_imports = additional_authorized_imports if additional_authorized_imports else []
         self.authorized_imports = list(set(BASE_BUILTIN_MODULES) | set(self.additional_authorized_imports))
         self.max_print_outputs_length = max_print_outputs_length
+        self.stream_outputs = stream_outputs
         prompt_templates = prompt_templates or yaml.safe_load(
             importlib.resources.files("smolagents.prompts").joinpath("code_agent.yaml").read_text()
         )
@@ -1185,10 +1493,65 @@ class CodeAgent(MultiStepAgent):
                 return LocalPythonExecutor(
                     self.additional_authorized_imports,
                     max_print_outputs_length=self.max_print_outputs_length,
+                    **kwargs,
+                )
+            case "subprocess":
+                return SubprocessExecutor(
+                    self.additional_authorized_imports,
+                    max_print_outputs_length=self.max_print_outputs_length,
+                    **kwargs,
                 )
             case _:  # if applicable
                 raise ValueError(f"Unsupported executor type: {executor_type}")
 
+    def _run(
+        self, task: str, max_steps: int, images: List[str] | None = None
+    ) -> Generator[ActionStep | ExecutionLogsDelta | AgentType, None, None]:
+        if not self.stream_outputs:
+            yield from super()._run(task, max_steps, images)
+            return
+
+        # The steps run in a background thread, so that print outputs can be yielded while the code is running
+        outputs = queue.Queue()
+        run_finished = object()
+        # Like a generator, the thread only runs the next step once the consumer asks for it, and stops if the
+        # consumer stops iterating
+        step_consumed = threading.Semaphore(0)
+        stop_requested = threading.Event()
+
+        def run_steps():
+            steps = MultiStepAgent._run(self, task, max_steps, images)
+            try:
+                for step in steps:
+                    outputs.put(step)
+                    step_consumed.acquire()
+                    if stop_requested.is_set():
+                        break
+            except Exception as e:
+                outputs.put(e)
+            finally:
+                steps.close()
+                outputs.put(run_finished)
+
+        previous_output_sink = self.python_executor.output_sink
+        self.python_executor.output_sink = lambda text: outputs.put(
+            ExecutionLogsDelta(step_number=self.step_number, content=text)
+        )
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(run_steps,), daemon=True)
+        try:
+            thread.start()
+            while (output := outputs.get()) is not run_finished:
+                if isinstance(output, Exception):
+                    raise output
+                yield output
+                if not isinstance(output, ExecutionLogsDelta):
+                    step_consumed.release()
+        finally:
+            stop_requested.set()
+            step_consumed.release()
+            thread.join()
+            self.python_executor.output_sink = previous_output_sink
+
     def initialize_system_prompt(self) -> str:
         system_prompt = populate_template(
             self.prompt_templates["system_prompt"],
@@ -1209,12 +1572,7 @@ class CodeAgent(MultiStepAgent):
         Perform one step in the ReAct framework: the agent thinks, acts, and observes the result.
         Returns None if the step is not final.
         """
-        memory_messages = self.write_memory_to_messages()
-
-        self.input_messages = memory_messages.copy()
-
-        # Add new step in logs
-        memory_step.model_input_messages = memory_messages.copy()
+        self._start_step(memory_step)
         try:
             additional_args = {"grammar": self.grammar} if self.grammar is not None else {}
             chat_message: ChatMessage = self.model(
@@ -1222,11 +1580,30 @@ class CodeAgent(MultiStepAgent):
                 stop_sequences=["<end_code>", "Observation:"],
                 **additional_args,
             )
-            memory_step.model_output_message = chat_message
-            model_output = chat_message.content
-            memory_step.model_output = model_output
         except Exception as e:
             raise AgentGenerationError(f"Error in generating model output:\n{e}", self.logger) from e
+        code_action = self._parse_code_action(memory_step, chat_message)
+        return self._execute_code_action(memory_step, code_action)
+
+    async def astep(self, memory_step: ActionStep) -> Union[None, Any]:
+        """Async counterpart of `step`: the model is awaited, and the code is executed in a worker thread."""
+        self._start_step(memory_step)
+        try:
+            additional_args = {"grammar": self.grammar} if self.grammar is not None else {}
+            chat_message: ChatMessage = await self._agenerate(
+                self.input_messages,
+                stop_sequences=["<end_code>", "Observation:"],
+                **additional_args,
+            )
+        except Exception as e:
+            raise AgentGenerationError(f"Error in generating model output:\n{e}", self.logger) from e
+        code_action = self._parse_code_action(memory_step, chat_message)
+        return await asyncio.to_thread(self._execute_code_action, memory_step, code_action)
+
+    def _parse_code_action(self, memory_step: ActionStep, chat_message: ChatMessage) -> str:
+        memory_step.model_output_message = chat_message
+        model_output = chat_message.content
+        memory_step.model_output = model_output
 
         self.logger.log_markdown(
             content=model_output,
@@ -1248,8 +1625,9 @@ class CodeAgent(MultiStepAgent):
                 id=f"call_{len(self.memory.steps)}",
             )
         ]
+        return code_action
 
-        # Execute
+    def _execute_code_action(self, memory_step: ActionStep, code_action: str) -> Union[None, Any]:
         self.logger.log_code(title="Executing parsed code:", content=code_action, level=LogLevel.INFO)
         is_final_answer = False
         try:
@@ -1278,6 +1656,8 @@ class CodeAgent(MultiStepAgent):
                     level=LogLevel.INFO,
                 )
             raise AgentExecutionError(error_msg, self.logger)
+        finally:
+            memory_step.execution_profile = getattr(self.python_executor, "execution_profile", None)
 
         truncated_output = truncate_content(str(output))
         observation += "Last output from code snippet:\n" + truncated_output
@@ -103,10 +103,14 @@ class DuckDuckGoSearchTool(Tool):
     description = """Performs a duckduckgo web search based on your query (think a Google search) then returns the top search results."""
     inputs = {"query": {"type": "string", "description": "The search query to perform."}}
     output_type = "string"
+    cacheable = True
+    cache_ttl = 3600
 
     def __init__(self, max_results=10, **kwargs):
         super().__init__()
         self.max_results = max_results
+        # The keyword arguments of the client don't change the results
+        self.cache_key_attributes = ["max_results"]
         try:
             from duckduckgo_search import DDGS
         except ImportError as e:
@@ -135,12 +139,15 @@ class GoogleSearchTool(Tool):
         },
     }
     output_type = "string"
+    cacheable = True
+    cache_ttl = 3600
 
     def __init__(self, provider: str = "serpapi"):
         super().__init__()
         import os
 
         self.provider = provider
+        self.cache_key_attributes = ["provider"]
         if provider == "serpapi":
             self.organic_key = "organic_results"
             api_key_env_name = "SERPAPI_API_KEY"
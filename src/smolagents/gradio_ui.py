@@ -21,6 +21,7 @@ from typing import Optional
 from smolagents.agent_types import AgentAudio, AgentImage, AgentText, handle_agent_output_types
 from smolagents.agents import ActionStep, MultiStepAgent
 from smolagents.memory import MemoryStep
+from smolagents.monitoring import get_step_token_counts
 from smolagents.utils import _is_package_available
 
 
@@ -140,12 +141,12 @@ def stream_to_gradio(
 
     for step_log in agent.run(task, stream=True, reset=reset_agent_memory, additional_args=additional_args):
         # Track tokens if model provides them
-        if getattr(agent.model, "last_input_token_count", None) is not None:
-            total_input_tokens += agent.model.last_input_token_count
-            total_output_tokens += agent.model.last_output_token_count
+        token_counts = get_step_token_counts(step_log, agent.model)
+        if token_counts is not None:
+            total_input_tokens += token_counts[0]
+            total_output_tokens += token_counts[1]
             if isinstance(step_log, ActionStep):
-                step_log.input_token_count = agent.model.last_input_token_count
-                step_log.output_token_count = agent.model.last_output_token_count
+                step_log.input_token_count, step_log.output_token_count = token_counts
 
         for message in pull_messages_from_step(
             step_log,
@@ -16,16 +16,33 @@
 # limitations under the License.
 import ast
 import builtins
+import concurrent.futures
+import copy
+import ctypes
 import difflib
-import inspect
+import itertools
 import logging
 import math
+import operator
+import os
+import pickle
 import re
+import string
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import ChainMap, OrderedDict
 from collections.abc import Mapping
-from functools import wraps
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, field
+from functools import lru_cache, partial, wraps
 from importlib import import_module
-from types import BuiltinFunctionType, FunctionType, ModuleType
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from itertools import groupby
+from types import BuiltinFunctionType, CellType, FunctionType, ModuleType
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Set, Tuple, Union
 
 from .tools import Tool
 from .utils import BASE_BUILTIN_MODULES, truncate_content
@@ -52,12 +69,90 @@ ERRORS = {
 DEFAULT_MAX_LEN_OUTPUT = 50000
 MAX_OPERATIONS = 10000000
 MAX_WHILE_ITERATIONS = 1000000
+DEFAULT_PARALLEL_WORKERS = 8
 
 
 def custom_print(*args):
     return None
 
 
+def run_concurrently(calls: List[Callable[[], Any]], max_workers: int) -> List[Future]:
+    """
+    Starts the calls on a new thread pool of at most `max_workers` threads. Each call runs in a copy of the current
+    context, so that it is charged to the operation budget and checked against the authorizations of the evaluation.
+    """
+    if not calls:
+        return []
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)), thread_name_prefix="smolagents")
+    futures = [pool.submit(copy_context().run, call) for call in calls]
+    pool.shutdown(wait=False)
+    return futures
+
+
+def wait_for_future(future: Future, poll_interval: float = 0.01) -> Any:
+    """Returns the result of a future, waiting in short intervals so that an `ExecutionWatchdog` can stop the wait."""
+    while not future.done():
+        concurrent.futures.wait([future], timeout=poll_interval)
+    return future.result()
+
+
+def parallel_map(function: Callable, *iterables: Iterable, max_workers: int = DEFAULT_PARALLEL_WORKERS) -> List[Any]:
+    """
+    Like `map`, but calls the function on a thread pool, so that slow calls like tools waiting on the network overlap.
+    Returns the list of the results in order. If calls fail, the error of the first failing one in order is raised,
+    and the calls not started yet are canceled.
+    """
+    futures = run_concurrently([partial(function, *arguments) for arguments in zip(*iterables)], max_workers)
+    try:
+        return [wait_for_future(future) for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# Prefixes of the attributes of frames, generators, coroutines, tracebacks and code objects: through them, code could
+# reach the frames of the interpreter and its local variables, like the authorized imports. Like the builtins namespace
+# they give access to, they are only allowed if `builtins` is an authorized import.
+FRAME_ATTRIBUTE_PREFIXES = ("gi_", "f_", "tb_", "cr_", "ag_", "co_")
+
+
+def check_attribute_access(attribute_name: str, authorized_imports: Optional[List[str]] = None):
+    """
+    Raises an `InterpreterError` if the attribute could give access to the frames of the interpreter, unless `builtins`
+    or `*` is in `authorized_imports`.
+    """
+    if (
+        isinstance(attribute_name, str)
+        and attribute_name.startswith(FRAME_ATTRIBUTE_PREFIXES)
+        and not (authorized_imports and ("*" in authorized_imports or "builtins" in authorized_imports))
+    ):
+        raise InterpreterError(f"Forbidden access to attribute: {attribute_name}")
+
+
+def safe_getattr(obj: Any, name: str, *default: Any) -> Any:
+    """`getattr`, always refusing the attributes that could give access to the frames of the interpreter."""
+    check_attribute_access(name)
+    return getattr(obj, name, *default)
+
+
+class LazyIterator:
+    """
+    Iterator over the elements of a generator expression. Unlike a Python generator, it has no frame attribute through
+    which the code could reach the state of the interpreter.
+    """
+
+    __slots__ = ("_next",)
+
+    def __init__(self, generator: Generator[Any, None, None]):
+        self._next = generator.__next__
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._next()
+
+
 BASE_PYTHON_TOOLS = {
     "print": custom_print,
     "isinstance": isinstance,
@@ -98,6 +193,7 @@ BASE_PYTHON_TOOLS = {
     "all": all,
     "any": any,
     "map": map,
+    "parallel_map": parallel_map,
     "filter": filter,
     "ord": ord,
     "chr": chr,
@@ -105,7 +201,7 @@ BASE_PYTHON_TOOLS = {
     "iter": iter,
     "divmod": divmod,
     "callable": callable,
-    "getattr": getattr,
+    "getattr": safe_getattr,
     "hasattr": hasattr,
     "setattr": setattr,
     "issubclass": issubclass,
@@ -137,19 +233,100 @@ DANGEROUS_MODULES = [
     "sys",
 ]
 
+# Only values of these types can be rejected by `check_safer_result`
+SAFER_CHECKED_TYPES = (ModuleType, dict, FunctionType, BuiltinFunctionType)
+
+# Attributes giving access to the namespace of the builtins, e.g. through the globals of a function or a frame
+BUILTINS_ESCAPE_ATTRIBUTES = {"__builtins__", "__globals__", "f_builtins", "f_globals"}
+
+# Builtins whose calls may reach attributes that are not written in the code, or that could catch the
+# `ExecutionLimitExceeded` of the watchdog, so code using them is never run natively
+NATIVE_FORBIDDEN_NAMES = {"getattr", "setattr", "delattr", "vars", "BaseException"}
+
+# Names of the runtime checks injected in natively run code, which can't clash with names of the code
+NATIVE_CHECK_NAME = "__smolagents_check__"
+NATIVE_COUNT_NAME = "__smolagents_count__"
+NATIVE_CALL_NAME = "__smolagents_call__"
+NATIVE_WHILE_NAME = "__smolagents_while__"
+
+# These nodes evaluate to literals, strings or None: the static analysis marks them, and the nodes it derives from
+# them, as never needing to be checked by `check_safer_result`
+SAFE_RESULT_NODES = (
+    ast.Constant,
+    ast.JoinedStr,
+    ast.FormattedValue,
+    ast.Pass,
+    ast.Break,
+    ast.Continue,
+    ast.Import,
+    ast.ImportFrom,
+    ast.Delete,
+    ast.Assert,
+)
+
+# These nodes evaluate to lists, tuples, sets or lazy iterators, which `check_safer_result` never rejects
+SAFE_CONTAINER_NODES = (ast.List, ast.Tuple, ast.Set, ast.ListComp, ast.SetComp, ast.GeneratorExp)
+
+# Attribute set to `True` by the static analysis on the nodes whose results don't need to be checked
+SAFE_RESULT_MARK = "_smolagents_safe_result"
+
 
 class PrintContainer:
-    def __init__(self):
+    """
+    Buffer for the outputs printed by the evaluated code.
+
+    Printed text is stored as a list of chunks, so printing is linear in the total output length. When `max_length` is
+    set, the value is truncated with `truncate_content`, and only the head and tail of the output needed for this are
+    kept: memory stays bounded by a few times `max_length`, however much the code prints.
+
+    Args:
+        max_length (`int`, *optional*): Maximum length of the value.
+        output_sink (`Callable[[str], None]`, *optional*): Callback receiving the printed text as soon as it is
+            printed, before any truncation.
+    """
+
+    def __init__(self, max_length: Optional[int] = None, output_sink: Optional[Callable[[str], None]] = None):
+        self.max_length = max_length
+        self.output_sink = output_sink
         self.value = ""
 
+    @property
+    def value(self) -> str:
+        tail = "".join(self._chunks)
+        self._chunks = [tail]
+        content = tail if self._head is None else self._head + tail
+        if self.max_length is not None:
+            return truncate_content(content, max_length=self.max_length)
+        return content
+
+    @value.setter
+    def value(self, value: str):
+        self._head = None
+        self._chunks = [value]
+        self._chunks_length = len(value)
+
     def append(self, text):
-        self.value += text
+        if self.output_sink is not None:
+            self.output_sink(text)
+        self._chunks.append(text)
+        self._chunks_length += len(text)
+        if self.max_length and self._chunks_length > 2 * self.max_length:
+            self._compact()
         return self
 
+    def _compact(self):
+        """Drops the middle of the output, which `truncate_content` would cut out anyway."""
+        content = "".join(self._chunks)
+        if self._head is None:
+            self._head = content[: self.max_length // 2]
+        # Keeping more than `max_length` characters of tail ensures the value is still truncated with the same marker
+        tail = content[-(self.max_length + 1) :]
+        self._chunks = [tail]
+        self._chunks_length = len(tail)
+
     def __iadd__(self, other):
         """Implements the += operator"""
-        self.value += str(other)
-        return self
+        return self.append(str(other))
 
     def __str__(self):
         """String representation"""
@@ -177,6 +354,252 @@ class ReturnException(Exception):
         self.value = value
 
 
+class ExecutionLimitExceeded(BaseException):
+    """
+    Raised asynchronously in the thread evaluating the code by an [`ExecutionWatchdog`].
+    It derives from `BaseException` so that it is not caught by the `except Exception` clauses of the evaluated code.
+    """
+
+
+def get_memory_usage() -> int:
+    """Returns the resident memory of the current process in bytes, or its peak if the current value is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        try:
+            import resource
+        except ImportError:
+            return 0
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class ExecutionWatchdog:
+    """
+    Context manager enforcing wall-clock time and memory limits on the code evaluated in the current thread.
+
+    A background thread checks the limits every `poll_interval` seconds. When one is exceeded, it raises
+    [`ExecutionLimitExceeded`] in the evaluating thread, which stops the evaluation at the next Python instruction: a
+    long call to native code, such as a regex or a dataframe merge, is only stopped when it returns. The exception is
+    raised again at each check until the context exits, so that code catching it can't keep running.
+    The memory limit is process-wide: it applies to the growth of the resident memory of the whole process since the
+    start of the evaluation, so the allocations of other threads, like other agents running in the same process, count
+    towards it. To limit the memory of each agent separately, run their code in separate processes, e.g. with a
+    [`SubprocessExecutor`].
+
+    Args:
+        timeout (`float`, *optional*): Maximum wall-clock time of the evaluation, in seconds.
+        max_memory (`int`, *optional*): Maximum growth of the memory of the whole process during the evaluation, in
+            bytes.
+        poll_interval (`float`, default `0.01`): Interval between two checks of the limits, in seconds.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_memory: Optional[int] = None, poll_interval: float = 0.01):
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.poll_interval = poll_interval
+        self.error_message = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.timeout is None and self.max_memory is None:
+            return self
+        self._thread_id = threading.get_ident()
+        self._start_time = time.monotonic()
+        self._initial_memory = get_memory_usage() if self.max_memory is not None else 0
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stop(self):
+        """Stops watching the limits and cancels a pending [`ExecutionLimitExceeded`]. Calling it again is a no-op."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._stopped.set()
+            if self.error_message is not None:
+                # Cancel the exception if the evaluation ended before it was raised
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._thread_id), None)
+        self._thread.join()
+
+    def _check_limits(self) -> Optional[str]:
+        if self.timeout is not None and time.monotonic() - self._start_time > self.timeout:
+            return f"Code execution exceeded the time limit of {self.timeout} seconds."
+        if self.max_memory is not None and get_memory_usage() - self._initial_memory > self.max_memory:
+            return f"Code execution exceeded the memory limit of {self.max_memory} bytes."
+        return None
+
+    def _watch(self):
+        while not self._stopped.wait(self.poll_interval):
+            error_message = self.error_message or self._check_limits()
+            if error_message is not None:
+                # Raised again at each poll until the evaluation ends, in case the code caught it, e.g. with a bare
+                # `except:` or a context manager suppressing all exceptions
+                with self._lock:
+                    if not self._stopped.is_set():
+                        self.error_message = error_message
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                            ctypes.c_ulong(self._thread_id), ctypes.py_object(ExecutionLimitExceeded)
+                        )
+
+
+class OperationBudget:
+    """
+    Budget of operations of an evaluation, held outside of the evaluated state.
+
+    The interpreter charges the budget for each function call and each loop iteration, including the items of
+    comprehensions and generator expressions, so that infinite loops and recursions are stopped: other nodes only
+    run a bounded number of times between two charges. The cost model weights calls and iterations.
+
+    Args:
+        max_operations (`int`, default `MAX_OPERATIONS`): Maximum total cost of the operations of the evaluation.
+        max_while_iterations (`int`, default `MAX_WHILE_ITERATIONS`): Maximum number of iterations of a `while` loop.
+        call_cost (`int`, default `1`): Cost of a function call.
+        iteration_cost (`int`, default `1`): Cost of a loop iteration.
+    """
+
+    def __init__(
+        self,
+        max_operations: int = MAX_OPERATIONS,
+        max_while_iterations: int = MAX_WHILE_ITERATIONS,
+        call_cost: int = 1,
+        iteration_cost: int = 1,
+    ):
+        self.max_operations = max_operations
+        self.max_while_iterations = max_while_iterations
+        self.call_cost = call_cost
+        self.iteration_cost = iteration_cost
+        self.operations = 0
+
+    def _charge(self, cost: int):
+        self.operations += cost
+        if self.operations > self.max_operations:
+            raise InterpreterError(
+                f"Reached the max number of operations of {self.max_operations}. Maybe there is an infinite loop somewhere in the code, or you're just asking too many calculations."
+            )
+
+    def charge_call(self):
+        self._charge(self.call_cost)
+
+    def charge_iteration(self):
+        self._charge(self.iteration_cost)
+
+    def check_while_iterations(self, iterations: int):
+        if iterations > self.max_while_iterations:
+            raise InterpreterError(f"Maximum number of {self.max_while_iterations} iterations in While loop exceeded")
+
+
+# Budget charged by the code being evaluated in the current context
+_OPERATION_BUDGET: ContextVar[Optional[OperationBudget]] = ContextVar("operation_budget", default=None)
+
+
+def get_operation_budget() -> OperationBudget:
+    """
+    Returns the budget of the current evaluation. Outside of an evaluation, e.g. when a generator created by evaluated
+    code is consumed later, returns a new budget that isn't kept in the context, so that it never runs out across calls.
+    """
+    budget = _OPERATION_BUDGET.get()
+    return budget if budget is not None else OperationBudget()
+
+
+class ExecutionProfile:
+    """
+    Wall time and operation counts of a code action, filled by `evaluate_python_code` when passed as `profile`.
+
+    Times are measured per top-level statement, including the statements they run, and per source line, excluding
+    the statements nested in the line, like the body of a loop or of a called function. Operations are the evaluated
+    nodes, attributed to the line of their innermost statement: nodes without a dedicated compiler in `compile_ast`
+    count as one operation with all their children. The time spent in each tool call is also recorded.
+    """
+
+    def __init__(self):
+        self.total_time = 0.0
+        self.statements = []
+        self.lines = {}
+        self.tools = {}
+        self._operations = 0
+        # Innermost statements being run, as [line, start time, start operations, nested time, nested operations]
+        self._stack = []
+
+    def count_operation(self):
+        self._operations += 1
+
+    def enter_statement(self, node: ast.stmt):
+        self._operations += 1
+        self._stack.append([node.lineno, time.perf_counter(), self._operations, 0.0, 0])
+
+    def exit_statement(self):
+        line, start_time, start_operations, nested_time, nested_operations = self._stack.pop()
+        elapsed, operations = time.perf_counter() - start_time, self._operations - start_operations + 1
+        line_stats = self.lines.setdefault(line, {"line": line, "hits": 0, "time": 0.0, "operations": 0})
+        line_stats["hits"] += 1
+        line_stats["time"] += elapsed - nested_time
+        line_stats["operations"] += operations - nested_operations
+        if self._stack:
+            self._stack[-1][3] += elapsed
+            self._stack[-1][4] += operations
+        else:
+            self.statements.append({"line": line, "time": elapsed, "operations": operations})
+
+    def record_tool_call(self, name: str, elapsed: float):
+        tool_stats = self.tools.setdefault(name, {"name": name, "calls": 0, "time": 0.0})
+        tool_stats["calls"] += 1
+        tool_stats["time"] += elapsed
+
+    def profile_tool(self, name: str, tool: Callable) -> Callable:
+        """Returns a function calling `tool` and recording the time spent in the call."""
+
+        def profiled_tool(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return tool(*args, **kwargs)
+            finally:
+                self.record_tool_call(name, time.perf_counter() - start_time)
+
+        return profiled_tool
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "total_time": self.total_time,
+            "statements": list(self.statements),
+            "lines": [self.lines[line] for line in sorted(self.lines)],
+            "tools": list(self.tools.values()),
+        }
+
+
+# Profile filled by the code being evaluated in the current context
+_EXECUTION_PROFILE: ContextVar[Optional[ExecutionProfile]] = ContextVar("execution_profile", default=None)
+# Whether `compile_ast` is compiling closures recording an `ExecutionProfile`
+_PROFILED_COMPILATION: ContextVar[bool] = ContextVar("profiled_compilation", default=False)
+
+
+def new_local_scope(state: Dict[str, Any], local_variables: Optional[Dict[str, Any]] = None) -> ChainMap:
+    """
+    Creates the local scope of a function call, lambda or comprehension, in constant time whatever the size of `state`.
+
+    Names assigned in the scope are stored in the scope only, while reads fall back to the enclosing `state`, like
+    local variables falling back to globals in Python.
+
+    Args:
+        state (`Dict[str, Any]`): The enclosing state.
+        local_variables (`Dict[str, Any]`, *optional*): Initial local variables, for instance the call arguments.
+
+    Returns:
+        `ChainMap`: The local scope.
+    """
+    local_variables = {} if local_variables is None else local_variables
+    if isinstance(state, ChainMap):
+        return state.new_child(local_variables)
+    return ChainMap(local_variables, state)
+
+
 def get_iterable(obj):
     if isinstance(obj, list):
         return obj
@@ -214,6 +637,110 @@ def fix_final_answer_code(code: str) -> str:
     return code
 
 
+@lru_cache(maxsize=None)
+def get_module_file(module_name: str) -> str:
+    # builtins has no __file__ attribute
+    return getattr(import_module(module_name), "__file__", "")
+
+
+class AuthorizationIndex:
+    """
+    Lookup tables for the safety checks of the evaluation, precomputed for a set of tools and authorized imports so that
+    each check is a constant-time lookup.
+
+    Use [`AuthorizationIndex.get`] to reuse the index of the current evaluation.
+
+    Args:
+        static_tools (`Dict[str, Callable]`): Tools explicitly made available, which are always allowed.
+        authorized_imports (`List[str]`): Authorized imports.
+    """
+
+    def __init__(self, static_tools: Dict[str, Callable], authorized_imports: List[str]):
+        self.static_tools = static_tools
+        self.authorized_imports = authorized_imports
+        self.tools_count = len(static_tools)
+        self.allows_all = "*" in authorized_imports
+        # Keeping the tools alive guarantees that their ids are not reused
+        self.tools = list(static_tools.values())
+        self.tool_ids = {id(tool) for tool in self.tools}
+        self.forbidden_modules = {name for name in DANGEROUS_MODULES if name not in authorized_imports}
+        self.forbidden_functions = {
+            tuple(qualified_function_name.rsplit(".", 1))
+            for qualified_function_name in DANGEROUS_FUNCTIONS
+            if qualified_function_name.rsplit(".", 1)[1] not in static_tools
+        }
+
+    @classmethod
+    def get(cls, static_tools: Dict[str, Callable], authorized_imports: List[str]) -> "AuthorizationIndex":
+        """Returns the index of the current evaluation, rebuilding it if the tools or authorized imports changed."""
+        index = _AUTHORIZATION_INDEX.get()
+        if (
+            index is None
+            or index.static_tools is not static_tools
+            or index.authorized_imports is not authorized_imports
+            or index.tools_count != len(static_tools)
+        ):
+            index = cls(static_tools, authorized_imports)
+            _AUTHORIZATION_INDEX.set(index)
+        return index
+
+    def is_forbidden_builtin(self, func: Any) -> bool:
+        """Whether `func` is a builtin function that has not been explicitly added as a tool."""
+        return (
+            isinstance(func, BuiltinFunctionType)
+            and getattr(func, "__module__", None) == "builtins"
+            and id(func) not in self.tool_ids
+        )
+
+    def is_forbidden_module(self, module_name: Any, module_file: Any) -> bool:
+        """Whether `module_name` names a forbidden module. Names that are not strings, e.g. a fake `__name__` set in a
+        dict, never match and must not break the set lookup."""
+        return (
+            isinstance(module_name, str)
+            and module_name in self.forbidden_modules
+            and module_file == get_module_file(module_name)
+        )
+
+    def is_forbidden_function(self, func: Any) -> bool:
+        """Whether `func` is one of the dangerous functions that has not been explicitly added as a tool."""
+        module_name, name = getattr(func, "__module__", None), getattr(func, "__name__", None)
+        return (
+            isinstance(module_name, str) and isinstance(name, str) and (module_name, name) in self.forbidden_functions
+        )
+
+
+_AUTHORIZATION_INDEX: ContextVar[Optional[AuthorizationIndex]] = ContextVar("authorization_index", default=None)
+
+
+def check_safer_result(result: Any, static_tools: Dict[str, Callable], authorized_imports: List[str]) -> Any:
+    """
+    Checks that a value produced by the evaluation does not give access to a dangerous module or function.
+
+    Args:
+        result (`Any`): Value to check.
+        static_tools (`Dict[str, Callable]`): Tools explicitly made available, which are always allowed.
+        authorized_imports (`List[str]`): Authorized imports.
+
+    Returns:
+        `Any`: The checked value.
+    """
+    if not isinstance(result, SAFER_CHECKED_TYPES):
+        return result
+    index = AuthorizationIndex.get(static_tools, authorized_imports)
+    if index.allows_all:
+        return result
+    if isinstance(result, ModuleType):
+        if index.is_forbidden_module(result.__name__, getattr(result, "__file__", "")):
+            raise InterpreterError(f"Forbidden access to module: {result.__name__}")
+    elif isinstance(result, dict):
+        module_name = result.get("__name__")
+        if module_name and index.is_forbidden_module(module_name, result.get("__file__", "")):
+            raise InterpreterError(f"Forbidden access to module: {module_name}")
+    elif index.is_forbidden_function(result):
+        raise InterpreterError(f"Forbidden access to function: {result.__name__}")
+    return result
+
+
 def safer_eval(func: Callable):
     """
     Decorator to make the evaluation of a function safer by checking its return value.
@@ -234,35 +761,9 @@ def safer_eval(func: Callable):
         authorized_imports=BASE_BUILTIN_MODULES,
     ):
         result = func(expression, state, static_tools, custom_tools, authorized_imports=authorized_imports)
-        if "*" not in authorized_imports:
-            if isinstance(result, ModuleType):
-                for module_name in DANGEROUS_MODULES:
-                    if (
-                        module_name not in authorized_imports
-                        and result.__name__ == module_name
-                        # builtins has no __file__ attribute
-                        and getattr(result, "__file__", "") == getattr(import_module(module_name), "__file__", "")
-                    ):
-                        raise InterpreterError(f"Forbidden access to module: {module_name}")
-            elif isinstance(result, dict) and result.get("__name__"):
-                for module_name in DANGEROUS_MODULES:
-                    if (
-                        module_name not in authorized_imports
-                        and result["__name__"] == module_name
-                        # builtins has no __file__ attribute
-                        and result.get("__file__", "") == getattr(import_module(module_name), "__file__", "")
-                    ):
-                        raise InterpreterError(f"Forbidden access to module: {module_name}")
-            elif isinstance(result, (FunctionType, BuiltinFunctionType)):
-                for qualified_function_name in DANGEROUS_FUNCTIONS:
-                    module_name, function_name = qualified_function_name.rsplit(".", 1)
-                    if (
-                        function_name not in static_tools
-                        and result.__name__ == function_name
-                        and result.__module__ == module_name
-                    ):
-                        raise InterpreterError(f"Forbidden access to function: {function_name}")
-        return result
+        if getattr(expression, SAFE_RESULT_MARK, False):
+            return result
+        return check_safer_result(result, static_tools, authorized_imports)
 
     return _check_return
 
@@ -297,9 +798,7 @@ def evaluate_lambda(
     args = [arg.arg for arg in lambda_expression.args.args]
 
     def lambda_func(*values: Any) -> Any:
-        new_state = state.copy()
-        for arg, value in zip(args, values):
-            new_state[arg] = value
+        new_state = new_local_scope(state, dict(zip(args, values)))
         return evaluate_ast(
             lambda_expression.body,
             new_state,
@@ -318,8 +817,10 @@ def evaluate_while(
     custom_tools: Dict[str, Callable],
     authorized_imports: List[str],
 ) -> None:
+    budget = get_operation_budget()
     iterations = 0
     while evaluate_ast(while_loop.test, state, static_tools, custom_tools, authorized_imports):
+        budget.charge_iteration()
         for node in while_loop.body:
             try:
                 evaluate_ast(node, state, static_tools, custom_tools, authorized_imports)
@@ -328,11 +829,51 @@ def evaluate_while(
             except ContinueException:
                 break
         iterations += 1
-        if iterations > MAX_WHILE_ITERATIONS:
-            raise InterpreterError(f"Maximum number of {MAX_WHILE_ITERATIONS} iterations in While loop exceeded")
+        budget.check_while_iterations(iterations)
     return None
 
 
+def bind_function_arguments(
+    func_def: ast.FunctionDef,
+    func_state: Dict[str, Any],
+    args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+    default_values: List[Any],
+) -> None:
+    arg_names = [arg.arg for arg in func_def.args.args]
+
+    # Apply default values
+    defaults = dict(zip(arg_names[-len(default_values) :], default_values))
+
+    # Set positional arguments
+    for name, value in zip(arg_names, args):
+        func_state[name] = value
+
+    # Set keyword arguments
+    for name, value in kwargs.items():
+        func_state[name] = value
+
+    # Handle variable arguments
+    if func_def.args.vararg:
+        vararg_name = func_def.args.vararg.arg
+        func_state[vararg_name] = args
+
+    if func_def.args.kwarg:
+        kwarg_name = func_def.args.kwarg.arg
+        func_state[kwarg_name] = kwargs
+
+    # Set default values for arguments that were not provided
+    for name, value in defaults.items():
+        if name not in func_state:
+            func_state[name] = value
+
+    # Update function state with self and __class__
+    if func_def.args.args and func_def.args.args[0].arg == "self":
+        if args:
+            func_state["self"] = args[0]
+            func_state["__class__"] = args[0].__class__
+
+
 def create_function(
     func_def: ast.FunctionDef,
     state: Dict[str, Any],
@@ -341,42 +882,11 @@ def create_function(
     authorized_imports: List[str],
 ) -> Callable:
     def new_func(*args: Any, **kwargs: Any) -> Any:
-        func_state = state.copy()
-        arg_names = [arg.arg for arg in func_def.args.args]
+        func_state = new_local_scope(state)
         default_values = [
             evaluate_ast(d, state, static_tools, custom_tools, authorized_imports) for d in func_def.args.defaults
         ]
-
-        # Apply default values
-        defaults = dict(zip(arg_names[-len(default_values) :], default_values))
-
-        # Set positional arguments
-        for name, value in zip(arg_names, args):
-            func_state[name] = value
-
-        # Set keyword arguments
-        for name, value in kwargs.items():
-            func_state[name] = value
-
-        # Handle variable arguments
-        if func_def.args.vararg:
-            vararg_name = func_def.args.vararg.arg
-            func_state[vararg_name] = args
-
-        if func_def.args.kwarg:
-            kwarg_name = func_def.args.kwarg.arg
-            func_state[kwarg_name] = kwargs
-
-        # Set default values for arguments that were not provided
-        for name, value in defaults.items():
-            if name not in func_state:
-                func_state[name] = value
-
-        # Update function state with self and __class__
-        if func_def.args.args and func_def.args.args[0].arg == "self":
-            if args:
-                func_state["self"] = args[0]
-                func_state["__class__"] = args[0].__class__
+        bind_function_arguments(func_def, func_state, args, kwargs, default_values)
 
         result = None
         try:
@@ -649,22 +1159,17 @@ def evaluate_call(
     elif isinstance(call.func, ast.Attribute):
         obj = evaluate_ast(call.func.value, state, static_tools, custom_tools, authorized_imports)
         func_name = call.func.attr
+        check_attribute_access(func_name, authorized_imports)
         if not hasattr(obj, func_name):
             raise InterpreterError(f"Object {obj} has no attribute {func_name}")
         func = getattr(obj, func_name)
     elif isinstance(call.func, ast.Name):
         func_name = call.func.id
-        if func_name in state:
-            func = state[func_name]
-        elif func_name in static_tools:
-            func = static_tools[func_name]
-        elif func_name in custom_tools:
-            func = custom_tools[func_name]
-        elif func_name in ERRORS:
-            func = ERRORS[func_name]
-        else:
+        func = lookup_name(func_name, state, static_tools, custom_tools)
+        if func is UNDEFINED:
             raise InterpreterError(
                 f"It is not permitted to evaluate other functions than the provided tools or functions defined/imported in previous code (tried to execute {call.func.id})."
+                + suggest_close_names(func_name, state, static_tools, custom_tools)
             )
     elif isinstance(call.func, ast.Subscript):
         func = evaluate_subscript(call.func, state, static_tools, custom_tools, authorized_imports)
@@ -683,7 +1188,18 @@ def evaluate_call(
         keyword.arg: evaluate_ast(keyword.value, state, static_tools, custom_tools, authorized_imports)
         for keyword in call.keywords
     }
+    return call_function(func, func_name, args, kwargs, state, static_tools, authorized_imports)
+
 
+def call_function(
+    func: Callable,
+    func_name: Optional[str],
+    args: List[Any],
+    kwargs: Dict[str, Any],
+    state: Dict[str, Any],
+    static_tools: Dict[str, Callable],
+    authorized_imports: List[str],
+) -> Any:
     if func_name == "super":
         if not args:
             if "__class__" in state and "self" in state:
@@ -704,7 +1220,8 @@ def evaluate_call(
         state["_print_outputs"] += " ".join(map(str, args)) + "\n"
         return None
     else:  # Assume it's a callable object
-        if (inspect.getmodule(func) == builtins) and inspect.isbuiltin(func) and (func not in static_tools.values()):
+        get_operation_budget().charge_call()
+        if AuthorizationIndex.get(static_tools, authorized_imports).is_forbidden_builtin(func):
             raise InterpreterError(
                 f"Invoking a builtin function that has not been explicitly added as a tool is not allowed ({func_name})."
             )
@@ -723,12 +1240,55 @@ def evaluate_subscript(
     try:
         return value[index]
     except (KeyError, IndexError, TypeError) as e:
-        error_message = f"Could not index {value} with '{index}': {type(e).__name__}: {e}"
-        if isinstance(index, str) and isinstance(value, Mapping):
-            close_matches = difflib.get_close_matches(index, list(value.keys()))
-            if len(close_matches) > 0:
-                error_message += f". Maybe you meant one of these indexes instead: {str(close_matches)}"
-        raise InterpreterError(error_message) from e
+        raise build_subscript_error(value, index, e) from e
+
+
+def build_subscript_error(value: Any, index: Any, error: Exception) -> InterpreterError:
+    error_message = f"Could not index {value} with '{index}': {type(error).__name__}: {error}"
+    if isinstance(index, str) and isinstance(value, Mapping):
+        close_matches = difflib.get_close_matches(index, list(value.keys()))
+        if len(close_matches) > 0:
+            error_message += f". Maybe you meant one of these indexes instead: {str(close_matches)}"
+    return InterpreterError(error_message)
+
+
+# Returned by `lookup_name` for undefined names
+UNDEFINED = object()
+
+
+def lookup_name(
+    name: str, state: Dict[str, Any], static_tools: Dict[str, Callable], custom_tools: Dict[str, Callable]
+):
+    """
+    Looks a name up in the layers of the namespace of an evaluation, in order: the state, the static tools, the custom
+    tools and the builtin exceptions. The layers are looked up live, since the code can define new custom tools.
+
+    Returns:
+        The value of the name, or `UNDEFINED` if it's not defined: close names are never returned instead, they are
+        only suggested in error messages by `suggest_close_names`.
+    """
+    if name in state:
+        return state[name]
+    elif name in static_tools:
+        return static_tools[name]
+    try:
+        # States may define missing names, like the variables spilled by a `LocalPythonExecutor`
+        return state[name]
+    except KeyError:
+        pass
+    if name in custom_tools:
+        return custom_tools[name]
+    return ERRORS.get(name, UNDEFINED)
+
+
+def suggest_close_names(
+    name: str, state: Dict[str, Any], static_tools: Dict[str, Callable], custom_tools: Dict[str, Callable]
+) -> str:
+    """Returns a suggestion of defined names close to an undefined name, to append to an error message."""
+    close_matches = difflib.get_close_matches(name, [*state, *static_tools, *custom_tools])
+    if not close_matches:
+        return ""
+    return f" Did you mean {' or '.join(f'`{close_match}`' for close_match in close_matches)}?"
 
 
 def evaluate_name(
@@ -738,18 +1298,13 @@ def evaluate_name(
     custom_tools: Dict[str, Callable],
     authorized_imports: List[str],
 ) -> Any:
-    if name.id in state:
-        return state[name.id]
-    elif name.id in static_tools:
-        return static_tools[name.id]
-    elif name.id in custom_tools:
-        return custom_tools[name.id]
-    elif name.id in ERRORS:
-        return ERRORS[name.id]
-    close_matches = difflib.get_close_matches(name.id, list(state.keys()))
-    if len(close_matches) > 0:
-        return state[close_matches[0]]
-    raise InterpreterError(f"The variable `{name.id}` is not defined.")
+    value = lookup_name(name.id, state, static_tools, custom_tools)
+    if value is UNDEFINED:
+        raise InterpreterError(
+            f"The variable `{name.id}` is not defined."
+            + suggest_close_names(name.id, state, static_tools, custom_tools)
+        )
+    return value
 
 
 def evaluate_condition(
@@ -824,8 +1379,10 @@ def evaluate_for(
     authorized_imports: List[str],
 ) -> Any:
     result = None
+    charge_iteration = get_operation_budget().charge_iteration
     iterator = evaluate_ast(for_loop.iter, state, static_tools, custom_tools, authorized_imports)
     for counter in iterator:
+        charge_iteration()
         set_value(
             for_loop.target,
             counter,
@@ -877,20 +1434,61 @@ def evaluate_listcomp(
         )
         result = []
         for value in iter_value:
-            new_state = current_state.copy()
+            charge_iteration()
             if isinstance(generator.target, ast.Tuple):
                 for idx, elem in enumerate(generator.target.elts):
-                    new_state[elem.id] = value[idx]
+                    current_state[elem.id] = value[idx]
             else:
-                new_state[generator.target.id] = value
+                current_state[generator.target.id] = value
             if all(
-                evaluate_ast(if_clause, new_state, static_tools, custom_tools, authorized_imports)
+                evaluate_ast(if_clause, current_state, static_tools, custom_tools, authorized_imports)
                 for if_clause in generator.ifs
             ):
-                result.extend(inner_evaluate(generators, index + 1, new_state))
+                result.extend(inner_evaluate(generators, index + 1, current_state))
         return result
 
-    return inner_evaluate(listcomp.generators, 0, state)
+    charge_iteration = get_operation_budget().charge_iteration
+    return inner_evaluate(listcomp.generators, 0, new_local_scope(state))
+
+
+def evaluate_generatorexp(
+    genexp: ast.GeneratorExp,
+    state: Dict[str, Any],
+    static_tools: Dict[str, Callable],
+    custom_tools: Dict[str, Callable],
+    authorized_imports: List[str],
+) -> "LazyIterator":
+    """
+    Evaluate a generator expression into a lazy iterator: elements are only evaluated when they are consumed, so that
+    `any`, `all` or `next` can stop early and large iterables are streamed in constant memory.
+    As in Python, the first iterable is evaluated right away.
+    """
+    generators = genexp.generators
+
+    def inner_evaluate(index: int, iter_value: Any, current_state: Dict[str, Any]) -> Generator[Any, None, None]:
+        generator = generators[index]
+        for value in iter_value:
+            charge_iteration()
+            if isinstance(generator.target, ast.Tuple):
+                for idx, elem in enumerate(generator.target.elts):
+                    current_state[elem.id] = value[idx]
+            else:
+                current_state[generator.target.id] = value
+            if all(
+                evaluate_ast(if_clause, current_state, static_tools, custom_tools, authorized_imports)
+                for if_clause in generator.ifs
+            ):
+                if index + 1 < len(generators):
+                    next_iter_value = evaluate_ast(
+                        generators[index + 1].iter, current_state, static_tools, custom_tools, authorized_imports
+                    )
+                    yield from inner_evaluate(index + 1, next_iter_value, current_state)
+                else:
+                    yield evaluate_ast(genexp.elt, current_state, static_tools, custom_tools, authorized_imports)
+
+    charge_iteration = get_operation_budget().charge_iteration
+    iter_value = iter(evaluate_ast(generators[0].iter, state, static_tools, custom_tools, authorized_imports))
+    return LazyIterator(inner_evaluate(0, iter_value, new_local_scope(state)))
 
 
 def evaluate_setcomp(
@@ -901,10 +1499,12 @@ def evaluate_setcomp(
     authorized_imports: List[str],
 ) -> Set[Any]:
     result = set()
+    new_state = new_local_scope(state)
+    charge_iteration = get_operation_budget().charge_iteration
     for gen in setcomp.generators:
         iter_value = evaluate_ast(gen.iter, state, static_tools, custom_tools, authorized_imports)
         for value in iter_value:
-            new_state = state.copy()
+            charge_iteration()
             set_value(
                 gen.target,
                 value,
@@ -1034,41 +1634,76 @@ def evaluate_with(
             context.__exit__(None, None, None)
 
 
-def get_safe_module(raw_module, authorized_imports, visited=None):
-    """Creates a safe copy of a module or returns the original if it's a function"""
-    # If it's a function or non-module object, return it directly
-    if not isinstance(raw_module, ModuleType):
-        return raw_module
+class SafeModule(ModuleType):
+    """
+    Lazy sandboxed view of a module, created by [`get_safe_module`].
+
+    Attributes are looked up on the wrapped module on access, so building the view does not walk the package tree.
+    Submodules are themselves returned as safe modules, and lazy attributes failing to import are reported as missing.
+    Module metadata is copied eagerly so that the safety checks on modules and their `__dict__` still apply.
+    Safe modules are shared by all executors of the process, so they are read-only.
+    """
 
-    # Handle circular references: Initialize visited set for the first call
-    if visited is None:
-        visited = set()
+    __slots__ = ("_raw_module", "_authorized_imports")
 
-    module_id = id(raw_module)
-    if module_id in visited:
-        return raw_module  # Return original for circular refs
+    def __init__(self, raw_module: ModuleType, authorized_imports: frozenset):
+        super().__init__(raw_module.__name__)
+        ModuleType.__setattr__(self, "_raw_module", raw_module)
+        ModuleType.__setattr__(self, "_authorized_imports", authorized_imports)
+        for attr_name in ("__doc__", "__file__", "__loader__", "__package__", "__spec__"):
+            if hasattr(raw_module, attr_name):
+                ModuleType.__setattr__(self, attr_name, getattr(raw_module, attr_name))
 
-    visited.add(module_id)
+    def __setattr__(self, name: str, value: Any):
+        raise InterpreterError(f"Cannot set attribute '{name}' of module {self.__name__}: modules are read-only")
 
-    # Create new module for actual modules
-    safe_module = ModuleType(raw_module.__name__)
+    def __delattr__(self, name: str):
+        raise InterpreterError(f"Cannot delete attribute '{name}' of module {self.__name__}: modules are read-only")
 
-    # Copy all attributes by reference, recursively checking modules
-    for attr_name in dir(raw_module):
+    def __getattr__(self, name: str) -> Any:
         try:
-            attr_value = getattr(raw_module, attr_name)
-        except (ImportError, AttributeError) as e:
-            # lazy / dynamic loading module -> INFO log and skip
-            logger.info(
-                f"Skipping import error while copying {raw_module.__name__}.{attr_name}: {type(e).__name__} - {e}"
-            )
-            continue
-        # Recursively process nested modules, passing visited set
-        if isinstance(attr_value, ModuleType):
-            attr_value = get_safe_module(attr_value, authorized_imports, visited=visited)
+            attr_value = getattr(self._raw_module, name)
+        except ImportError as e:
+            # lazy / dynamic loading module -> INFO log and report the attribute as missing
+            logger.info(f"Skipping import error while accessing {self.__name__}.{name}: {type(e).__name__} - {e}")
+            raise AttributeError(f"module '{self.__name__}' has no attribute '{name}'") from e
+        return get_safe_module(attr_value, self._authorized_imports)
+
+    def __dir__(self) -> List[str]:
+        return sorted(set(dir(self._raw_module)) | set(_MODULE_DICT.__get__(self)))
+
+    @property
+    def __dict__(self) -> Dict[str, Any]:
+        """Snapshot of the wrapped module namespace, with submodules replaced by safe modules."""
+        namespace = {
+            name: get_safe_module(value, self._authorized_imports) for name, value in vars(self._raw_module).items()
+        }
+        namespace.update(_MODULE_DICT.__get__(self))
+        return namespace
+
+
+_MODULE_DICT = ModuleType.__dict__["__dict__"]
+
 
-        setattr(safe_module, attr_name, attr_value)
+_SAFE_MODULES: Dict[Tuple[ModuleType, frozenset], SafeModule] = {}
+_SAFE_MODULES_LOCK = threading.Lock()
 
+
+def get_safe_module(raw_module, authorized_imports):
+    """
+    Returns a safe view of a module, or the original object if it's not a module.
+
+    Safe views are cached process-wide per module and set of authorized imports, so repeated imports are cheap.
+    """
+    # If it's a function or non-module object, return it directly
+    if not isinstance(raw_module, ModuleType) or isinstance(raw_module, SafeModule):
+        return raw_module
+
+    key = (raw_module, frozenset(authorized_imports))
+    safe_module = _SAFE_MODULES.get(key)
+    if safe_module is None:
+        with _SAFE_MODULES_LOCK:
+            safe_module = _SAFE_MODULES.setdefault(key, SafeModule(raw_module, key[1]))
     return safe_module
 
 
@@ -1103,7 +1738,7 @@ def import_modules(expression, state, authorized_imports):
                         state[name] = getattr(module, name)
                 else:  # If no __all__, import all public names (those not starting with '_')
                     for name in dir(module):
-                        if not name.startswith("_"):
+                        if not name.startswith("_") and hasattr(module, name):
                             state[name] = getattr(module, name)
             else:  # regular from imports
                 for alias in expression.names:
@@ -1126,10 +1761,12 @@ def evaluate_dictcomp(
     authorized_imports: List[str],
 ) -> Dict[Any, Any]:
     result = {}
+    new_state = new_local_scope(state)
+    charge_iteration = get_operation_budget().charge_iteration
     for gen in dictcomp.generators:
         iter_value = evaluate_ast(gen.iter, state, static_tools, custom_tools, authorized_imports)
         for value in iter_value:
-            new_state = state.copy()
+            charge_iteration()
             set_value(
                 gen.target,
                 value,
@@ -1224,11 +1861,13 @@ def evaluate_ast(
             The list of modules that can be imported by the code. By default, only a few safe modules are allowed.
             If it contains "*", it will authorize any import. Use this at your own risk!
     """
-    if state.setdefault("_operations_count", 0) >= MAX_OPERATIONS:
-        raise InterpreterError(
-            f"Reached the max number of operations of {MAX_OPERATIONS}. Maybe there is an infinite loop somewhere in the code, or you're just asking too many calculations."
-        )
-    state["_operations_count"] += 1
+    if _OPERATION_BUDGET.get() is None:
+        # Evaluating a node directly, outside of `evaluate_python_code`: the budget only covers this evaluation
+        budget_token = _OPERATION_BUDGET.set(OperationBudget())
+        try:
+            return evaluate_ast(expression, state, static_tools, custom_tools, authorized_imports)
+        finally:
+            _OPERATION_BUDGET.reset(budget_token)
     common_params = (state, static_tools, custom_tools, authorized_imports)
     if isinstance(expression, ast.Assign):
         # Assignment -> we evaluate the assignment which should update the state
@@ -1244,8 +1883,10 @@ def evaluate_ast(
         return expression.value
     elif isinstance(expression, ast.Tuple):
         return tuple((evaluate_ast(elt, *common_params) for elt in expression.elts))
-    elif isinstance(expression, (ast.ListComp, ast.GeneratorExp)):
+    elif isinstance(expression, ast.ListComp):
         return evaluate_listcomp(expression, *common_params)
+    elif isinstance(expression, ast.GeneratorExp):
+        return evaluate_generatorexp(expression, *common_params)
     elif isinstance(expression, ast.DictComp):
         return evaluate_dictcomp(expression, *common_params)
     elif isinstance(expression, ast.SetComp):
@@ -1315,6 +1956,7 @@ def evaluate_ast(
             return evaluate_ast(expression.orelse, *common_params)
     elif isinstance(expression, ast.Attribute):
         value = evaluate_ast(expression.value, *common_params)
+        check_attribute_access(expression.attr, authorized_imports)
         return getattr(value, expression.attr)
     elif isinstance(expression, ast.Slice):
         return slice(
@@ -1349,41 +1991,1699 @@ def evaluate_ast(
         raise InterpreterError(f"{expression.__class__.__name__} is not supported.")
 
 
-class FinalAnswerException(Exception):
-    def __init__(self, value):
-        self.value = value
+CompiledNode = Callable[[Dict[str, Any], Dict[str, Callable], Dict[str, Callable], List[str]], Any]
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.FloorDiv: operator.floordiv,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+}
 
+INPLACE_OPERATORS = {
+    ast.Add: operator.iadd,
+    ast.Sub: operator.isub,
+    ast.Mult: operator.imul,
+    ast.Div: operator.itruediv,
+    ast.Mod: operator.imod,
+    ast.Pow: operator.ipow,
+    ast.FloorDiv: operator.ifloordiv,
+    ast.BitAnd: operator.iand,
+    ast.BitOr: operator.ior,
+    ast.BitXor: operator.ixor,
+    ast.LShift: operator.ilshift,
+    ast.RShift: operator.irshift,
+}
 
-def evaluate_python_code(
-    code: str,
-    static_tools: Optional[Dict[str, Callable]] = None,
-    custom_tools: Optional[Dict[str, Callable]] = None,
-    state: Optional[Dict[str, Any]] = None,
-    authorized_imports: List[str] = BASE_BUILTIN_MODULES,
-    max_print_outputs_length: int = DEFAULT_MAX_LEN_OUTPUT,
-):
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: lambda operand: operand,
+    ast.Not: operator.not_,
+    ast.Invert: operator.invert,
+}
+
+
+def compile_ast(expression: ast.AST) -> CompiledNode:
     """
-    Evaluate a python expression using the content of the variables stored in a state and only evaluating a given set
-    of functions.
+    Compile an abstract syntax tree into a tree of closures, with the same semantics as `evaluate_ast`.
 
-    This function will recurse through the nodes of the tree provided.
+    Each node is turned once into a closure specialized for its type, with the closures of its children resolved
+    ahead of time, so that running the code again does not need to dispatch on the node type. The returned closure
+    takes the same `state`, `static_tools`, `custom_tools` and `authorized_imports` arguments as `evaluate_ast`: it
+    charges the [`OperationBudget`] and checks returned values exactly like `evaluate_ast` does. Node types without a dedicated
+    compiler are evaluated with `evaluate_ast`.
 
     Args:
-        code (`str`):
-            The code to evaluate.
-        static_tools (`Dict[str, Callable]`):
-            The functions that may be called during the evaluation. These can also be agents in a multiagent setting.
-            These tools cannot be overwritten in the code: any assignment to their name will raise an error.
-        custom_tools (`Dict[str, Callable]`):
-            The functions that may be called during the evaluation.
-            These tools can be overwritten in the code: any assignment to their name will overwrite them.
-        state (`Dict[str, Any]`):
+        expression (`ast.AST`):
+            The code to compile, as an abstract syntax tree.
+
+    Returns:
+        `Callable`: Closure evaluating the node.
+    """
+    compiler = NODE_COMPILERS.get(type(expression))
+    run = compiler(expression) if compiler is not None else None
+    if run is None:
+
+        def evaluate(state, static_tools, custom_tools, authorized_imports):
+            return evaluate_ast(expression, state, static_tools, custom_tools, authorized_imports)
+
+        return profile_node(expression, evaluate) if _PROFILED_COMPILATION.get() else evaluate
+
+    if getattr(expression, SAFE_RESULT_MARK, False):
+        checked_run = run
+    else:
+
+        def checked_run(state, static_tools, custom_tools, authorized_imports):
+            return check_safer_result(
+                run(state, static_tools, custom_tools, authorized_imports), static_tools, authorized_imports
+            )
+
+    return profile_node(expression, checked_run) if _PROFILED_COMPILATION.get() else checked_run
+
+
+def profile_node(node: ast.AST, run: CompiledNode) -> CompiledNode:
+    """Wraps the closure compiled for a node to record it in the [`ExecutionProfile`] of the current evaluation."""
+    if isinstance(node, ast.stmt):
+
+        def profiled_statement(state, static_tools, custom_tools, authorized_imports):
+            profile = _EXECUTION_PROFILE.get()
+            if profile is None:
+                return run(state, static_tools, custom_tools, authorized_imports)
+            profile.enter_statement(node)
+            try:
+                return run(state, static_tools, custom_tools, authorized_imports)
+            finally:
+                profile.exit_statement()
+
+        return profiled_statement
+
+    def profiled_expression(state, static_tools, custom_tools, authorized_imports):
+        profile = _EXECUTION_PROFILE.get()
+        if profile is not None:
+            profile.count_operation()
+        return run(state, static_tools, custom_tools, authorized_imports)
+
+    return profiled_expression
+
+
+def compile_profiled_body(body: List[ast.stmt]) -> List[CompiledNode]:
+    """Like `compile_body`, but the closures record the evaluation in the current [`ExecutionProfile`]."""
+    token = _PROFILED_COMPILATION.set(True)
+    try:
+        return compile_body(body)
+    finally:
+        _PROFILED_COMPILATION.reset(token)
+
+
+def compile_body(body: List[ast.stmt]) -> List[CompiledNode]:
+    return [compile_ast(node) for node in body]
+
+
+def _compile_constant(node: ast.Constant) -> CompiledNode:
+    value = node.value
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return value
+
+    return run
+
+
+def _compile_name(node: ast.Name) -> CompiledNode:
+    name_id = node.id
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        if name_id in state:
+            return state[name_id]
+        return evaluate_name(node, state, static_tools, custom_tools, authorized_imports)
+
+    return run
+
+
+def _compile_expr(node: Union[ast.Expr, ast.Starred]) -> CompiledNode:
+    return compile_ast(node.value)
+
+
+def _compile_attribute(node: ast.Attribute) -> CompiledNode:
+    value_fn, attr = compile_ast(node.value), node.attr
+    if attr.startswith(FRAME_ATTRIBUTE_PREFIXES):
+
+        def run_checked(state, static_tools, custom_tools, authorized_imports):
+            value = value_fn(state, static_tools, custom_tools, authorized_imports)
+            check_attribute_access(attr, authorized_imports)
+            return getattr(value, attr)
+
+        return run_checked
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return getattr(value_fn(state, static_tools, custom_tools, authorized_imports), attr)
+
+    return run
+
+
+def _compile_subscript(node: ast.Subscript) -> CompiledNode:
+    index_fn, value_fn = compile_ast(node.slice), compile_ast(node.value)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        index = index_fn(state, static_tools, custom_tools, authorized_imports)
+        value = value_fn(state, static_tools, custom_tools, authorized_imports)
+        try:
+            return value[index]
+        except (KeyError, IndexError, TypeError) as e:
+            raise build_subscript_error(value, index, e) from e
+
+    return run
+
+
+def _compile_slice(node: ast.Slice) -> CompiledNode:
+    lower_fn, upper_fn, step_fn = (
+        compile_ast(bound) if bound is not None else None for bound in (node.lower, node.upper, node.step)
+    )
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return slice(
+            lower_fn(state, static_tools, custom_tools, authorized_imports) if lower_fn is not None else None,
+            upper_fn(state, static_tools, custom_tools, authorized_imports) if upper_fn is not None else None,
+            step_fn(state, static_tools, custom_tools, authorized_imports) if step_fn is not None else None,
+        )
+
+    return run
+
+
+def _compile_unaryop(node: ast.UnaryOp) -> Optional[CompiledNode]:
+    op = UNARY_OPERATORS.get(type(node.op))
+    if op is None:
+        return None
+    operand_fn = compile_ast(node.operand)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return op(operand_fn(state, static_tools, custom_tools, authorized_imports))
+
+    return run
+
+
+def _compile_binop(node: ast.BinOp) -> Optional[CompiledNode]:
+    op = BINARY_OPERATORS.get(type(node.op))
+    if op is None:
+        return None
+    left_fn, right_fn = compile_ast(node.left), compile_ast(node.right)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return op(
+            left_fn(state, static_tools, custom_tools, authorized_imports),
+            right_fn(state, static_tools, custom_tools, authorized_imports),
+        )
+
+    return run
+
+
+def _compile_boolop(node: ast.BoolOp) -> Optional[CompiledNode]:
+    value_fns = [compile_ast(value) for value in node.values]
+    if isinstance(node.op, ast.And):
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            for value_fn in value_fns:
+                if not value_fn(state, static_tools, custom_tools, authorized_imports):
+                    return False
+            return True
+
+    elif isinstance(node.op, ast.Or):
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            for value_fn in value_fns:
+                if value_fn(state, static_tools, custom_tools, authorized_imports):
+                    return True
+            return False
+
+    else:
+        return None
+    return run
+
+
+def _compile_compare(node: ast.Compare) -> Optional[CompiledNode]:
+    ops = [COMPARISON_OPERATORS.get(type(op)) for op in node.ops]
+    if None in ops:
+        return None
+    left_fn = compile_ast(node.left)
+    comparator_fns = [compile_ast(comparator) for comparator in node.comparators]
+
+    if len(ops) == 1:
+        op, right_fn = ops[0], comparator_fns[0]
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            return op(
+                left_fn(state, static_tools, custom_tools, authorized_imports),
+                right_fn(state, static_tools, custom_tools, authorized_imports),
+            )
+
+        return run
+
+    pairs = list(zip(ops, comparator_fns))
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        result = True
+        left = left_fn(state, static_tools, custom_tools, authorized_imports)
+        for i, (op, comparator_fn) in enumerate(pairs):
+            right = comparator_fn(state, static_tools, custom_tools, authorized_imports)
+            current_result = op(left, right)
+            if current_result is False:
+                return False
+            result = current_result if i == 0 else (result and current_result)
+            left = right
+        return result
+
+    return run
+
+
+def _compile_ifexp(node: ast.IfExp) -> CompiledNode:
+    test_fn, body_fn, orelse_fn = compile_ast(node.test), compile_ast(node.body), compile_ast(node.orelse)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        if test_fn(state, static_tools, custom_tools, authorized_imports):
+            return body_fn(state, static_tools, custom_tools, authorized_imports)
+        return orelse_fn(state, static_tools, custom_tools, authorized_imports)
+
+    return run
+
+
+def _compile_sequence(node: Union[ast.List, ast.Tuple, ast.Set]) -> CompiledNode:
+    elt_fns = [compile_ast(elt) for elt in node.elts]
+    container_type = {ast.List: list, ast.Tuple: tuple, ast.Set: set}[type(node)]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return container_type([elt_fn(state, static_tools, custom_tools, authorized_imports) for elt_fn in elt_fns])
+
+    return run
+
+
+def _compile_dict(node: ast.Dict) -> Optional[CompiledNode]:
+    if any(key is None for key in node.keys):
+        # Dict unpacking is rejected by `evaluate_ast`, so let it raise the error
+        return None
+    item_fns = [(compile_ast(key), compile_ast(value)) for key, value in zip(node.keys, node.values)]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return {
+            key_fn(state, static_tools, custom_tools, authorized_imports): value_fn(
+                state, static_tools, custom_tools, authorized_imports
+            )
+            for key_fn, value_fn in item_fns
+        }
+
+    return run
+
+
+def _compile_joinedstr(node: ast.JoinedStr) -> CompiledNode:
+    value_fns = [compile_ast(value) for value in node.values]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return "".join(
+            [str(value_fn(state, static_tools, custom_tools, authorized_imports)) for value_fn in value_fns]
+        )
+
+    return run
+
+
+def _compile_formattedvalue(node: ast.FormattedValue) -> CompiledNode:
+    value_fn = compile_ast(node.value)
+    if not node.format_spec:
+        return value_fn
+    format_spec_fn = compile_ast(node.format_spec)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        value = value_fn(state, static_tools, custom_tools, authorized_imports)
+        return format(value, format_spec_fn(state, static_tools, custom_tools, authorized_imports))
+
+    return run
+
+
+def _compile_function_lookup(func: ast.expr) -> Optional[Tuple[CompiledNode, Optional[str]]]:
+    """Compiles the function part of a call, mirroring how `evaluate_call` resolves it."""
+    if isinstance(func, ast.Call):
+        call_fn = _compile_call(func)
+        return (call_fn, None) if call_fn is not None else None
+    elif isinstance(func, ast.Lambda):
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            return evaluate_lambda(func, state, static_tools, custom_tools, authorized_imports)
+
+        return run, None
+    elif isinstance(func, ast.Attribute):
+        obj_fn, func_name = compile_ast(func.value), func.attr
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            obj = obj_fn(state, static_tools, custom_tools, authorized_imports)
+            check_attribute_access(func_name, authorized_imports)
+            if not hasattr(obj, func_name):
+                raise InterpreterError(f"Object {obj} has no attribute {func_name}")
+            return getattr(obj, func_name)
+
+        return run, func_name
+    elif isinstance(func, ast.Name):
+        func_name = func.id
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            func = lookup_name(func_name, state, static_tools, custom_tools)
+            if func is UNDEFINED:
+                raise InterpreterError(
+                    f"It is not permitted to evaluate other functions than the provided tools or functions defined/imported in previous code (tried to execute {func_name})."
+                    + suggest_close_names(func_name, state, static_tools, custom_tools)
+                )
+            return func
+
+        return run, func_name
+    elif isinstance(func, ast.Subscript):
+        subscript_fn = _compile_subscript(func)
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            function = subscript_fn(state, static_tools, custom_tools, authorized_imports)
+            if not callable(function):
+                raise InterpreterError(f"This is not a correct function: {func}).")
+            return function
+
+        return run, None
+    return None
+
+
+def _compile_call(node: ast.Call) -> Optional[CompiledNode]:
+    function_lookup = _compile_function_lookup(node.func)
+    if function_lookup is None:
+        return None
+    func_fn, func_name = function_lookup
+    arg_fns = [
+        (isinstance(arg, ast.Starred), compile_ast(arg.value if isinstance(arg, ast.Starred) else arg))
+        for arg in node.args
+    ]
+    keyword_fns = [(keyword.arg, compile_ast(keyword.value)) for keyword in node.keywords]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        func = func_fn(state, static_tools, custom_tools, authorized_imports)
+        args = []
+        for is_starred, arg_fn in arg_fns:
+            if is_starred:
+                args.extend(arg_fn(state, static_tools, custom_tools, authorized_imports))
+            else:
+                args.append(arg_fn(state, static_tools, custom_tools, authorized_imports))
+        kwargs = {
+            name: value_fn(state, static_tools, custom_tools, authorized_imports) for name, value_fn in keyword_fns
+        }
+        return call_function(func, func_name, args, kwargs, state, static_tools, authorized_imports)
+
+    return run
+
+
+def _compile_target(target: ast.expr) -> Callable[..., None]:
+    """Compiles an assignment target into a setter mirroring `set_value`."""
+    if isinstance(target, ast.Name):
+        name_id = target.id
+
+        def set_name(value, state, static_tools, custom_tools, authorized_imports):
+            if name_id in static_tools:
+                raise InterpreterError(f"Cannot assign to name '{name_id}': doing this would erase the existing tool!")
+            state[name_id] = value
+
+        return set_name
+    elif isinstance(target, ast.Tuple):
+        elt_setters = [_compile_target(elt) for elt in target.elts]
+
+        def set_tuple(value, state, static_tools, custom_tools, authorized_imports):
+            if not isinstance(value, tuple):
+                if hasattr(value, "__iter__") and not isinstance(value, (str, bytes)):
+                    value = tuple(value)
+                else:
+                    raise InterpreterError("Cannot unpack non-tuple value")
+            if len(elt_setters) != len(value):
+                raise InterpreterError("Cannot unpack tuple of wrong size")
+            for i, elt_setter in enumerate(elt_setters):
+                elt_setter(value[i], state, static_tools, custom_tools, authorized_imports)
+
+        return set_tuple
+    elif isinstance(target, ast.Subscript):
+        obj_fn, key_fn = compile_ast(target.value), compile_ast(target.slice)
+
+        def set_item(value, state, static_tools, custom_tools, authorized_imports):
+            obj = obj_fn(state, static_tools, custom_tools, authorized_imports)
+            key = key_fn(state, static_tools, custom_tools, authorized_imports)
+            obj[key] = value
+
+        return set_item
+    elif isinstance(target, ast.Attribute):
+        obj_fn, attr = compile_ast(target.value), target.attr
+
+        def set_attribute(value, state, static_tools, custom_tools, authorized_imports):
+            setattr(obj_fn(state, static_tools, custom_tools, authorized_imports), attr, value)
+
+        return set_attribute
+
+    def set_other(value, state, static_tools, custom_tools, authorized_imports):
+        set_value(target, value, state, static_tools, custom_tools, authorized_imports)
+
+    return set_other
+
+
+def _compile_assign(node: ast.Assign) -> CompiledNode:
+    value_fn = compile_ast(node.value)
+    target_setters = [_compile_target(target) for target in node.targets]
+    starred_targets = [isinstance(target, ast.Starred) for target in node.targets]
+
+    if len(target_setters) == 1:
+        target_setter = target_setters[0]
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            result = value_fn(state, static_tools, custom_tools, authorized_imports)
+            target_setter(result, state, static_tools, custom_tools, authorized_imports)
+            return result
+
+        return run
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        result = value_fn(state, static_tools, custom_tools, authorized_imports)
+        expanded_values = []
+        for is_starred in starred_targets:
+            if is_starred:
+                expanded_values.extend(result)
+            else:
+                expanded_values.append(result)
+        for target_setter, value in zip(target_setters, expanded_values):
+            target_setter(value, state, static_tools, custom_tools, authorized_imports)
+        return result
+
+    return run
+
+
+def _compile_augassign_getter(target: ast.expr) -> CompiledNode:
+    """Compiles the read of an augmented assignment target, mirroring `evaluate_augassign`."""
+    if isinstance(target, ast.Name):
+        name_id = target.id
+
+        def get_name(state, static_tools, custom_tools, authorized_imports):
+            return state.get(name_id, 0)
+
+        return get_name
+    elif isinstance(target, ast.Subscript):
+        obj_fn, key_fn = compile_ast(target.value), compile_ast(target.slice)
+
+        def get_item(state, static_tools, custom_tools, authorized_imports):
+            obj = obj_fn(state, static_tools, custom_tools, authorized_imports)
+            return obj[key_fn(state, static_tools, custom_tools, authorized_imports)]
+
+        return get_item
+    elif isinstance(target, ast.Attribute):
+        obj_fn, attr = compile_ast(target.value), target.attr
+
+        def get_attribute(state, static_tools, custom_tools, authorized_imports):
+            return getattr(obj_fn(state, static_tools, custom_tools, authorized_imports), attr)
+
+        return get_attribute
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        elt_getters = [_compile_augassign_getter(elt) for elt in target.elts]
+        container_type = tuple if isinstance(target, ast.Tuple) else list
+
+        def get_sequence(state, static_tools, custom_tools, authorized_imports):
+            return container_type(
+                elt_getter(state, static_tools, custom_tools, authorized_imports) for elt_getter in elt_getters
+            )
+
+        return get_sequence
+
+    def get_other(state, static_tools, custom_tools, authorized_imports):
+        raise InterpreterError("AugAssign not supported for {type(target)} targets.")
+
+    return get_other
+
+
+def _compile_augassign(node: ast.AugAssign) -> Optional[CompiledNode]:
+    op = INPLACE_OPERATORS.get(type(node.op))
+    if op is None:
+        return None
+    is_add = isinstance(node.op, ast.Add)
+    getter, target_setter = _compile_augassign_getter(node.target), _compile_target(node.target)
+    value_fn = compile_ast(node.value)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        current_value = getter(state, static_tools, custom_tools, authorized_imports)
+        value_to_add = value_fn(state, static_tools, custom_tools, authorized_imports)
+        if is_add and isinstance(current_value, list) and not isinstance(value_to_add, list):
+            raise InterpreterError(f"Cannot add non-list value {value_to_add} to a list.")
+        current_value = op(current_value, value_to_add)
+        # Update the state: current_value has been updated in-place
+        target_setter(current_value, state, static_tools, custom_tools, authorized_imports)
+        return current_value
+
+    return run
+
+
+def _compile_if(node: ast.If) -> CompiledNode:
+    test_fn, body_fns, orelse_fns = compile_ast(node.test), compile_body(node.body), compile_body(node.orelse)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        result = None
+        branch = body_fns if test_fn(state, static_tools, custom_tools, authorized_imports) else orelse_fns
+        for line_fn in branch:
+            line_result = line_fn(state, static_tools, custom_tools, authorized_imports)
+            if line_result is not None:
+                result = line_result
+        return result
+
+    return run
+
+
+def _compile_for(node: ast.For) -> CompiledNode:
+    iter_fn, target_setter, body_fns = compile_ast(node.iter), _compile_target(node.target), compile_body(node.body)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        result = None
+        charge_iteration = get_operation_budget().charge_iteration
+        iterator = iter_fn(state, static_tools, custom_tools, authorized_imports)
+        for counter in iterator:
+            charge_iteration()
+            target_setter(counter, state, static_tools, custom_tools, authorized_imports)
+            for line_fn in body_fns:
+                try:
+                    line_result = line_fn(state, static_tools, custom_tools, authorized_imports)
+                    if line_result is not None:
+                        result = line_result
+                except BreakException:
+                    break
+                except ContinueException:
+                    continue
+            else:
+                continue
+            break
+        return result
+
+    return run
+
+
+def _compile_while(node: ast.While) -> CompiledNode:
+    test_fn, body_fns = compile_ast(node.test), compile_body(node.body)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        budget = get_operation_budget()
+        iterations = 0
+        while test_fn(state, static_tools, custom_tools, authorized_imports):
+            budget.charge_iteration()
+            for line_fn in body_fns:
+                try:
+                    line_fn(state, static_tools, custom_tools, authorized_imports)
+                except BreakException:
+                    return None
+                except ContinueException:
+                    break
+            iterations += 1
+            budget.check_while_iterations(iterations)
+        return None
+
+    return run
+
+
+def _compile_try(node: ast.Try) -> CompiledNode:
+    body_fns, orelse_fns = compile_body(node.body), compile_body(node.orelse)
+    finalbody_fns = compile_body(node.finalbody)
+    handlers = [
+        (
+            compile_ast(handler.type) if handler.type is not None else None,
+            handler.name,
+            compile_body(handler.body),
+        )
+        for handler in node.handlers
+    ]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        try:
+            for stmt_fn in body_fns:
+                stmt_fn(state, static_tools, custom_tools, authorized_imports)
+        except Exception as e:
+            matched = False
+            for type_fn, handler_name, handler_fns in handlers:
+                if type_fn is None or isinstance(e, type_fn(state, static_tools, custom_tools, authorized_imports)):
+                    matched = True
+                    if handler_name:
+                        state[handler_name] = e
+                    for stmt_fn in handler_fns:
+                        stmt_fn(state, static_tools, custom_tools, authorized_imports)
+                    break
+            if not matched:
+                raise e
+        else:
+            for stmt_fn in orelse_fns:
+                stmt_fn(state, static_tools, custom_tools, authorized_imports)
+        finally:
+            for stmt_fn in finalbody_fns:
+                stmt_fn(state, static_tools, custom_tools, authorized_imports)
+
+    return run
+
+
+def _compile_pass(node: ast.Pass) -> CompiledNode:
+    def run(state, static_tools, custom_tools, authorized_imports):
+        return None
+
+    return run
+
+
+def _compile_break(node: ast.Break) -> CompiledNode:
+    def run(state, static_tools, custom_tools, authorized_imports):
+        raise BreakException()
+
+    return run
+
+
+def _compile_continue(node: ast.Continue) -> CompiledNode:
+    def run(state, static_tools, custom_tools, authorized_imports):
+        raise ContinueException()
+
+    return run
+
+
+def _compile_return(node: ast.Return) -> CompiledNode:
+    value_fn = compile_ast(node.value) if node.value else None
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        raise ReturnException(
+            value_fn(state, static_tools, custom_tools, authorized_imports) if value_fn is not None else None
+        )
+
+    return run
+
+
+def _compile_lambda(node: ast.Lambda) -> CompiledNode:
+    arg_names = [arg.arg for arg in node.args.args]
+    body_fn = compile_ast(node.body)
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        def lambda_func(*values: Any) -> Any:
+            new_state = new_local_scope(state, dict(zip(arg_names, values)))
+            return body_fn(new_state, static_tools, custom_tools, authorized_imports)
+
+        return lambda_func
+
+    return run
+
+
+def _compile_function_def(node: ast.FunctionDef) -> CompiledNode:
+    default_fns, body_fns = [compile_ast(d) for d in node.args.defaults], compile_body(node.body)
+    is_init = node.name == "__init__"
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        def new_func(*args: Any, **kwargs: Any) -> Any:
+            func_state = new_local_scope(state)
+            default_values = [
+                default_fn(state, static_tools, custom_tools, authorized_imports) for default_fn in default_fns
+            ]
+            bind_function_arguments(node, func_state, args, kwargs, default_values)
+
+            result = None
+            try:
+                for stmt_fn in body_fns:
+                    result = stmt_fn(func_state, static_tools, custom_tools, authorized_imports)
+            except ReturnException as e:
+                result = e.value
+
+            if is_init:
+                return None
+
+            return result
+
+        custom_tools[node.name] = new_func
+        return new_func
+
+    return run
+
+
+def _compile_comprehension_target(target: ast.expr) -> Callable[[Dict[str, Any], Any], None]:
+    """Compiles the target of a list comprehension generator, mirroring `evaluate_listcomp`."""
+    elements = target.elts if isinstance(target, ast.Tuple) else [target]
+    if not all(isinstance(element, ast.Name) for element in elements):
+
+        def set_unsupported(new_state, value):
+            raise InterpreterError(f"Unsupported comprehension target: {ast.unparse(target)}")
+
+        return set_unsupported
+    if isinstance(target, ast.Tuple):
+        elt_names = [elt.id for elt in target.elts]
+
+        def set_tuple(new_state, value):
+            for idx, elt_name in enumerate(elt_names):
+                new_state[elt_name] = value[idx]
+
+        return set_tuple
+    target_id = target.id
+
+    def set_name(new_state, value):
+        new_state[target_id] = value
+
+    return set_name
+
+
+def _compile_listcomp(node: ast.ListComp) -> CompiledNode:
+    elt_fn = compile_ast(node.elt)
+    generators = [
+        (compile_ast(generator.iter), _compile_comprehension_target(generator.target), compile_body(generator.ifs))
+        for generator in node.generators
+    ]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        def inner_evaluate(index: int, current_state: Dict[str, Any]) -> List[Any]:
+            if index >= len(generators):
+                return [elt_fn(current_state, static_tools, custom_tools, authorized_imports)]
+            iter_fn, target_setter, if_fns = generators[index]
+            result = []
+            for value in iter_fn(current_state, static_tools, custom_tools, authorized_imports):
+                charge_iteration()
+                target_setter(current_state, value)
+                if all(if_fn(current_state, static_tools, custom_tools, authorized_imports) for if_fn in if_fns):
+                    result.extend(inner_evaluate(index + 1, current_state))
+            return result
+
+        charge_iteration = get_operation_budget().charge_iteration
+        return inner_evaluate(0, new_local_scope(state))
+
+    return run
+
+
+def _compile_generatorexp(node: ast.GeneratorExp) -> CompiledNode:
+    elt_fn = compile_ast(node.elt)
+    generators = [
+        (compile_ast(generator.iter), _compile_comprehension_target(generator.target), compile_body(generator.ifs))
+        for generator in node.generators
+    ]
+    first_iter_fn = generators[0][0]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        def inner_evaluate(index: int, iter_value: Any, current_state: Dict[str, Any]) -> Generator[Any, None, None]:
+            _, target_setter, if_fns = generators[index]
+            for value in iter_value:
+                charge_iteration()
+                target_setter(current_state, value)
+                if all(if_fn(current_state, static_tools, custom_tools, authorized_imports) for if_fn in if_fns):
+                    if index + 1 < len(generators):
+                        next_iter_fn = generators[index + 1][0]
+                        next_iter_value = next_iter_fn(current_state, static_tools, custom_tools, authorized_imports)
+                        yield from inner_evaluate(index + 1, next_iter_value, current_state)
+                    else:
+                        yield elt_fn(current_state, static_tools, custom_tools, authorized_imports)
+
+        charge_iteration = get_operation_budget().charge_iteration
+        iter_value = iter(first_iter_fn(state, static_tools, custom_tools, authorized_imports))
+        return LazyIterator(inner_evaluate(0, iter_value, new_local_scope(state)))
+
+    return run
+
+
+def _compile_setcomp(node: Union[ast.SetComp, ast.DictComp]) -> CompiledNode:
+    is_dictcomp = isinstance(node, ast.DictComp)
+    if is_dictcomp:
+        key_fn, value_fn = compile_ast(node.key), compile_ast(node.value)
+    else:
+        elt_fn = compile_ast(node.elt)
+    generators = [
+        (compile_ast(generator.iter), _compile_target(generator.target), compile_body(generator.ifs))
+        for generator in node.generators
+    ]
+
+    def run(state, static_tools, custom_tools, authorized_imports):
+        result = {} if is_dictcomp else set()
+        new_state = new_local_scope(state)
+        charge_iteration = get_operation_budget().charge_iteration
+        for iter_fn, target_setter, if_fns in generators:
+            for value in iter_fn(state, static_tools, custom_tools, authorized_imports):
+                charge_iteration()
+                target_setter(value, new_state, static_tools, custom_tools, authorized_imports)
+                if all(if_fn(new_state, static_tools, custom_tools, authorized_imports) for if_fn in if_fns):
+                    if is_dictcomp:
+                        key = key_fn(new_state, static_tools, custom_tools, authorized_imports)
+                        result[key] = value_fn(new_state, static_tools, custom_tools, authorized_imports)
+                    else:
+                        result.add(elt_fn(new_state, static_tools, custom_tools, authorized_imports))
+        return result
+
+    return run
+
+
+NODE_COMPILERS: Dict[type, Callable[[Any], Optional[CompiledNode]]] = {
+    ast.Assign: _compile_assign,
+    ast.AugAssign: _compile_augassign,
+    ast.Call: _compile_call,
+    ast.Constant: _compile_constant,
+    ast.Tuple: _compile_sequence,
+    ast.List: _compile_sequence,
+    ast.Set: _compile_sequence,
+    ast.ListComp: _compile_listcomp,
+    ast.GeneratorExp: _compile_generatorexp,
+    ast.DictComp: _compile_setcomp,
+    ast.SetComp: _compile_setcomp,
+    ast.UnaryOp: _compile_unaryop,
+    ast.Starred: _compile_expr,
+    ast.BoolOp: _compile_boolop,
+    ast.Break: _compile_break,
+    ast.Continue: _compile_continue,
+    ast.BinOp: _compile_binop,
+    ast.Compare: _compile_compare,
+    ast.Lambda: _compile_lambda,
+    ast.FunctionDef: _compile_function_def,
+    ast.Dict: _compile_dict,
+    ast.Expr: _compile_expr,
+    ast.For: _compile_for,
+    ast.FormattedValue: _compile_formattedvalue,
+    ast.If: _compile_if,
+    ast.JoinedStr: _compile_joinedstr,
+    ast.Name: _compile_name,
+    ast.Subscript: _compile_subscript,
+    ast.IfExp: _compile_ifexp,
+    ast.Attribute: _compile_attribute,
+    ast.Slice: _compile_slice,
+    ast.While: _compile_while,
+    ast.Try: _compile_try,
+    ast.Return: _compile_return,
+    ast.Pass: _compile_pass,
+}
+
+
+@dataclass
+class StaticAnalysis:
+    """
+    Facts about a code action collected before running it, checked by `check_static_safety` against the tools,
+    variables and authorized imports of each evaluation.
+
+    Args:
+        findings (`list[tuple[ast.stmt, str, str]]`): In source order, the top-level statement, kind and name of each
+            import (`"import"` or `"import_from"`) and access to an attribute of `BUILTINS_ESCAPE_ATTRIBUTES`
+            (`"attribute"`). Imports in `try` blocks with exception handlers are left to the runtime checks, since the
+            code may handle their errors.
+        safe_result_nodes (`set[ast.AST]`): Nodes whose results never need to be checked by `check_safer_result`,
+            which are marked with `SAFE_RESULT_MARK`: the nodes of `SAFE_RESULT_NODES` and `SAFE_CONTAINER_NODES`,
+            and the operations, conditional expressions, expression statements and assignments of such nodes.
+        bound_names (`set[str]`): Names bound anywhere in the code, by assignments, definitions, imports or patterns.
+        loaded_names (`set[str]`): Names read anywhere in the code, including by augmented assignments and `del`.
+        mutated_names (`set[str]`): Names whose values the code may mutate, see [`find_mutated_names`].
+        native_safe (`bool`): Whether the code passes the whitelist of the native engine: it uses no name starting
+            with `__`, no attribute starting with `_` or one of `FRAME_ATTRIBUTE_PREFIXES`, none of
+            `NATIVE_FORBIDDEN_NAMES`, no bare `except:`, and only calls `format` on string literals without attribute
+            or item lookups in their fields. See [`compile_native_body`].
+    """
+
+    findings: List[Tuple[ast.stmt, str, str]]
+    safe_result_nodes: Set[ast.AST]
+    bound_names: Set[str]
+    loaded_names: Set[str]
+    mutated_names: Set[str]
+    native_safe: bool
+
+
+# Builtins whose calls neither mutate their arguments nor return values sharing parts of them
+NON_ALIASING_CALLS = {
+    "abs",
+    "all",
+    "any",
+    "bool",
+    "float",
+    "hash",
+    "int",
+    "isinstance",
+    "len",
+    "print",
+    "repr",
+    "round",
+    "str",
+}
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Starred)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _aliased_names(node: ast.AST) -> Set[str]:
+    """Names whose values, or parts of them, may be shared by the result of an expression."""
+    if isinstance(node, (ast.Compare, ast.JoinedStr)) or (
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in NON_ALIASING_CALLS
+    ):
+        return set()
+    if isinstance(node, ast.Name):
+        return {node.id}
+    names = set()
+    for child in ast.iter_child_nodes(node):
+        names |= _aliased_names(child)
+    return names
+
+
+def find_mutated_names(module: ast.Module) -> Set[str]:
+    """
+    Finds the names whose values a code action may mutate, conservatively: the names at the root of stored or deleted
+    attributes and items, of augmented assignments and of method calls, the names passed to calls of other functions
+    than `NON_ALIASING_CALLS` or returned by functions, and the names sharing their values with mutated names through
+    assignments or loops. Since any method may mutate its object, reading a value through a method, like `df.head()`,
+    counts as mutating it. Scopes are not distinguished.
+    """
+    mutated, aliases = set(), {}
+
+    def bind(target: ast.AST, value_names: Set[str]):
+        for node in ast.walk(target):
+            if isinstance(node, ast.Name):
+                aliases.setdefault(node.id, set()).update(value_names)
+            elif isinstance(node, (ast.Attribute, ast.Subscript)):
+                aliases.setdefault(_root_name(node), set()).update(value_names)
+
+    for node in ast.walk(module):
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            mutated.add(_root_name(node))
+        elif isinstance(node, ast.AugAssign):
+            mutated.add(_root_name(node.target))
+            bind(node.target, _aliased_names(node.value))
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                mutated.add(_root_name(node.func.value))
+            if not (isinstance(node.func, ast.Name) and node.func.id in NON_ALIASING_CALLS):
+                for argument in node.args + [keyword.value for keyword in node.keywords]:
+                    mutated |= _aliased_names(argument)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                bind(target, _aliased_names(node.value))
+        elif isinstance(node, (ast.AnnAssign, ast.NamedExpr)) and node.value is not None:
+            bind(node.target, _aliased_names(node.value))
+        elif isinstance(node, (ast.For, ast.AsyncFor, ast.comprehension)):
+            bind(node.target, _aliased_names(node.iter))
+        elif isinstance(node, ast.withitem) and node.optional_vars is not None:
+            bind(node.optional_vars, _aliased_names(node.context_expr))
+        elif isinstance(node, (ast.Return, ast.Yield, ast.YieldFrom)) and node.value is not None:
+            mutated |= _aliased_names(node.value)
+    # Mutating a name may mutate the values it shares with other names
+    pending = list(mutated)
+    while pending:
+        for name in aliases.get(pending.pop(), ()):
+            if name not in mutated:
+                mutated.add(name)
+                pending.append(name)
+    mutated.discard(None)
+    return mutated
+
+
+def is_safe_format_string(format_string: str) -> bool:
+    """Whether formatting the string with `str.format` only looks up arguments, and none of their attributes or items."""
+    try:
+        for _, field_name, format_spec, _ in string.Formatter().parse(format_string):
+            if field_name is not None and ("." in field_name or "[" in field_name):
+                return False
+            if format_spec and not is_safe_format_string(format_spec):
+                return False
+    except ValueError:
+        return False
+    return True
+
+
+class StaticAnalyzer(ast.NodeVisitor):
+    """Collects the [`StaticAnalysis`] of a parsed module."""
+
+    def __init__(self):
+        self.findings = []
+        self.safe_result_nodes = set()
+        self.bound_names = set()
+        self.loaded_names = set()
+        self.native_safe = True
+        self._statement = None
+        self._handled_depth = 0
+
+    def analyze(self, module: ast.Module) -> StaticAnalysis:
+        for statement in module.body:
+            self._statement = statement
+            self.visit(statement)
+            self._mark_safe_results(statement)
+        return StaticAnalysis(
+            findings=self.findings,
+            safe_result_nodes=self.safe_result_nodes,
+            bound_names=self.bound_names,
+            loaded_names=self.loaded_names,
+            mutated_names=find_mutated_names(module),
+            native_safe=self.native_safe,
+        )
+
+    def _mark_safe_results(self, node: ast.AST):
+        """Marks the nodes of a subtree whose results don't need to be checked, children first."""
+        for child in ast.iter_child_nodes(node):
+            self._mark_safe_results(child)
+        if self._is_safe_result(node):
+            setattr(node, SAFE_RESULT_MARK, True)
+            self.safe_result_nodes.add(node)
+
+    def _is_safe_result(self, node: ast.AST) -> bool:
+        safe = self.safe_result_nodes.__contains__
+        if isinstance(node, (SAFE_RESULT_NODES, SAFE_CONTAINER_NODES)):
+            return True
+        elif isinstance(node, ast.BinOp):
+            # Operations on literals and containers return literals and containers
+            return safe(node.left) and safe(node.right)
+        elif isinstance(node, ast.UnaryOp):
+            return safe(node.operand)
+        elif isinstance(node, ast.BoolOp):
+            return all(map(safe, node.values))
+        elif isinstance(node, ast.Compare):
+            return safe(node.left) and all(map(safe, node.comparators))
+        elif isinstance(node, ast.IfExp):
+            return safe(node.body) and safe(node.orelse)
+        elif isinstance(node, ast.Dict):
+            # `check_safer_result` only looks at the `__name__` key of dicts
+            return all(isinstance(key, ast.Constant) and key.value != "__name__" for key in node.keys)
+        elif isinstance(node, (ast.Expr, ast.Assign, ast.AnnAssign)):
+            return node.value is not None and safe(node.value)
+        return False
+
+    def _add_finding(self, kind: str, name: str):
+        if self._handled_depth == 0 or kind == "attribute":
+            self.findings.append((self._statement, kind, name))
+
+    def _bind(self, name: str):
+        self.bound_names.add(name)
+        # Binding special names could replace the namespaces of the native engine, like `__builtins__`
+        if name.startswith("__"):
+            self.native_safe = False
+
+    def visit_Try(self, node: ast.Try):
+        self._handled_depth += bool(node.handlers)
+        for statement in node.body:
+            self.visit(statement)
+        self._handled_depth -= bool(node.handlers)
+        for child in node.handlers + node.orelse + node.finalbody:
+            self.visit(child)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self._add_finding("import", alias.name)
+            self._bind(alias.asname or alias.name)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.module is not None:
+            self._add_finding("import_from", node.module)
+        for alias in node.names:
+            self._bind(alias.asname or alias.name)
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if node.attr in BUILTINS_ESCAPE_ATTRIBUTES:
+            self._add_finding("attribute", node.attr)
+        if node.attr.startswith(("_", *FRAME_ATTRIBUTE_PREFIXES)) or node.attr in ("format_map", "vformat"):
+            self.native_safe = False
+        elif node.attr == "format" and not (
+            isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+            and is_safe_format_string(node.value.value)
+        ):
+            self.native_safe = False
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        if node.id.startswith("__") or node.id in NATIVE_FORBIDDEN_NAMES:
+            self.native_safe = False
+        if isinstance(node.ctx, ast.Load):
+            self.loaded_names.add(node.id)
+        else:
+            self.bound_names.add(node.id)
+            if isinstance(node.ctx, ast.Del):
+                self.loaded_names.add(node.id)
+
+    def visit_AugAssign(self, node: ast.AugAssign):
+        if isinstance(node.target, ast.Name):
+            self.loaded_names.add(node.target.id)
+        self.generic_visit(node)
+
+    def visit_arg(self, node: ast.arg):
+        self.bound_names.add(node.arg)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._bind(node.name)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._bind(node.name)
+        for child in node.bases + node.keywords + node.decorator_list:
+            self.visit(child)
+        for statement in node.body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                # Methods are bound in the class namespace, where special names like `__init__` are expected
+                self.bound_names.add(statement.name)
+                self.generic_visit(statement)
+            else:
+                self.visit(statement)
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler):
+        # A bare `except:` would catch the `ExecutionLimitExceeded` raised by the watchdog in natively run code
+        if node.type is None:
+            self.native_safe = False
+        if node.name:
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchAs(self, node: ast.MatchAs):
+        if node.name:
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    visit_MatchStar = visit_MatchAs
+
+    def visit_MatchMapping(self, node: ast.MatchMapping):
+        if node.rest:
+            self._bind(node.rest)
+        self.generic_visit(node)
+
+
+def check_static_safety(code: str, analysis: StaticAnalysis, authorized_imports: List[str]) -> None:
+    """
+    Rejects a code action before running it if it imports unauthorized modules or accesses the builtins namespace
+    through an attribute. These would fail at runtime anyway, but possibly after side effects of the code run before
+    them. Calls to undefined names are left to the runtime, since they may be in branches that never run.
+
+    Raises:
+        `InterpreterError`: With the same message as the runtime check, for the first offending statement.
+    """
+    for statement, kind, name in analysis.findings:
+        if kind == "import" and not check_module_authorized(name, authorized_imports):
+            error_message = f"Import of {name} is not allowed. Authorized imports are: {str(authorized_imports)}"
+        elif kind == "import_from" and not check_module_authorized(name, authorized_imports):
+            error_message = f"Import from {name} is not allowed. Authorized imports are: {str(authorized_imports)}"
+        elif kind == "attribute" and "*" not in authorized_imports and "builtins" not in authorized_imports:
+            error_message = f"Forbidden access to module: builtins through the `{name}` attribute"
+        else:
+            continue
+        raise InterpreterError(
+            f"Code execution failed at line '{ast.get_source_segment(code, statement)}' due to: "
+            f"InterpreterError: {error_message}"
+        )
+
+
+# Identifiers of the `while` loops of natively run code, unique in the process
+_NATIVE_WHILE_IDS = itertools.count()
+
+
+class NativeCodeTransformer(ast.NodeTransformer):
+    """
+    Instruments code run by the native engine: values of attributes, items and calls go through `check_safer_result`,
+    callees are checked like `evaluate_call` does, and each loop iteration and comprehension item is charged to the
+    [`OperationBudget`], which also limits the iterations of each `while` loop.
+    """
+
+    def _call(self, name: str, node: ast.AST, args: List[ast.expr]) -> ast.Call:
+        return ast.copy_location(ast.Call(ast.Name(name, ast.Load()), args, []), node)
+
+    def _check(self, node: ast.expr) -> ast.Call:
+        return self._call(NATIVE_CHECK_NAME, node, [node])
+
+    def _count(self, node: ast.AST, *args: ast.expr) -> ast.Call:
+        return self._call(NATIVE_COUNT_NAME, node, list(args))
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.expr:
+        self.generic_visit(node)
+        return self._check(node) if isinstance(node.ctx, ast.Load) else node
+
+    visit_Subscript = visit_Attribute
+
+    def visit_Call(self, node: ast.Call) -> ast.Call:
+        self.generic_visit(node)
+        node.func = self._call(NATIVE_CALL_NAME, node.func, [node.func])
+        return self._check(node)
+
+    def visit_For(self, node: ast.For) -> ast.stmt:
+        self.generic_visit(node)
+        node.body.insert(0, ast.copy_location(ast.Expr(self._count(node)), node))
+        return node
+
+    def visit_While(self, node: ast.While) -> List[ast.stmt]:
+        # The iterations are counted from the start of each run of the loop, like `evaluate_while` does
+        self.generic_visit(node)
+        loop_id = ast.Constant(next(_NATIVE_WHILE_IDS))
+        node.body.insert(0, ast.copy_location(ast.Expr(self._count(node, loop_id)), node))
+        return [ast.copy_location(ast.Expr(self._call(NATIVE_WHILE_NAME, node, [loop_id])), node), node]
+
+    def visit_comprehension(self, node: ast.comprehension) -> ast.comprehension:
+        self.generic_visit(node)
+        node.ifs.insert(0, self._count(node.iter))
+        return node
+
+
+def compile_native_body(body: List[ast.stmt]) -> List[CompiledNode]:
+    """
+    Compiles top-level statements to CPython bytecode, returning a runner per statement like `compile_body`.
+
+    The runners execute the bytecode with the state as globals, and the namespace built by `get_native_builtins` as
+    builtins. They must only be used for code whose [`StaticAnalysis`] is `native_safe`: since attributes are looked up
+    natively, the whitelist ensures they are written in the code and don't give access to private or special ones.
+    Like with the other engines, an evaluation returns the value of its last statement if it is an expression or an
+    assignment to a single name.
+
+    Raises:
+        `SyntaxError`: If a statement can't be compiled, e.g. `return` outside of a function.
+    """
+    runners = []
+    for node in body:
+        instrumented = NativeCodeTransformer().visit(copy.deepcopy(node))
+        if isinstance(instrumented, ast.Expr):
+            expression = ast.fix_missing_locations(ast.Expression(instrumented.value))
+            runners.append(_native_runner(compile(expression, "<code>", "eval"), None, True))
+            continue
+        # A `while` loop is instrumented into several statements
+        statements = instrumented if isinstance(instrumented, list) else [instrumented]
+        result_name = None
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            result_name = node.targets[0].id
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)) and isinstance(node.target, ast.Name):
+            result_name = node.target.id
+        module = ast.fix_missing_locations(ast.Module(statements, []))
+        runners.append(_native_runner(compile(module, "<code>", "exec"), result_name, False))
+    return runners
+
+
+def _native_runner(code_object, result_name: Optional[str], is_expression: bool) -> CompiledNode:
+    def run(state, static_tools, custom_tools, authorized_imports):
+        if is_expression:
+            return eval(code_object, state)
+        exec(code_object, state)
+        return state.get(result_name) if result_name is not None else None
+
+    return run
+
+
+def get_native_builtins(
+    state: Dict[str, Any],
+    static_tools: Dict[str, Callable],
+    custom_tools: Dict[str, Callable],
+    authorized_imports: List[str],
+    budget: OperationBudget,
+) -> Dict[str, Any]:
+    """
+    Builds the builtins namespace of natively run code: the exceptions and tools, resolved after the state like
+    `evaluate_name` does, an import function restricted to the authorized imports, and the runtime checks.
+
+    Functions defined natively keep the builtins namespace they were defined with, so to run functions defined by
+    previous evaluations with the tools and budget of the current one, the same namespace must be updated in place with
+    the result of this function, see the `native_builtins` argument of `evaluate_python_code`.
+    """
+    while_iterations = {}
+
+    def native_print(*args, **kwargs):
+        state["_print_outputs"] += " ".join(map(str, args)) + "\n"
+
+    def native_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and check_module_authorized(name, authorized_imports):
+            return get_safe_module(__import__(name, fromlist=fromlist), authorized_imports)
+        kind = "Import from" if fromlist else "Import of"
+        raise InterpreterError(f"{kind} {name} is not allowed. Authorized imports are: {str(authorized_imports)}")
+
+    def check(value):
+        return check_safer_result(value, static_tools, authorized_imports)
+
+    def call(func):
+        budget.charge_call()
+        if AuthorizationIndex.get(static_tools, authorized_imports).is_forbidden_builtin(func):
+            raise InterpreterError(
+                "Invoking a builtin function that has not been explicitly added as a tool is not allowed "
+                f"({getattr(func, '__name__', func)})."
+            )
+        return func
+
+    def start_while(loop_id):
+        while_iterations[loop_id] = 0
+
+    def count(loop_id=None):
+        budget.charge_iteration()
+        if loop_id is not None:
+            # A generator suspended in a loop may be resumed by a later evaluation, which didn't start the loop
+            while_iterations[loop_id] = while_iterations.get(loop_id, 0) + 1
+            budget.check_while_iterations(while_iterations[loop_id])
+        return True
+
+    return {
+        **ERRORS,
+        **custom_tools,
+        **static_tools,
+        "print": native_print,
+        "__import__": native_import,
+        "__build_class__": builtins.__build_class__,
+        "__name__": "__main__",
+        NATIVE_CHECK_NAME: check,
+        NATIVE_COUNT_NAME: count,
+        NATIVE_CALL_NAME: call,
+        NATIVE_WHILE_NAME: start_while,
+    }
+
+
+PURE_ARGUMENT_NODES = (
+    ast.Constant,
+    ast.Name,
+    ast.Load,
+    ast.JoinedStr,
+    ast.FormattedValue,
+    ast.List,
+    ast.Tuple,
+    ast.Set,
+    ast.Dict,
+)
+
+
+def find_independent_calls(body: List[ast.stmt]) -> List[List[int]]:
+    """
+    Finds the runs of consecutive statements calling a function by its name, either alone or assigned to a name, with
+    arguments built only from constants and names that the previous calls of the run don't assign.
+
+    Returns:
+        The indices of the statements of each run of at least two calls.
+    """
+    runs, run, assigned_names = [], [], set()
+    for index, statement in enumerate(body):
+        call = None
+        if isinstance(statement, ast.Expr) or (
+            isinstance(statement, ast.Assign)
+            and len(statement.targets) == 1
+            and isinstance(statement.targets[0], ast.Name)
+        ):
+            call = statement.value
+        if not (
+            isinstance(call, ast.Call)
+            and isinstance(call.func, ast.Name)
+            and all(keyword.arg is not None for keyword in call.keywords)
+            and all(
+                isinstance(node, PURE_ARGUMENT_NODES)
+                for argument in call.args + [keyword.value for keyword in call.keywords]
+                for node in ast.walk(argument)
+            )
+        ):
+            call = None
+        if call is None or any(isinstance(node, ast.Name) and node.id in assigned_names for node in ast.walk(call)):
+            if len(run) > 1:
+                runs.append(run)
+            run, assigned_names = [], set()
+            if call is None:
+                continue
+        run.append(index)
+        if isinstance(statement, ast.Assign):
+            assigned_names.add(statement.targets[0].id)
+    if len(run) > 1:
+        runs.append(run)
+    return runs
+
+
+def _raise_error(error: Exception):
+    raise error
+
+
+class IndependentToolCalls:
+    """
+    A run of independent tool calls found by `find_independent_calls`, dispatched all at once on a thread pool when
+    its first statement runs. Each statement then waits for its own call, so that the results are assigned and the
+    errors raised in program order. Unlike sequential calls, the calls following a failing one still run.
+
+    Args:
+        statements (`list[ast.stmt]`): The statements of the run.
+    """
+
+    def __init__(self, statements: List[ast.stmt]):
+        self.statements = statements
+        self.futures = []
+
+    def dispatch(
+        self,
+        state: Dict[str, Any],
+        static_tools: Dict[str, Callable],
+        custom_tools: Dict[str, Callable],
+        authorized_imports: List[str],
+    ):
+        calls = []
+        for statement in self.statements:
+            call = statement.value
+            try:
+                args = [evaluate_ast(arg, state, static_tools, custom_tools, authorized_imports) for arg in call.args]
+                kwargs = {
+                    keyword.arg: evaluate_ast(keyword.value, state, static_tools, custom_tools, authorized_imports)
+                    for keyword in call.keywords
+                }
+            except Exception as e:
+                # Raised when the statement runs
+                calls.append(partial(_raise_error, e))
+                continue
+            tool = static_tools[call.func.id]
+            calls.append(
+                partial(call_function, tool, call.func.id, args, kwargs, state, static_tools, authorized_imports)
+            )
+        self.futures = run_concurrently(calls, max_workers=len(calls))
+
+    def get_runner(self, position: int) -> CompiledNode:
+        """Returns the runner of the statement at `position` in the run."""
+        statement = self.statements[position]
+
+        def run(state, static_tools, custom_tools, authorized_imports):
+            if position == 0:
+                self.dispatch(state, static_tools, custom_tools, authorized_imports)
+            result = wait_for_future(self.futures[position])
+            if isinstance(statement, ast.Assign):
+                set_value(statement.targets[0], result, state, static_tools, custom_tools, authorized_imports)
+            return result
+
+        return run
+
+
+def dispatch_independent_tool_calls(
+    body: List[ast.stmt],
+    independent_calls: List[List[int]],
+    state: Dict[str, Any],
+    static_tools: Dict[str, Callable],
+    custom_tools: Dict[str, Callable],
+) -> Dict[int, CompiledNode]:
+    """
+    Returns runners of [`IndependentToolCalls`] replacing the statements of the runs of `independent_calls` that call
+    tools, by index. Assignments to a tool name are left to the engines, which raise the error.
+    """
+
+    def is_tool_call(index: int) -> bool:
+        statement = body[index]
+        name = statement.value.func.id
+        return (
+            isinstance(static_tools.get(name), Tool)
+            and name not in state
+            and not (isinstance(statement, ast.Assign) and statement.targets[0].id in static_tools)
+        )
+
+    runners = {}
+    for run in independent_calls:
+        for calls_tools, indices in groupby(run, key=is_tool_call):
+            indices = list(indices)
+            if calls_tools and len(indices) > 1:
+                tool_calls = IndependentToolCalls([body[index] for index in indices])
+                runners.update({index: tool_calls.get_runner(position) for position, index in enumerate(indices)})
+    return runners
+
+
+@dataclass
+class ParsedCode:
+    """
+    A parsed code action, along with the metadata precomputed from its nodes.
+
+    Args:
+        module (`ast.Module`): The parsed code.
+        compiled_body (`list[Callable]`, *optional*): Closures compiled with `compile_ast` for each top-level
+            statement, computed on first use.
+        static_analysis ([`StaticAnalysis`], *optional*): Static analysis of the code, computed on first use.
+        native_body (`list[Callable]`, *optional*): Runners compiled with `compile_native_body` for each top-level
+            statement, computed on first use if the code is `native_safe`.
+        profiled_body (`list[Callable]`, *optional*): Closures compiled with `compile_profiled_body` for each
+            top-level statement, computed on first use.
+        independent_calls (`list[list[int]]`, *optional*): Runs of top-level statements found by
+            `find_independent_calls`, computed on first use.
+    """
+
+    module: ast.Module
+    compiled_body: Optional[List[CompiledNode]] = field(default=None, repr=False)
+    static_analysis: Optional[StaticAnalysis] = field(default=None, repr=False)
+    native_body: Optional[List[CompiledNode]] = field(default=None, repr=False)
+    profiled_body: Optional[List[CompiledNode]] = field(default=None, repr=False)
+    independent_calls: Optional[List[List[int]]] = field(default=None, repr=False)
+
+    def get_static_analysis(self) -> StaticAnalysis:
+        if self.static_analysis is None:
+            self.static_analysis = StaticAnalyzer().analyze(self.module)
+        return self.static_analysis
+
+    def get_compiled_body(self) -> List[CompiledNode]:
+        if self.compiled_body is None:
+            self.get_static_analysis()  # Compiling reads the marks of the nodes with safe results
+            self.compiled_body = compile_body(self.module.body)
+        return self.compiled_body
+
+    def get_profiled_body(self) -> List[CompiledNode]:
+        if self.profiled_body is None:
+            self.get_static_analysis()
+            self.profiled_body = compile_profiled_body(self.module.body)
+        return self.profiled_body
+
+    def get_independent_calls(self) -> List[List[int]]:
+        if self.independent_calls is None:
+            self.independent_calls = find_independent_calls(self.module.body)
+        return self.independent_calls
+
+    def get_native_body(self) -> Optional[List[CompiledNode]]:
+        """Returns the runners of the native engine, or `None` if the code can't be run natively."""
+        analysis = self.get_static_analysis()
+        if self.native_body is None and analysis.native_safe:
+            try:
+                self.native_body = compile_native_body(self.module.body)
+            except SyntaxError:
+                analysis.native_safe = False
+        return self.native_body
+
+
+class CodeCache:
+    """
+    Bounded LRU cache of parsed code actions, keyed by the code, and shared by all executors in the process.
+
+    Agents often run the same snippets again across steps and runs (retries, `final_answer(...)` calls, helper
+    functions redefined at each step): the cache avoids parsing and compiling them again. The parsed nodes are only
+    read during the evaluation, so they can safely be shared.
+
+    Args:
+        max_size (`int`, default `256`): Maximum number of code actions to keep.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, ParsedCode] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, code: str) -> ParsedCode:
+        """
+        Returns the parsed code, parsing it if it is not cached yet.
+
+        Raises:
+            SyntaxError: If the code cannot be parsed. Failures are not cached.
+        """
+        with self._lock:
+            parsed_code = self._entries.get(code)
+            if parsed_code is not None:
+                self._entries.move_to_end(code)
+                self.hits += 1
+                return parsed_code
+            self.misses += 1
+        parsed_code = ParsedCode(module=ast.parse(code))
+        with self._lock:
+            self._entries[code] = parsed_code
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return parsed_code
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+CODE_CACHE = CodeCache()
+
+
+class FinalAnswerException(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+def evaluate_python_code(
+    code: str,
+    static_tools: Optional[Dict[str, Callable]] = None,
+    custom_tools: Optional[Dict[str, Callable]] = None,
+    state: Optional[Dict[str, Any]] = None,
+    authorized_imports: List[str] = BASE_BUILTIN_MODULES,
+    max_print_outputs_length: int = DEFAULT_MAX_LEN_OUTPUT,
+    compile_code: bool = False,
+    output_sink: Optional[Callable[[str], None]] = None,
+    timeout: Optional[float] = None,
+    max_memory: Optional[int] = None,
+    native_code: bool = False,
+    profile: Optional[ExecutionProfile] = None,
+    budget: Optional[OperationBudget] = None,
+    parallel_tool_calls: bool = False,
+    native_builtins: Optional[Dict[str, Any]] = None,
+):
+    """
+    Evaluate a python expression using the content of the variables stored in a state and only evaluating a given set
+    of functions.
+
+    This function will recurse through the nodes of the tree provided, or run them as compiled closures if
+    `compile_code` is set, or as CPython bytecode if `native_code` is set and the code passes the whitelist of the
+    native engine. The parsed code is cached in `CODE_CACHE`, shared by all executors of the process.
+
+    Args:
+        code (`str`):
+            The code to evaluate.
+        static_tools (`Dict[str, Callable]`):
+            The functions that may be called during the evaluation. These can also be agents in a multiagent setting.
+            These tools cannot be overwritten in the code: any assignment to their name will raise an error.
+        custom_tools (`Dict[str, Callable]`):
+            The functions that may be called during the evaluation.
+            These tools can be overwritten in the code: any assignment to their name will overwrite them.
+        state (`Dict[str, Any]`):
             A dictionary mapping variable names to values. The `state` should contain the initial inputs but will be
             updated by this function to contain all variables as they are evaluated.
             The print outputs will be stored in the state under the key "_print_outputs".
+        authorized_imports (`List[str]`):
+            The list of modules that can be imported by the code.
+        max_print_outputs_length (`int`):
+            Maximum length of the print outputs.
+        compile_code (`bool`, default `False`):
+            Whether to compile the code into closures with `compile_ast` before running it, instead of walking the
+            abstract syntax tree at each evaluation.
+        output_sink (`Callable[[str], None]`, *optional*):
+            Callback receiving the print outputs as they are printed, e.g. to stream them while the code is running.
+        timeout (`float`, *optional*):
+            Maximum wall-clock time of the evaluation in seconds, enforced by an [`ExecutionWatchdog`].
+        max_memory (`int`, *optional*):
+            Maximum growth of the memory of the whole process during the evaluation in bytes, including the
+            allocations of other threads, enforced by an [`ExecutionWatchdog`].
+        native_code (`bool`, default `False`):
+            Whether to run code passing the whitelist of [`StaticAnalysis`] as CPython bytecode with
+            `compile_native_body`, checking only the values of attributes, items and calls. Other code falls back to
+            the engine selected by `compile_code`.
+        profile ([`ExecutionProfile`], *optional*):
+            Profile to fill with the time and operations of each statement, line and tool call. Profiled code always
+            runs with closures compiled by `compile_profiled_body`, so evaluations without a profile don't pay for it.
+        budget ([`OperationBudget`], *optional*):
+            Budget charged by the function calls and loop iterations of the evaluation. Defaults to a new budget with
+            the default limits.
+        parallel_tool_calls (`bool`, default `False`):
+            Whether to call tools concurrently when consecutive top-level statements call them with independent
+            arguments, like `a = web_search("a")` followed by `b = web_search("b")`. See [`IndependentToolCalls`].
+        native_builtins (`Dict[str, Any]`, *optional*):
+            Builtins namespace of natively run code, updated in place by `get_native_builtins`. Functions defined
+            natively by previous evaluations keep the namespace they were defined with: passing the same dictionary to
+            the evaluations sharing a state makes them use the tools and budget of the current evaluation. Defaults to
+            a new namespace.
     """
     try:
-        expression = ast.parse(code)
+        parsed_code = CODE_CACHE.get(code)
     except SyntaxError as e:
         raise InterpreterError(
             f"Code parsing failed on line {e.lineno} due to: {type(e).__name__}\n"
@@ -1397,8 +3697,14 @@ def evaluate_python_code(
     static_tools = static_tools.copy() if static_tools is not None else {}
     custom_tools = custom_tools if custom_tools is not None else {}
     result = None
-    state["_print_outputs"] = PrintContainer()
-    state["_operations_count"] = 0
+    state["_print_outputs"] = PrintContainer(max_length=max_print_outputs_length, output_sink=output_sink)
+    if budget is None:
+        budget = OperationBudget()
+
+    if profile is not None:
+        for name, tool in static_tools.items():
+            if name not in BASE_PYTHON_TOOLS:
+                static_tools[name] = profile.profile_tool(name, tool)
 
     if "final_answer" in static_tools:
         previous_final_answer = static_tools["final_answer"]
@@ -1408,41 +3714,318 @@ def evaluate_python_code(
 
         static_tools["final_answer"] = final_answer
 
+    static_analysis = parsed_code.get_static_analysis()
+    check_static_safety(code, static_analysis, authorized_imports)
+
+    native_body = None
+    # Static tools can't be overwritten, which only the other engines check
+    if native_code and profile is None and not static_analysis.bound_names & static_tools.keys():
+        native_body = parsed_code.get_native_body()
+    if profile is not None:
+        compiled_body = zip(parsed_code.module.body, parsed_code.get_profiled_body())
+    elif native_body is not None:
+        if native_builtins is None:
+            native_builtins = {}
+        native_builtins.clear()
+        native_builtins.update(get_native_builtins(state, static_tools, custom_tools, authorized_imports, budget))
+        state["__builtins__"] = native_builtins
+        compiled_body = zip(parsed_code.module.body, native_body)
+    elif compile_code:
+        compiled_body = zip(parsed_code.module.body, parsed_code.get_compiled_body())
+    else:
+        compiled_body = [(node, partial(evaluate_ast, node)) for node in parsed_code.module.body]
+    if parallel_tool_calls and parsed_code.get_independent_calls():
+        compiled_body = list(compiled_body)
+        for index, run in dispatch_independent_tool_calls(
+            parsed_code.module.body, parsed_code.get_independent_calls(), state, static_tools, custom_tools
+        ).items():
+            compiled_body[index] = (compiled_body[index][0], run)
+
+    watchdog = ExecutionWatchdog(timeout=timeout, max_memory=max_memory)
+    profile_token = _EXECUTION_PROFILE.set(profile)
+    budget_token = _OPERATION_BUDGET.set(budget)
+    start_time = time.perf_counter()
     try:
-        for node in expression.body:
-            result = evaluate_ast(node, state, static_tools, custom_tools, authorized_imports)
-        state["_print_outputs"].value = truncate_content(
-            str(state["_print_outputs"]), max_length=max_print_outputs_length
-        )
-        is_final_answer = False
-        return result, is_final_answer
-    except FinalAnswerException as e:
-        state["_print_outputs"].value = truncate_content(
-            str(state["_print_outputs"]), max_length=max_print_outputs_length
-        )
-        is_final_answer = True
-        return e.value, is_final_answer
-    except Exception as e:
-        state["_print_outputs"].value = truncate_content(
-            str(state["_print_outputs"]), max_length=max_print_outputs_length
-        )
-        raise InterpreterError(
-            f"Code execution failed at line '{ast.get_source_segment(code, node)}' due to: {type(e).__name__}: {e}"
-        )
+        with watchdog:
+            try:
+                for node, run in compiled_body:
+                    result = run(state, static_tools, custom_tools, authorized_imports)
+                is_final_answer = False
+                return result, is_final_answer
+            except FinalAnswerException as e:
+                is_final_answer = True
+                return e.value, is_final_answer
+            except Exception as e:
+                raise InterpreterError(
+                    f"Code execution failed at line '{ast.get_source_segment(code, node)}' due to: {type(e).__name__}: {e}"
+                )
+            finally:
+                # Disarmed before leaving the `try`, so that a late `ExecutionLimitExceeded` is still caught below,
+                # and the handler below can't be interrupted. Exiting the context stops it again if this is interrupted.
+                watchdog.stop()
+    except ExecutionLimitExceeded:
+        raise InterpreterError(watchdog.error_message) from None
+    finally:
+        state.pop("__builtins__", None)
+        _EXECUTION_PROFILE.reset(profile_token)
+        _OPERATION_BUDGET.reset(budget_token)
+        if profile is not None:
+            profile.total_time += time.perf_counter() - start_time
 
 
 class PythonExecutor:
     pass
 
 
+@dataclass
+class ExecutorSnapshot:
+    """
+    Checkpoint of the variables and functions of a [`LocalPythonExecutor`], created with `snapshot`.
+
+    Args:
+        state (`dict[str, Any]`): The variables, sharing their values with the executor.
+        custom_tools (`dict[str, Callable]`): The functions defined by the code actions.
+        spilled (`dict[str, SpilledValue]`): The variables spilled to disk, see `max_state_memory`.
+    """
+
+    state: Dict[str, Any]
+    custom_tools: Dict[str, Callable]
+    spilled: Dict[str, "SpilledValue"] = field(default_factory=dict)
+
+
+def copy_shared_value(value: Any, memo: Dict[int, Any]) -> Any:
+    """Deep-copies a value shared with a snapshot, or returns it as is if it's immutable or can't be copied."""
+    if isinstance(value, (ModuleType, FunctionType, BuiltinFunctionType, type)):
+        return value
+    try:
+        return copy.deepcopy(value, memo)
+    except Exception:
+        # Values like generators can't be copied: they stay shared with the snapshots
+        return value
+
+
+def rebind_function(func: FunctionType, namespaces: Dict[int, Any], memo: Dict[int, Any]) -> FunctionType:
+    """
+    Copies a function defined by code actions so that it uses other namespaces, e.g. the state of a forked executor.
+
+    The closure variables and globals referring to one of the `namespaces`, given by the id of the namespace they
+    replace, are replaced, as well as the local scopes chained to them and the functions they refer to. Functions
+    that don't refer to any of the namespaces are returned as is.
+
+    Args:
+        func (`FunctionType`): Function to rebind.
+        namespaces (`dict[int, Any]`): The replacing namespaces, by id of the replaced ones.
+        memo (`dict[int, Any]`): Values already rebound, by id, shared by the calls rebinding related functions.
+    """
+    if id(func) in memo:
+        return memo[id(func)]
+    # A function referring to itself keeps referring to the original
+    memo[id(func)] = func
+    closure = tuple(_rebind_value(cell.cell_contents, namespaces, memo) for cell in func.__closure__ or ())
+    func_globals = _rebind_value(func.__globals__, namespaces, memo)
+    if func_globals is func.__globals__ and all(
+        new is cell.cell_contents for new, cell in zip(closure, func.__closure__ or ())
+    ):
+        return func
+    new_closure = tuple(CellType(value) for value in closure) if func.__closure__ is not None else None
+    if func_globals is func.__globals__:
+        new_func = FunctionType(func.__code__, func_globals, func.__name__, func.__defaults__, new_closure)
+    else:
+        # Functions run natively take their builtins from their globals when created: they must not get the real ones
+        func_builtins = namespaces.get(id(func.__builtins__), memo.get(id(func.__builtins__)))
+        if func_builtins is None:
+            func_builtins = {name: _rebind_value(value, namespaces, memo) for name, value in func.__builtins__.items()}
+            memo[id(func.__builtins__)] = func_builtins
+        previous_builtins = func_globals.get("__builtins__", UNDEFINED)
+        func_globals["__builtins__"] = func_builtins
+        try:
+            new_func = FunctionType(func.__code__, func_globals, func.__name__, func.__defaults__, new_closure)
+        finally:
+            if previous_builtins is UNDEFINED:
+                del func_globals["__builtins__"]
+            else:
+                func_globals["__builtins__"] = previous_builtins
+    new_func.__kwdefaults__ = func.__kwdefaults__
+    new_func.__qualname__ = func.__qualname__
+    new_func.__dict__.update(func.__dict__)
+    memo[id(func)] = new_func
+    return new_func
+
+
+def _rebind_value(value: Any, namespaces: Dict[int, Any], memo: Dict[int, Any]) -> Any:
+    if id(value) in namespaces:
+        return namespaces[id(value)]
+    if isinstance(value, FunctionType):
+        return rebind_function(value, namespaces, memo)
+    if isinstance(value, ChainMap):
+        maps = [_rebind_value(mapping, namespaces, memo) for mapping in value.maps]
+        if any(new is not mapping for new, mapping in zip(maps, value.maps)):
+            return ChainMap(*maps)
+    return value
+
+
+def estimate_size(value: Any, max_items: int = 10_000) -> int:
+    """
+    Estimates the memory used by a value in bytes: the buffers of arrays and dataframes, and the items of containers,
+    up to `max_items` of them. Modules, functions and classes count as 0 bytes since they are never spilled.
+    """
+    size, seen, pending = 0, set(), [value]
+    while pending and len(seen) < max_items:
+        value = pending.pop()
+        if id(value) in seen or isinstance(value, (ModuleType, FunctionType, BuiltinFunctionType, type)):
+            continue
+        seen.add(id(value))
+        memory_usage = getattr(value, "memory_usage", None)
+        nbytes = getattr(value, "nbytes", None)
+        if type(value).__module__.startswith("pandas") and callable(memory_usage):
+            usage = memory_usage(deep=True)
+            size += int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        elif isinstance(nbytes, int):
+            size += nbytes
+        else:
+            size += sys.getsizeof(value, 0)
+            if isinstance(value, dict):
+                pending.extend(value.keys())
+                pending.extend(value.values())
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                pending.extend(value)
+    return size
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpilledValue:
+    """
+    Value of a variable saved to a file by [`LocalPythonExecutor`] to free memory. NumPy arrays are saved as `.npy`
+    files and loaded back memory-mapped copy-on-write, so only the pages that are read come back to memory and changes
+    to the loaded array are not written to the file. Other values are pickled.
+
+    The file is deleted with the last reference to the spilled value, so that snapshots can still load it.
+
+    Args:
+        value (`Any`): The value to spill.
+        size (`int`): The estimated size of the value in bytes.
+        directory (`str`, *optional*): Directory of the file, the default temporary directory if not set.
+    """
+
+    def __init__(self, value: Any, size: int, directory: Optional[str] = None):
+        numpy = sys.modules.get("numpy")
+        self.is_array = (
+            numpy is not None and type(value) in (numpy.ndarray, numpy.memmap) and not value.dtype.hasobject
+        )
+        file_descriptor, self.path = tempfile.mkstemp(suffix=".npy" if self.is_array else ".pkl", dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                if self.is_array:
+                    numpy.save(file, value, allow_pickle=False)
+                else:
+                    pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            _remove_file(self.path)
+            raise
+        self.size = size
+        weakref.finalize(self, _remove_file, self.path)
+
+    def load(self) -> Any:
+        if self.is_array:
+            import numpy
+
+            return numpy.load(self.path, mmap_mode="c")
+        with open(self.path, "rb") as file:
+            return pickle.load(file)
+
+
+class SpillableState(dict):
+    """
+    Variables of a [`LocalPythonExecutor`], with the variables spilled to disk as [`SpilledValue`] in `spilled`.
+
+    Looking up a spilled variable loads it back, so that the code reaching it indirectly, e.g. through a method or a
+    function held in a container, finds it: `lookup_name` and natively run code look names up with `__getitem__`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spilled: Dict[str, SpilledValue] = {}
+
+    def __missing__(self, name: str) -> Any:
+        if name not in self.spilled:
+            raise KeyError(name)
+        self.load_spilled({name})
+        return self[name]
+
+    def load_spilled(self, names: Set[str]):
+        """Loads back the spilled variables among `names`."""
+        # Variables spilled together referred to the same value, so they are loaded together too
+        spilled_values = {id(self.spilled[name]): self.spilled[name] for name in names if name in self.spilled}
+        loaded_values = {value_id: spilled.load() for value_id, spilled in spilled_values.items()}
+        for name, spilled in list(self.spilled.items()):
+            if id(spilled) in loaded_values:
+                self[name] = loaded_values[id(spilled)]
+                del self.spilled[name]
+
+
 class LocalPythonExecutor(PythonExecutor):
+    """
+    Executes Python code in a restricted local interpreter, keeping the variables defined across calls.
+
+    Args:
+        additional_authorized_imports (`list[str]`): Additional authorized imports, on top of `BASE_BUILTIN_MODULES`.
+        max_print_outputs_length (`int`, *optional*): Maximum length of the print outputs.
+        compile_code (`bool`, default `False`): Whether to compile each code action into closures with `compile_ast`
+            before running it, instead of walking its abstract syntax tree at each evaluation.
+        output_sink (`Callable[[str], None]`, *optional*): Callback receiving the print outputs as they are printed,
+            for instance the `put` method of a queue, to stream them while a code action is running.
+        timeout (`float`, *optional*): Maximum wall-clock time of each code action, in seconds.
+        max_memory (`int`, *optional*): Maximum growth of the memory of the whole process during each code action, in
+            bytes: this limit is process-wide, so the allocations of other agents running in the same process count
+            towards it.
+            Code actions exceeding a limit are stopped with an `InterpreterError`, see [`ExecutionWatchdog`].
+        native_code (`bool`, default `False`): Whether to run code actions that pass a strict whitelist (no private
+            or special attributes and names, no dynamic attribute access) as CPython bytecode, for near-native speed
+            on loops. Other code actions are interpreted.
+        profile (`bool`, default `False`): Whether to profile each code action, storing the resulting
+            [`ExecutionProfile`] in `execution_profile`.
+        max_operations (`int`, default `MAX_OPERATIONS`): Maximum cost of the function calls and loop iterations of
+            each code action.
+        max_while_iterations (`int`, default `MAX_WHILE_ITERATIONS`): Maximum number of iterations of a `while` loop.
+        operation_costs (`dict[str, int]`, *optional*): Cost model of the operations, with the `call_cost` and
+            `iteration_cost` of [`OperationBudget`], e.g. `{"call_cost": 10}` to favor loops over calls.
+        max_state_memory (`int`, *optional*): Memory budget of the variables, in bytes. When the variables exceed it
+            after a code action, the least recently used ones of at least `min_spill_size` bytes are spilled to disk
+            as [`SpilledValue`] until they fit, and loaded back before the next code action using them. See
+            `memory_usage` for the accounting.
+        min_spill_size (`int`, default `1_000_000`): Minimum size of the variables to spill, in bytes.
+        spill_directory (`str`, *optional*): Directory of the spilled variables, the default temporary directory if
+            not set.
+        parallel_tool_calls (`bool`, default `False`): Whether to call tools concurrently when consecutive statements
+            call them with independent arguments. Code actions can also call `parallel_map` explicitly.
+    """
+
     def __init__(
         self,
         additional_authorized_imports: List[str],
         max_print_outputs_length: Optional[int] = None,
+        compile_code: bool = False,
+        output_sink: Optional[Callable[[str], None]] = None,
+        timeout: Optional[float] = None,
+        max_memory: Optional[int] = None,
+        native_code: bool = False,
+        profile: bool = False,
+        max_operations: int = MAX_OPERATIONS,
+        max_while_iterations: int = MAX_WHILE_ITERATIONS,
+        operation_costs: Optional[Dict[str, int]] = None,
+        max_state_memory: Optional[int] = None,
+        min_spill_size: int = 1_000_000,
+        spill_directory: Optional[str] = None,
+        parallel_tool_calls: bool = False,
     ):
         self.custom_tools = {}
-        self.state = {}
+        self.state = SpillableState()
         self.max_print_outputs_length = max_print_outputs_length
         if max_print_outputs_length is None:
             self.max_print_outputs_length = DEFAULT_MAX_LEN_OUTPUT
@@ -1450,24 +4033,208 @@ class LocalPythonExecutor(PythonExecutor):
         self.authorized_imports = list(set(BASE_BUILTIN_MODULES) | set(self.additional_authorized_imports))
         # TODO: assert self.authorized imports are all installed locally
         self.static_tools = None
+        self.compile_code = compile_code
+        self.output_sink = output_sink
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.native_code = native_code
+        self.profile = profile
+        self.execution_profile = None
+        self.max_operations = max_operations
+        self.max_while_iterations = max_while_iterations
+        self.operation_costs = operation_costs or {}
+        self.max_state_memory = max_state_memory
+        self.min_spill_size = min_spill_size
+        self.spill_directory = spill_directory
+        self.parallel_tool_calls = parallel_tool_calls
+        # Names of the variables whose values are shared with a snapshot, with the ids of the shared values
+        self._shared_values = {}
+        # Variables spilled to disk, and index of the last code action using each variable
+        self._spilled = self.state.spilled
+        self._last_used = {}
+        self._calls_count = 0
+        # Builtins namespace of the functions defined natively, updated at each code action
+        self._native_builtins = {}
 
     def __call__(self, code_action: str) -> Tuple[Any, str, bool]:
-        output, is_final_answer = evaluate_python_code(
-            code_action,
-            static_tools=self.static_tools,
-            custom_tools=self.custom_tools,
-            state=self.state,
-            authorized_imports=self.authorized_imports,
-            max_print_outputs_length=self.max_print_outputs_length,
-        )
+        self._prepare_state(code_action)
+        self.execution_profile = ExecutionProfile() if self.profile else None
+        try:
+            output, is_final_answer = evaluate_python_code(
+                code_action,
+                static_tools=self.static_tools,
+                custom_tools=self.custom_tools,
+                state=self.state,
+                authorized_imports=self.authorized_imports,
+                max_print_outputs_length=self.max_print_outputs_length,
+                compile_code=self.compile_code,
+                output_sink=self.output_sink,
+                timeout=self.timeout,
+                max_memory=self.max_memory,
+                native_code=self.native_code,
+                profile=self.execution_profile,
+                budget=OperationBudget(self.max_operations, self.max_while_iterations, **self.operation_costs),
+                parallel_tool_calls=self.parallel_tool_calls,
+                native_builtins=self._native_builtins,
+            )
+        finally:
+            self._spill_state()
         logs = str(self.state["_print_outputs"])
         return output, logs, is_final_answer
 
     def send_variables(self, variables: dict):
+        for name in variables:
+            self._spilled.pop(name, None)
         self.state.update(variables)
 
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Returns the estimated size in bytes of each variable held in memory, except modules, functions and classes,
+        see [`estimate_size`]. Variables referring to the same value all count its size.
+        """
+        return {name: estimate_size(value) for name, value in self.state.items() if self._is_spillable(name)}
+
     def send_tools(self, tools: Dict[str, Tool]):
         self.static_tools = {**tools, **BASE_PYTHON_TOOLS.copy()}
 
+    def snapshot(self) -> ExecutorSnapshot:
+        """
+        Saves the variables and functions defined so far, to `restore` them later.
+
+        Snapshots are copy-on-write: they share the values of the variables with the executor, and a variable is only
+        deep-copied in the executor before the first code action that may mutate it, see [`find_mutated_names`]: code
+        actions only reading it, like `n = len(df)`, keep sharing it. Since functions defined by code actions may use
+        any variable, a code action using one of them copies all the shared variables it may use.
+        """
+        self._share_state()
+        return ExecutorSnapshot(
+            state=dict(self.state), custom_tools=dict(self.custom_tools), spilled=dict(self._spilled)
+        )
+
+    def restore(self, snapshot: ExecutorSnapshot):
+        """Restores the variables and functions saved in a snapshot, which can be restored again later."""
+        # Functions defined by code actions read the state they were defined with, so it's updated in place
+        self.state.clear()
+        self.state.update(snapshot.state)
+        self.custom_tools.clear()
+        self.custom_tools.update(snapshot.custom_tools)
+        self._spilled.clear()
+        self._spilled.update(snapshot.spilled)
+        self._share_state()
+
+    def fork(self) -> "LocalPythonExecutor":
+        """
+        Returns an executor starting from the variables and functions defined so far, to run code actions
+        independently from this executor. The variables are shared copy-on-write between the two executors, like with
+        `snapshot`. Functions defined before the fork are rebound to the variables of the new executor, see
+        `rebind_function`, but methods of classes keep reading the variables of this executor.
+        """
+        snapshot = self.snapshot()
+        executor = copy.copy(self)
+        executor.state, executor.custom_tools, executor._last_used = SpillableState(), {}, dict(self._last_used)
+        executor._spilled = executor.state.spilled
+        executor._native_builtins = {}
+        executor.restore(snapshot)
+        namespaces = {
+            id(self.state): executor.state,
+            id(self.custom_tools): executor.custom_tools,
+            id(self._native_builtins): executor._native_builtins,
+        }
+        memo = {}
+        for namespace in (executor.state, executor.custom_tools):
+            for name, value in list(namespace.items()):
+                if isinstance(value, FunctionType):
+                    namespace[name] = rebind_function(value, namespaces, memo)
+        return executor
+
+    def _share_state(self):
+        self._shared_values = {name: id(value) for name, value in self.state.items() if name != "_print_outputs"}
+
+    def _is_spillable(self, name: str) -> bool:
+        return (
+            name != "_print_outputs"
+            and not name.startswith("__")
+            and not isinstance(self.state[name], (ModuleType, FunctionType, BuiltinFunctionType, type))
+        )
 
-__all__ = ["evaluate_python_code", "LocalPythonExecutor"]
+    def _prepare_state(self, code_action: str):
+        """
+        Loads the spilled variables that the code action reads, the others being loaded when looked up, and copies the
+        values shared with snapshots that it may mutate.
+        """
+        if not (self._shared_values or self._spilled or self.max_state_memory is not None):
+            return
+        try:
+            analysis = CODE_CACHE.get(code_action).get_static_analysis()
+        except SyntaxError:
+            return  # The evaluation reports the error
+        used_names, mutated_names = analysis.loaded_names, analysis.mutated_names
+        # Functions defined by code actions may use and mutate any variable
+        if any(
+            name in self.custom_tools or isinstance(self.state.get(name), (FunctionType, type)) for name in used_names
+        ):
+            used_names = mutated_names = self.state.keys() | self._spilled.keys()
+        self._calls_count += 1
+        for name in used_names | analysis.bound_names:
+            self._last_used[name] = self._calls_count
+        self.state.load_spilled(used_names)
+        if not self._shared_values:
+            return
+        shared_ids = {
+            value_id
+            for name, value_id in self._shared_values.items()
+            if name in mutated_names and id(self.state.get(name)) == value_id
+        }
+        if not shared_ids:
+            return
+        # Variables referring to the same value are copied together, so that they keep referring to the same copy
+        memo = {}
+        for name, value_id in list(self._shared_values.items()):
+            if value_id in shared_ids and id(self.state.get(name)) == value_id:
+                self.state[name] = copy_shared_value(self.state[name], memo)
+                del self._shared_values[name]
+
+    def _spill_state(self):
+        """Spills the least recently used variables to disk while the variables exceed `max_state_memory`."""
+        for name in self._spilled.keys() & self.state.keys():
+            del self._spilled[name]  # The variable was assigned again without being read
+        if self.max_state_memory is None:
+            return
+        sizes = {}
+        for name, size in self.memory_usage().items():
+            sizes[id(self.state[name])] = size
+        total_size = sum(sizes.values())
+        candidates = sorted(
+            (
+                name
+                for name in self.state
+                if self._is_spillable(name) and sizes[id(self.state[name])] >= self.min_spill_size
+            ),
+            key=lambda name: self._last_used.get(name, self._calls_count),
+        )
+        for name in candidates:
+            if total_size <= self.max_state_memory:
+                break
+            if name not in self.state:
+                continue  # Already spilled with another variable referring to the same value
+            value = self.state[name]
+            try:
+                spilled = SpilledValue(value, sizes[id(value)], self.spill_directory)
+            except Exception:
+                continue  # Values like generators can't be pickled: they stay in memory
+            for alias in [alias for alias, alias_value in self.state.items() if alias_value is value]:
+                del self.state[alias]
+                self._shared_values.pop(alias, None)
+                self._spilled[alias] = spilled
+            total_size -= spilled.size
+
+
+__all__ = [
+    "evaluate_python_code",
+    "ExecutionProfile",
+    "ExecutorSnapshot",
+    "LocalPythonExecutor",
+    "OperationBudget",
+    "SpillableState",
+    "SpilledValue",
+]
@@ -1,6 +1,6 @@
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
 from logging import getLogger
-from typing import TYPE_CHECKING, Any, Dict, List, TypedDict, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, TypedDict, Union
 
 from smolagents.models import ChatMessage, MessageRole
 from smolagents.monitoring import AgentLogger, LogLevel
@@ -8,6 +8,7 @@ from smolagents.utils import AgentError, make_json_serializable
 
 
 if TYPE_CHECKING:
+    from smolagents.local_python_executor import ExecutionProfile
     from smolagents.models import ChatMessage
     from smolagents.monitoring import AgentLogger
 
@@ -37,8 +38,29 @@ class ToolCall:
         }
 
 
+@dataclass
+class MessagesReference:
+    """
+    Messages stored as the first `prefix_length` messages of a message log shared by the steps of an
+    [`AgentMemory`], followed by the `delta` of messages that were not logged yet, see `AgentMemory.reference_messages`.
+    """
+
+    log: List[Message] = field(repr=False)
+    prefix_length: int
+    delta: List[Message]
+
+    def rebuild(self) -> List[Message]:
+        return self.log[: self.prefix_length] + self.delta
+
+
 @dataclass
 class MemoryStep:
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            # Counts the assignments to the step, so that `AgentMemory` renders its messages again
+            object.__setattr__(self, "_version", getattr(self, "_version", 0) + 1)
+
     def dict(self):
         return asdict(self)
 
@@ -48,39 +70,50 @@ class MemoryStep:
 
 @dataclass
 class ActionStep(MemoryStep):
-    model_input_messages: List[Message] | None = None
+    model_input_messages: List[Message] | MessagesReference | None = None
     tool_calls: List[ToolCall] | None = None
     start_time: float | None = None
     end_time: float | None = None
     step_number: int | None = None
     error: AgentError | None = None
+    # Id of the tool call that raised the error, if any
+    error_tool_call_id: str | None = None
     duration: float | None = None
     model_output_message: ChatMessage = None
     model_output: str | None = None
     observations: str | None = None
     observations_images: List[str] | None = None
     action_output: Any = None
+    execution_profile: "ExecutionProfile | None" = None
+
+    def get_model_input_messages(self) -> List[Message] | None:
+        """Returns the messages given to the model, rebuilding them if they are stored as a [`MessagesReference`]."""
+        if isinstance(self.model_input_messages, MessagesReference):
+            return self.model_input_messages.rebuild()
+        return self.model_input_messages
 
     def dict(self):
         # We overwrite the method to parse the tool_calls and action_output manually
         return {
-            "model_input_messages": self.model_input_messages,
+            "model_input_messages": self.get_model_input_messages(),
             "tool_calls": [tc.dict() for tc in self.tool_calls] if self.tool_calls else [],
             "start_time": self.start_time,
             "end_time": self.end_time,
             "step": self.step_number,
             "error": self.error.dict() if self.error else None,
+            "error_tool_call_id": self.error_tool_call_id,
             "duration": self.duration,
             "model_output_message": self.model_output_message,
             "model_output": self.model_output,
             "observations": self.observations,
             "action_output": make_json_serializable(self.action_output),
+            "execution_profile": self.execution_profile.dict() if self.execution_profile else None,
         }
 
     def to_messages(self, summary_mode: bool = False, show_model_input_messages: bool = False) -> List[Message]:
         messages = []
         if self.model_input_messages is not None and show_model_input_messages:
-            messages.append(Message(role=MessageRole.SYSTEM, content=self.model_input_messages))
+            messages.append(Message(role=MessageRole.SYSTEM, content=self.get_model_input_messages()))
         if self.model_output is not None and not summary_mode:
             messages.append(
                 Message(role=MessageRole.ASSISTANT, content=[{"type": "text", "text": self.model_output.strip()}])
@@ -106,7 +139,12 @@ class ActionStep(MemoryStep):
                     content=[
                         {
                             "type": "text",
-                            "text": (f"Call id: {self.tool_calls[0].id}\n" if self.tool_calls else "")
+                            # Observations of several tool calls are each preceded by their call id
+                            "text": (
+                                f"Call id: {self.tool_calls[0].id}\n"
+                                if self.tool_calls and len(self.tool_calls) == 1
+                                else ""
+                            )
                             + f"Observation:\n{self.observations}",
                         }
                     ],
@@ -118,7 +156,8 @@ class ActionStep(MemoryStep):
                 + str(self.error)
                 + "\nNow let's retry: take care not to repeat previous errors! If you have retried several times, try a completely different approach.\n"
             )
-            message_content = f"Call id: {self.tool_calls[0].id}\n" if self.tool_calls else ""
+            error_tool_call_id = self.error_tool_call_id or (self.tool_calls[0].id if self.tool_calls else None)
+            message_content = f"Call id: {error_tool_call_id}\n" if error_tool_call_id else ""
             message_content += error_message
             messages.append(
                 Message(role=MessageRole.TOOL_RESPONSE, content=[{"type": "text", "text": message_content}])
@@ -141,6 +180,14 @@ class ActionStep(MemoryStep):
         return messages
 
 
+@dataclass
+class ExecutionLogsDelta:
+    """Print outputs of the code action of an [`ActionStep`], streamed while the code is running."""
+
+    step_number: int
+    content: str
+
+
 @dataclass
 class PlanningStep(MemoryStep):
     model_input_messages: List[Message]
@@ -190,13 +237,230 @@ class SystemPromptStep(MemoryStep):
         return [Message(role=MessageRole.SYSTEM, content=[{"type": "text", "text": self.system_prompt}])]
 
 
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of tokens of a text, assuming about 4 characters per token."""
+    return (len(text) + 3) // 4
+
+
+def get_token_counter(model: Any) -> Callable[[str], int]:
+    """
+    Returns a function counting the tokens of a text with the tokenizer of the model if it has one, like
+    [`TransformersModel`] and [`MLXModel`], or `estimate_tokens` otherwise.
+    """
+    tokenizer = getattr(model, "tokenizer", None) or getattr(getattr(model, "processor", None), "tokenizer", None)
+    if callable(getattr(tokenizer, "encode", None)):
+        return lambda text: len(tokenizer.encode(text))
+    return estimate_tokens
+
+
+def elide_text(text: str, max_characters: int = 1000) -> str:
+    """Keeps the beginning and the end of a text longer than `max_characters`, eliding its middle."""
+    if len(text) <= max_characters:
+        return text
+    half = max_characters // 2
+    return f"{text[:half]}\n[... {len(text) - 2 * half} characters elided ...]\n{text[-half:]}"
+
+
+class ContextCompactor:
+    """
+    Keeps the messages written from an [`AgentMemory`] within a token budget, for long runs.
+
+    When the messages exceed `max_tokens`, the action steps older than the `keep_recent_steps` most recent ones are
+    compacted, oldest first, until the messages fit: their observations and errors are shortened by `summarize` and
+    their images are dropped. Each compacted step is computed once and cached until the step changes. If the
+    messages still don't fit, the oldest compacted steps are removed altogether, and replaced by a note. The system
+    prompt, the tasks, the plans and the recent steps are always kept verbatim.
+
+    Args:
+        max_tokens (`int`): Token budget of the messages.
+        keep_recent_steps (`int`, default `3`): Number of most recent action steps never compacted.
+        count_tokens (`Callable[[str], int]`, *optional*): Function counting the tokens of a text, see
+            `get_token_counter`. Defaults to `estimate_tokens`.
+        summarize (`Callable[[str], str]`, *optional*): Function shortening the observations and errors of compacted
+            steps, for instance by calling a model. Defaults to `elide_text`.
+        image_tokens (`int`, default `1000`): Number of tokens counted for each image.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        keep_recent_steps: int = 3,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        summarize: Optional[Callable[[str], str]] = None,
+        image_tokens: int = 1000,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent_steps = keep_recent_steps
+        self.count_tokens = count_tokens or estimate_tokens
+        self.summarize = summarize or elide_text
+        self.image_tokens = image_tokens
+        # Caches keyed by object ids, keeping the objects to make sure the ids are not reused
+        self._token_counts: Dict[int, Tuple[Message, int]] = {}
+        self._compacted_steps: Dict[Tuple[int, bool], Tuple[MemoryStep, int, List[Message]]] = {}
+        self._notes: Dict[int, Message] = {}
+
+    def count_message_tokens(self, message: Message) -> int:
+        cached = self._token_counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        content = message["content"]
+        if isinstance(content, str):
+            token_count = self.count_tokens(content)
+        else:
+            token_count = sum(
+                self.count_tokens(element["text"]) if element["type"] == "text" else self.image_tokens
+                for element in content
+            )
+        if len(self._token_counts) > 100_000:
+            self._token_counts.clear()
+        self._token_counts[id(message)] = (message, token_count)
+        return token_count
+
+    def compact_step(self, step: MemoryStep, messages: List[Message], summary_mode: bool = False) -> List[Message]:
+        """
+        Returns the messages of a step with its observations and errors summarized, and without its images.
+        `summary_mode` tells which rendering of the step `messages` is, since both are cached.
+        """
+        cached = self._compacted_steps.get((id(step), summary_mode))
+        if cached is not None and cached[0] is step and cached[1] == getattr(step, "_version", 0):
+            return cached[2]
+        compacted_messages = []
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                compacted_messages.append(message)
+                continue
+            if any(element["type"] != "text" for element in content):
+                continue  # Observed images
+            if message["role"] == MessageRole.TOOL_RESPONSE:
+                content = [{"type": "text", "text": self.summarize(element["text"])} for element in content]
+            compacted_messages.append(Message(role=message["role"], content=content))
+        self._compacted_steps[(id(step), summary_mode)] = (step, getattr(step, "_version", 0), compacted_messages)
+        return compacted_messages
+
+    def compact(
+        self, steps: List[MemoryStep], step_messages: List[List[Message]], summary_mode: bool = False
+    ) -> List[Message]:
+        """
+        Returns the messages of the steps within the token budget if possible.
+
+        Args:
+            steps (`list[MemoryStep]`): The steps, starting with the system prompt.
+            step_messages (`list[list[Message]]`): The messages rendered from each step.
+            summary_mode (`bool`, default `False`): Whether the steps were rendered in summary mode.
+        """
+        step_messages = list(step_messages)
+        token_counts = [sum(self.count_message_tokens(message) for message in messages) for messages in step_messages]
+        total_tokens = sum(token_counts)
+        action_indices = [index for index, step in enumerate(steps) if isinstance(step, ActionStep)]
+        old_indices = action_indices[: max(0, len(action_indices) - self.keep_recent_steps)]
+        for index in old_indices:
+            if total_tokens <= self.max_tokens:
+                break
+            step_messages[index] = self.compact_step(steps[index], step_messages[index], summary_mode)
+            token_count = sum(self.count_message_tokens(message) for message in step_messages[index])
+            total_tokens += token_count - token_counts[index]
+            token_counts[index] = token_count
+        removed_indices = []
+        for index in old_indices:
+            if total_tokens <= self.max_tokens:
+                break
+            total_tokens -= token_counts[index]
+            removed_indices.append(index)
+        if removed_indices:
+            for index in removed_indices:
+                step_messages[index] = []
+            step_messages[removed_indices[0]] = [self._get_note(len(removed_indices))]
+        return [message for messages in step_messages for message in messages]
+
+    def _get_note(self, removed_count: int) -> Message:
+        # Notes are kept, so that the same messages are returned across calls
+        if removed_count not in self._notes:
+            self._notes[removed_count] = Message(
+                role=MessageRole.USER,
+                content=[
+                    {
+                        "type": "text",
+                        "text": f"[{removed_count} earlier steps were removed to keep the context within its limit.]",
+                    }
+                ],
+            )
+        return self._notes[removed_count]
+
+
 class AgentMemory:
     def __init__(self, system_prompt: str):
         self.system_prompt = SystemPromptStep(system_prompt=system_prompt)
         self.steps: List[Union[TaskStep, ActionStep, PlanningStep]] = []
+        # For each summary mode, the rendered steps with their versions, the number of messages after each of them,
+        # and the messages
+        self._rendered: Dict[bool, Tuple[List[Tuple[MemoryStep, int]], List[int], List[Message]]] = {}
+        self._message_log: List[Message] = []
+        self.context_compactor: Optional[ContextCompactor] = None
 
     def reset(self):
         self.steps = []
+        self._rendered = {}
+        self._message_log = []
+
+    def reference_messages(self, messages: List[Message]) -> MessagesReference:
+        """
+        Returns a reference to messages, typically the input messages of a step, sharing their longest common prefix
+        with the message log of the memory: only the following messages are stored in the reference, and appended to
+        the log for the next steps. Since the messages returned by `get_messages` are kept across calls, the input
+        messages of each step usually extend the log, so storing the input messages of all the steps takes memory
+        linear in the number of steps instead of quadratic.
+
+        Args:
+            messages (`list[Message]`): The messages, compared to the logged ones by identity.
+        """
+        log = self._message_log
+        prefix_length = 0
+        for logged_message, message in zip(log, messages):
+            if logged_message is not message:
+                break
+            prefix_length += 1
+        if prefix_length < len(log):
+            # The messages diverge from the log, e.g. after a step was changed: the references already returned keep
+            # the current log, and a new log starts from the common prefix
+            log = self._message_log = log[:prefix_length]
+        delta = messages[prefix_length:]
+        log.extend(delta)
+        return MessagesReference(log=log, prefix_length=prefix_length, delta=delta)
+
+    def get_messages(self, summary_mode: bool = False) -> List[Message]:
+        """
+        Returns the messages of the system prompt and the steps, as rendered by their `to_messages` method.
+
+        The rendered messages are kept across calls and only appended to: a step is rendered once, unless it is
+        replaced or one of its attributes is assigned, for instance by a step callback, in which case it is rendered
+        again along with the following steps. Changes made in place, like appending to `observations_images`, are
+        not detected: assign the attribute instead.
+
+        If a `context_compactor` is set, the messages are then compacted to fit its token budget, see
+        [`ContextCompactor`].
+
+        Args:
+            summary_mode (`bool`, default `False`): Whether to render the steps in summary mode.
+        """
+        rendered_steps, message_counts, messages = self._rendered.setdefault(summary_mode, ([], [], []))
+        steps = [self.system_prompt] + self.steps
+        unchanged_count = 0
+        for step, (rendered_step, version) in zip(steps, rendered_steps):
+            if step is not rendered_step or getattr(step, "_version", 0) != version:
+                break
+            unchanged_count += 1
+        del rendered_steps[unchanged_count:]
+        del message_counts[unchanged_count:]
+        del messages[message_counts[-1] if message_counts else 0 :]
+        for step in steps[unchanged_count:]:
+            messages.extend(step.to_messages(summary_mode=summary_mode))
+            rendered_steps.append((step, getattr(step, "_version", 0)))
+            message_counts.append(len(messages))
+        if self.context_compactor is not None:
+            step_messages = [messages[start:end] for start, end in zip([0] + message_counts, message_counts)]
+            return self.context_compactor.compact(steps, step_messages, summary_mode)
+        return list(messages)
 
     def get_succinct_steps(self) -> list[dict]:
         return [
@@ -223,7 +487,7 @@ class AgentMemory:
             elif isinstance(step, ActionStep):
                 logger.log_rule(f"Step {step.step_number}", level=LogLevel.ERROR)
                 if detailed:
-                    logger.log_messages(step.model_input_messages)
+                    logger.log_messages(step.get_model_input_messages())
                 logger.log_markdown(title="Agent output:", content=step.model_output, level=LogLevel.ERROR)
             elif isinstance(step, PlanningStep):
                 logger.log_rule("Planning step", level=LogLevel.ERROR)
@@ -232,4 +496,4 @@ class AgentMemory:
                 logger.log_markdown(title="Agent output:", content=step.facts + "\n" + step.plan, level=LogLevel.ERROR)
 
 
-__all__ = ["AgentMemory"]
+__all__ = ["AgentMemory", "ContextCompactor", "MessagesReference"]
@@ -14,6 +14,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
 import json
 import logging
 import os
@@ -22,6 +23,7 @@ import uuid
 from copy import deepcopy
 from dataclasses import asdict, dataclass
 from enum import Enum
+from functools import partial
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 
 from huggingface_hub.utils import is_torch_available
@@ -85,12 +87,23 @@ class ChatMessageToolCall:
         )
 
 
+@dataclass
+class TokenUsage:
+    """Numbers of input and output tokens of one model call."""
+
+    input_tokens: int
+    output_tokens: int
+
+
 @dataclass
 class ChatMessage:
     role: str
     content: Optional[str] = None
     tool_calls: Optional[List[ChatMessageToolCall]] = None
     raw: Optional[Any] = None  # Stores the raw output from the API
+    # Usage of the call returning the message: unlike the `last_*_token_count` attributes of the model, it is not
+    # overwritten by concurrent calls
+    token_usage: Optional[TokenUsage] = None
 
     def model_dump_json(self):
         return json.dumps(get_dict_from_nested_dataclasses(self, ignore_key="raw"))
@@ -112,6 +125,8 @@ class ChatMessage:
                 for tc in data["tool_calls"]
             ]
             data["tool_calls"] = tool_calls
+        if data.get("token_usage"):
+            data["token_usage"] = TokenUsage(**data["token_usage"])
         return cls(**data)
 
     def dict(self):
@@ -329,6 +344,30 @@ class Model:
         """
         pass  # To be implemented in child classes!
 
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        """Async counterpart of `__call__`, to call the model from an event loop.
+
+        Models with an async client, like [`HfApiModel`], [`LiteLLMModel`] and [`OpenAIServerModel`], await it. Other
+        models are called in a worker thread, so that the event loop is not blocked.
+        """
+        return await asyncio.to_thread(
+            partial(
+                self.__call__,
+                messages,
+                stop_sequences=stop_sequences,
+                grammar=grammar,
+                tools_to_call_from=tools_to_call_from,
+                **kwargs,
+            )
+        )
+
     def to_dict(self) -> Dict:
         """
         Converts the model into a JSON-compatible dictionary.
@@ -427,7 +466,7 @@ class HfApiModel(Model):
         custom_role_conversions: Optional[Dict[str, str]] = None,
         **kwargs,
     ):
-        from huggingface_hub import InferenceClient
+        from huggingface_hub import AsyncInferenceClient, InferenceClient
 
         super().__init__(**kwargs)
         self.model_id = model_id
@@ -435,6 +474,7 @@ class HfApiModel(Model):
         if token is None:
             token = os.getenv("HF_TOKEN")
         self.client = InferenceClient(self.model_id, provider=provider, token=token, timeout=timeout)
+        self.async_client = AsyncInferenceClient(self.model_id, provider=provider, token=token, timeout=timeout)
         self.custom_role_conversions = custom_role_conversions
 
     def __call__(
@@ -445,7 +485,28 @@ class HfApiModel(Model):
         tools_to_call_from: Optional[List[Tool]] = None,
         **kwargs,
     ) -> ChatMessage:
-        completion_kwargs = self._prepare_completion_kwargs(
+        completion_kwargs = self._get_completion_kwargs(
+            messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+        )
+        response = self.client.chat_completion(**completion_kwargs)
+        return self._to_chat_message(response, tools_to_call_from)
+
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        completion_kwargs = self._get_completion_kwargs(
+            messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+        )
+        response = await self.async_client.chat_completion(**completion_kwargs)
+        return self._to_chat_message(response, tools_to_call_from)
+
+    def _get_completion_kwargs(self, messages, stop_sequences, grammar, tools_to_call_from, **kwargs) -> Dict:
+        return self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
             grammar=grammar,
@@ -454,11 +515,12 @@ class HfApiModel(Model):
             custom_role_conversions=self.custom_role_conversions,
             **kwargs,
         )
-        response = self.client.chat_completion(**completion_kwargs)
 
+    def _to_chat_message(self, response, tools_to_call_from: Optional[List[Tool]]) -> ChatMessage:
         self.last_input_token_count = response.usage.prompt_tokens
         self.last_output_token_count = response.usage.completion_tokens
         message = ChatMessage.from_hf_api(response.choices[0].message, raw=response)
+        message.token_usage = TokenUsage(response.usage.prompt_tokens, response.usage.completion_tokens)
         if tools_to_call_from is not None:
             return parse_tool_args_if_needed(message)
         return message
@@ -571,20 +633,26 @@ class MLXModel(Model):
             add_generation_prompt=True,
         )
 
-        self.last_input_token_count = len(prompt_ids)
-        self.last_output_token_count = 0
+        output_token_count = 0
         text = ""
 
+        def to_message(text: str) -> ChatMessage:
+            self.last_input_token_count = len(prompt_ids)
+            self.last_output_token_count = output_token_count
+            message = self._to_message(text, tools_to_call_from)
+            message.token_usage = TokenUsage(len(prompt_ids), output_token_count)
+            return message
+
         for _ in self.stream_generate(self.model, self.tokenizer, prompt=prompt_ids, **completion_kwargs):
-            self.last_output_token_count += 1
+            output_token_count += 1
             text += _.text
             for stop_sequence in prepared_stop_sequences:
                 stop_sequence_start = text.rfind(stop_sequence)
                 if stop_sequence_start != -1:
                     text = text[:stop_sequence_start]
-                    return self._to_message(text, tools_to_call_from)
+                    return to_message(text)
 
-        return self._to_message(text, tools_to_call_from)
+        return to_message(text)
 
 
 class TransformersModel(Model):
@@ -774,6 +842,7 @@ class TransformersModel(Model):
             output = self.tokenizer.decode(generated_tokens, skip_special_tokens=True)
         self.last_input_token_count = count_prompt_tokens
         self.last_output_token_count = len(generated_tokens)
+        token_usage = TokenUsage(count_prompt_tokens, len(generated_tokens))
 
         if stop_sequences is not None:
             output = remove_stop_sequences(output, stop_sequences)
@@ -783,6 +852,7 @@ class TransformersModel(Model):
                 role="assistant",
                 content=output,
                 raw={"out": out, "completion_kwargs": completion_kwargs},
+                token_usage=token_usage,
             )
         else:
             if "Action:" in output:
@@ -811,6 +881,7 @@ class TransformersModel(Model):
                     )
                 ],
                 raw={"out": out, "completion_kwargs": completion_kwargs},
+                token_usage=token_usage,
             )
 
 
@@ -858,14 +929,40 @@ class LiteLLMModel(Model):
         tools_to_call_from: Optional[List[Tool]] = None,
         **kwargs,
     ) -> ChatMessage:
+        litellm = self._import_litellm()
+        completion_kwargs = self._get_completion_kwargs(
+            messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+        )
+        response = litellm.completion(**completion_kwargs)
+        return self._to_chat_message(response, tools_to_call_from)
+
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        litellm = self._import_litellm()
+        completion_kwargs = self._get_completion_kwargs(
+            messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+        )
+        response = await litellm.acompletion(**completion_kwargs)
+        return self._to_chat_message(response, tools_to_call_from)
+
+    @staticmethod
+    def _import_litellm():
         try:
             import litellm
         except ModuleNotFoundError:
             raise ModuleNotFoundError(
                 "Please install 'litellm' extra to use LiteLLMModel: `pip install 'smolagents[litellm]'`"
             )
+        return litellm
 
-        completion_kwargs = self._prepare_completion_kwargs(
+    def _get_completion_kwargs(self, messages, stop_sequences, grammar, tools_to_call_from, **kwargs) -> Dict:
+        return self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
             grammar=grammar,
@@ -879,14 +976,14 @@ class LiteLLMModel(Model):
             **kwargs,
         )
 
-        response = litellm.completion(**completion_kwargs)
-
+    def _to_chat_message(self, response, tools_to_call_from: Optional[List[Tool]]) -> ChatMessage:
         self.last_input_token_count = response.usage.prompt_tokens
         self.last_output_token_count = response.usage.completion_tokens
         message = ChatMessage.from_dict(
             response.choices[0].message.model_dump(include={"role", "content", "tool_calls"})
         )
         message.raw = response
+        message.token_usage = TokenUsage(response.usage.prompt_tokens, response.usage.completion_tokens)
 
         if tools_to_call_from is not None:
             return parse_tool_args_if_needed(message)
@@ -943,6 +1040,13 @@ class OpenAIServerModel(Model):
             project=project,
             **(client_kwargs or {}),
         )
+        self.async_client = openai.AsyncOpenAI(
+            base_url=api_base,
+            api_key=api_key,
+            organization=organization,
+            project=project,
+            **(client_kwargs or {}),
+        )
         self.custom_role_conversions = custom_role_conversions
 
     def __call__(
@@ -953,7 +1057,28 @@ class OpenAIServerModel(Model):
         tools_to_call_from: Optional[List[Tool]] = None,
         **kwargs,
     ) -> ChatMessage:
-        completion_kwargs = self._prepare_completion_kwargs(
+        completion_kwargs = self._get_completion_kwargs(
+            messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+        )
+        response = self.client.chat.completions.create(**completion_kwargs)
+        return self._to_chat_message(response, tools_to_call_from)
+
+    async def acall(
+        self,
+        messages: List[Dict[str, str]],
+        stop_sequences: Optional[List[str]] = None,
+        grammar: Optional[str] = None,
+        tools_to_call_from: Optional[List[Tool]] = None,
+        **kwargs,
+    ) -> ChatMessage:
+        completion_kwargs = self._get_completion_kwargs(
+            messages, stop_sequences, grammar, tools_to_call_from, **kwargs
+        )
+        response = await self.async_client.chat.completions.create(**completion_kwargs)
+        return self._to_chat_message(response, tools_to_call_from)
+
+    def _get_completion_kwargs(self, messages, stop_sequences, grammar, tools_to_call_from, **kwargs) -> Dict:
+        return self._prepare_completion_kwargs(
             messages=messages,
             stop_sequences=stop_sequences,
             grammar=grammar,
@@ -963,7 +1088,8 @@ class OpenAIServerModel(Model):
             convert_images_to_image_urls=True,
             **kwargs,
         )
-        response = self.client.chat.completions.create(**completion_kwargs)
+
+    def _to_chat_message(self, response, tools_to_call_from: Optional[List[Tool]]) -> ChatMessage:
         self.last_input_token_count = response.usage.prompt_tokens
         self.last_output_token_count = response.usage.completion_tokens
 
@@ -971,6 +1097,7 @@ class OpenAIServerModel(Model):
             response.choices[0].message.model_dump(include={"role", "content", "tool_calls"})
         )
         message.raw = response
+        message.token_usage = TokenUsage(response.usage.prompt_tokens, response.usage.completion_tokens)
         if tools_to_call_from is not None:
             return parse_tool_args_if_needed(message)
         return message
@@ -1013,6 +1140,9 @@ class AzureOpenAIServerModel(OpenAIServerModel):
         import openai
 
         self.client = openai.AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=azure_endpoint)
+        self.async_client = openai.AsyncAzureOpenAI(
+            api_key=api_key, api_version=api_version, azure_endpoint=azure_endpoint
+        )
 
 
 __all__ = [
@@ -1027,4 +1157,5 @@ __all__ = [
     "OpenAIServerModel",
     "AzureOpenAIServerModel",
     "ChatMessage",
+    "TokenUsage",
 ]
@@ -16,7 +16,7 @@
 # limitations under the License.
 import json
 from enum import IntEnum
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
 from rich import box
 from rich.console import Console, Group
@@ -33,14 +33,32 @@ from smolagents.utils import escape_code_brackets
 __all__ = ["AgentLogger", "LogLevel", "Monitor"]
 
 
+def get_step_token_counts(step_log: Any, model: Any) -> Optional[Tuple[int, int]]:
+    """
+    Returns the numbers of input and output tokens of the model calls of a step, from the `token_usage` of its model
+    output messages. For models not reporting it, falls back to their `last_input_token_count` and
+    `last_output_token_count` attributes, which may count another call if agents share the model concurrently.
+    Returns `None` if neither is available.
+    """
+    messages = [
+        getattr(step_log, name, None)
+        for name in ("model_output_message", "model_output_message_facts", "model_output_message_plan")
+    ]
+    usages = [message.token_usage for message in messages if getattr(message, "token_usage", None) is not None]
+    if usages:
+        return sum(usage.input_tokens for usage in usages), sum(usage.output_tokens for usage in usages)
+    if getattr(model, "last_input_token_count", None) is not None:
+        return model.last_input_token_count, model.last_output_token_count
+    return None
+
+
 class Monitor:
     def __init__(self, tracked_model, logger):
         self.step_durations = []
         self.tracked_model = tracked_model
         self.logger = logger
-        if getattr(self.tracked_model, "last_input_token_count", "Not found") != "Not found":
-            self.total_input_token_count = 0
-            self.total_output_token_count = 0
+        self.total_input_token_count = 0
+        self.total_output_token_count = 0
 
     def get_total_token_counts(self):
         return {
@@ -63,9 +81,10 @@ class Monitor:
         self.step_durations.append(step_duration)
         console_outputs = f"[Step {len(self.step_durations)}: Duration {step_duration:.2f} seconds"
 
-        if getattr(self.tracked_model, "last_input_token_count", None) is not None:
-            self.total_input_token_count += self.tracked_model.last_input_token_count
-            self.total_output_token_count += self.tracked_model.last_output_token_count
+        token_counts = get_step_token_counts(step_log, self.tracked_model)
+        if token_counts is not None:
+            self.total_input_token_count += token_counts[0]
+            self.total_output_token_count += token_counts[1]
             console_outputs += (
                 f"| Input tokens: {self.total_input_token_count:,} | Output tokens: {self.total_output_token_count:,}"
             )
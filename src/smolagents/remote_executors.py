@@ -14,20 +14,27 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import ast
+import atexit
 import base64
 import json
+import multiprocessing
+import os
 import pickle
 import re
+import threading
 import time
+import weakref
 from io import BytesIO
 from pathlib import Path
 from textwrap import dedent
-from typing import Any, Dict, List, Tuple
+from types import BuiltinFunctionType, FunctionType, ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 from PIL import Image
 
-from .local_python_executor import PythonExecutor
+from .local_python_executor import InterpreterError, LocalPythonExecutor, PythonExecutor, get_memory_usage
 from .monitoring import LogLevel
 from .tools import Tool, get_tools_definition_code
 
@@ -47,6 +54,7 @@ class RemotePythonExecutor(PythonExecutor):
         self.logger.log("Initializing executor, hold on...")
         self.final_answer_pattern = re.compile(r"^final_answer\((.*)\)$", re.M)
         self.installed_packages = []
+        self.output_sink = None
 
     def run_code_raise_errors(self, code: str, return_final_answer: bool = False) -> Tuple[Any, str]:
         raise NotImplementedError
@@ -149,6 +157,14 @@ class E2BExecutor(RemotePythonExecutor):
 class DockerExecutor(RemotePythonExecutor):
     """
     Executes Python code using Jupyter Kernel Gateway in a Docker container.
+
+    Args:
+        additional_imports (`list[str]`): Additional packages to install in the container.
+        logger ([`~monitoring.AgentLogger`]): Logger to use.
+        host (`str`, default `"127.0.0.1"`): Host on which to expose the Jupyter Kernel Gateway.
+        port (`int`, default `8888`): Port on which to expose the Jupyter Kernel Gateway.
+        output_sink (`Callable[[str], None]`, *optional*): Callback receiving the print outputs of the code as they
+            are streamed back by the kernel.
     """
 
     def __init__(
@@ -157,6 +173,7 @@ class DockerExecutor(RemotePythonExecutor):
         logger,
         host: str = "127.0.0.1",
         port: int = 8888,
+        output_sink: Optional[Callable[[str], None]] = None,
     ):
         """
         Initialize the Docker-based Jupyter Kernel Gateway executor.
@@ -171,6 +188,7 @@ class DockerExecutor(RemotePythonExecutor):
             )
         self.host = host
         self.port = port
+        self.output_sink = output_sink
 
         # Initialize Docker
         try:
@@ -283,6 +301,8 @@ CMD ["jupyter", "kernelgateway", "--KernelGatewayApp.ip='0.0.0.0'", "--KernelGat
                         waiting_for_idle = True
                     else:
                         outputs.append(text)
+                        if self.output_sink is not None:
+                            self.output_sink(text)
                 elif msg_type == "error":
                     traceback = msg["content"].get("traceback", [])
                     raise RuntimeError("\n".join(traceback)) from None
@@ -342,4 +362,414 @@ CMD ["jupyter", "kernelgateway", "--KernelGatewayApp.ip='0.0.0.0'", "--KernelGat
         self.cleanup()
 
 
-__all__ = ["E2BExecutor", "DockerExecutor"]
+class SubprocessWorker:
+    """
+    Handle on a worker process of a [`SubprocessWorkerPool`], communicating with it through a pipe.
+
+    Messages are `(kind, payload)` tuples. The worker answers each command with `"ok"`, `"result"` or `"error"`,
+    possibly preceded by `"print"` messages and `"tool_call"` requests to be answered by the parent process.
+    """
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.runs = 0
+
+    def send(self, kind: str, payload: Any = None):
+        """Sends a message to the worker, raising an `InterpreterError` if it died or the payload can't be pickled."""
+        try:
+            self.connection.send((kind, payload))
+        except (EOFError, OSError):
+            self._raise_crash()
+        except Exception as e:
+            raise InterpreterError(f"Could not send {kind} to the worker process: {type(e).__name__}: {e}") from None
+
+    def receive(self, timeout: Optional[float] = None) -> Tuple[str, Any]:
+        """Receives the next message of the worker, raising an `InterpreterError` if it died or timed out."""
+        try:
+            if not self.connection.poll(timeout):
+                self.process.kill()
+                self.process.join()
+                raise InterpreterError(f"The worker process did not answer within {timeout} seconds and was killed.")
+            return self.connection.recv()
+        except (EOFError, OSError):
+            self._raise_crash()
+
+    def _raise_crash(self):
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        raise InterpreterError(
+            f"The worker process running the code crashed with exit code {self.process.exitcode}."
+        ) from None
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self):
+        if self.is_alive():
+            try:
+                self.send("close")
+            except InterpreterError:
+                pass
+            self.process.join(timeout=1)
+        if self.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class SubprocessToolProxy:
+    """
+    Stand-in for a tool inside a worker process, forwarding the calls to the tool in the parent process.
+
+    The code may call tools from several threads, e.g. with `parallel_map`: `lock` is held from sending a call to
+    receiving its result, so that the messages of concurrent calls don't interleave on the connection.
+    """
+
+    def __init__(self, connection, name: str, lock: threading.Lock):
+        self.connection = connection
+        self.name = name
+        self.lock = lock
+        self.__name__ = name
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.connection.send(("tool_call", (self.name, args, kwargs)))
+            kind, payload = self.connection.recv()
+        if kind == "tool_error":
+            raise payload
+        return payload
+
+
+def export_picklable_variables(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the variables of a state that can be pickled, to move them to another worker."""
+    variables = {}
+    for name, value in state.items():
+        if name == "_print_outputs" or name.startswith("__"):
+            continue
+        if isinstance(value, (ModuleType, FunctionType, BuiltinFunctionType, type)):
+            continue  # Restored by running their definitions again
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        variables[name] = value
+    return variables
+
+
+def get_definitions(code_action: str) -> List[str]:
+    """Returns the source of the top-level imports, functions and classes of a code action."""
+    try:
+        module = ast.parse(code_action)
+    except SyntaxError:
+        return []
+    return [
+        ast.unparse(node)
+        for node in module.body
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+
+
+def run_subprocess_worker(connection):
+    """Main loop of a worker process, running the commands sent by a [`SubprocessExecutor`] until closed."""
+    executor = None
+    # Shared by the tool calls and prints of the code, which may run in several threads
+    lock = threading.Lock()
+
+    def send_print(text: str):
+        with lock:
+            connection.send(("print", text))
+
+    while True:
+        try:
+            kind, payload = connection.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            return
+        try:
+            if kind == "close":
+                return
+            elif kind == "init":
+                executor = LocalPythonExecutor(**payload, output_sink=send_print)
+            elif kind == "reset":
+                executor = None
+            elif kind == "send_tools":
+                executor.send_tools({name: SubprocessToolProxy(connection, name, lock) for name in payload})
+            elif kind == "send_variables":
+                executor.send_variables(payload)
+            elif kind == "memory":
+                connection.send(("result", get_memory_usage()))
+                continue
+            elif kind == "export_variables":
+                connection.send(("result", export_picklable_variables(executor.state)))
+                continue
+            elif kind == "restore_definitions":
+                # Best effort: a definition failing, e.g. because it uses a variable that could not be moved, is skipped
+                for definition in payload:
+                    try:
+                        executor(definition)
+                    except Exception:
+                        pass
+            elif kind == "run":
+                output, logs, is_final_answer = executor(payload)
+                try:
+                    connection.send(("result", (output, logs, is_final_answer)))
+                except Exception as e:
+                    connection.send(
+                        ("error", (f"The output of the code could not be sent back to the agent: {e}", logs))
+                    )
+                continue
+            connection.send(("ok", None))
+        except Exception as e:
+            logs = str(executor.state.get("_print_outputs", "")) if executor is not None else ""
+            connection.send(("error", (str(e), logs)))
+
+
+class SubprocessWorkerPool:
+    """
+    Pool of pre-forked worker processes running the code actions of [`SubprocessExecutor`]s.
+
+    Each executor leases a worker for its lifetime, so that its interpreter state persists across code actions, and
+    returns it to the pool when cleaned up. Workers are started in advance, so leasing one is instantaneous, and
+    more are started on demand when all are leased. A worker that crashed is replaced by a fresh process when
+    returned. A worker that has run `max_runs_per_worker` code actions, or whose memory exceeds
+    `max_memory_per_worker`, is recycled as well: when returned, or after the code action reaching the limit if it is
+    still leased, see [`SubprocessExecutor`].
+
+    Args:
+        size (`int`, *optional*): Number of idle workers kept ready. Defaults to the number of CPUs.
+        max_runs_per_worker (`int`, default `100`): Number of code actions after which a worker is recycled.
+        max_memory_per_worker (`int`, *optional*): Resident memory of a worker, in bytes, above which it is recycled.
+        start_method (`str`, *optional*): The `multiprocessing` start method of the workers. Defaults to
+            `"forkserver"` where available, since forking a multi-threaded process is unsafe, else to `"spawn"`.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_runs_per_worker: int = 100,
+        start_method: Optional[str] = None,
+        max_memory_per_worker: Optional[int] = None,
+    ):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.size = size if size is not None else (os.cpu_count() or 1)
+        self.max_runs_per_worker = max_runs_per_worker
+        self.max_memory_per_worker = max_memory_per_worker
+        self._context = multiprocessing.get_context(start_method)
+        self._lock = threading.Lock()
+        self._idle_workers = [self._start_worker() for _ in range(self.size)]
+
+    def _start_worker(self) -> SubprocessWorker:
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(target=run_subprocess_worker, args=(child_connection,), daemon=True)
+        process.start()
+        child_connection.close()
+        return SubprocessWorker(process, parent_connection)
+
+    def acquire(self) -> SubprocessWorker:
+        """Leases a worker with a fresh interpreter state."""
+        with self._lock:
+            if self._idle_workers:
+                return self._idle_workers.pop()
+        return self._start_worker()
+
+    def release(self, worker: SubprocessWorker, recycle: bool = False):
+        """Returns a leased worker to the pool, recycling it if needed or if `recycle` is set."""
+        if worker.is_alive() and worker.runs < self.max_runs_per_worker and not recycle:
+            try:
+                worker.send("reset")
+                kind, _ = worker.receive(timeout=5)
+                reusable = kind == "ok"
+            except (InterpreterError, OSError):
+                reusable = False
+        else:
+            reusable = False
+        if not reusable:
+            worker.close()
+        with self._lock:
+            if len(self._idle_workers) < self.size:
+                self._idle_workers.append(worker if reusable else self._start_worker())
+                return
+        if reusable:
+            worker.close()
+
+    def shutdown(self):
+        """Stops the idle workers."""
+        with self._lock:
+            idle_workers, self._idle_workers = self._idle_workers, []
+        for worker in idle_workers:
+            worker.close()
+
+
+_DEFAULT_SUBPROCESS_POOL = None
+_DEFAULT_SUBPROCESS_POOL_LOCK = threading.Lock()
+
+
+def get_default_subprocess_pool() -> SubprocessWorkerPool:
+    """Returns the worker pool shared by the [`SubprocessExecutor`]s created without a pool, creating it if needed."""
+    global _DEFAULT_SUBPROCESS_POOL
+    with _DEFAULT_SUBPROCESS_POOL_LOCK:
+        if _DEFAULT_SUBPROCESS_POOL is None:
+            _DEFAULT_SUBPROCESS_POOL = SubprocessWorkerPool()
+            atexit.register(_DEFAULT_SUBPROCESS_POOL.shutdown)
+    return _DEFAULT_SUBPROCESS_POOL
+
+
+class SubprocessExecutor(PythonExecutor):
+    """
+    Executes Python code with the semantics of [`LocalPythonExecutor`], in a worker process leased from a
+    [`SubprocessWorkerPool`].
+
+    Code actions of agents using different executors run in parallel on several CPUs, and a crash of the evaluated
+    code does not take the agent process down. The interpreter state persists in the worker across code actions, while
+    tools run in the agent process: their calls are proxied over a pipe, so their arguments and outputs, as well as the
+    variables and the outputs of the code actions, must be picklable.
+
+    When the worker reaches the `max_runs_per_worker` or `max_memory_per_worker` limit of the pool, it is recycled
+    after the code action: the variables that can be pickled are moved to a fresh worker, and the imports, functions
+    and classes defined by the previous code actions are defined again. Other variables, like generators, are lost.
+
+    Args:
+        additional_authorized_imports (`list[str]`): Additional authorized imports, on top of `BASE_BUILTIN_MODULES`.
+        max_print_outputs_length (`int`, *optional*): Maximum length of the print outputs.
+        pool ([`SubprocessWorkerPool`], *optional*): Pool to lease the worker from. Defaults to a pool shared by the
+            whole process.
+        output_sink (`Callable[[str], None]`, *optional*): Callback receiving the print outputs as they are printed.
+        timeout (`float`, *optional*): Maximum wall-clock time of each code action, in seconds. A worker not answering
+            `WORKER_KILL_GRACE_PERIOD` seconds after this limit, e.g. stuck in native code, is killed.
+        **kwargs: Additional arguments passed to the [`LocalPythonExecutor`] of the worker, like `max_memory`.
+    """
+
+    WORKER_KILL_GRACE_PERIOD = 5
+
+    def __init__(
+        self,
+        additional_authorized_imports: List[str],
+        max_print_outputs_length: Optional[int] = None,
+        pool: Optional[SubprocessWorkerPool] = None,
+        output_sink: Optional[Callable[[str], None]] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        self.pool = pool if pool is not None else get_default_subprocess_pool()
+        self.output_sink = output_sink
+        self.timeout = timeout
+        self.executor_kwargs = {
+            "additional_authorized_imports": additional_authorized_imports,
+            "max_print_outputs_length": max_print_outputs_length,
+            "timeout": timeout,
+            **kwargs,
+        }
+        # Mirror of the print outputs of the last code action, the interpreter state itself lives in the worker
+        self.state = {}
+        self.tools = {}
+        self.worker = None
+        # Source of the imports and definitions of the code actions, to define them again in a recycled worker
+        self._definitions = []
+        self._start_worker()
+
+    def _start_worker(self):
+        self.worker = self.pool.acquire()
+        # Stop the worker if the executor is garbage collected without being cleaned up
+        self._worker_finalizer = weakref.finalize(self, self.worker.close)
+        self._request("init", self.executor_kwargs)
+        if self.tools:
+            self._request("send_tools", list(self.tools))
+
+    def _request(self, kind: str, payload: Any = None) -> Any:
+        """Sends a command to the worker and serves its print outputs and tool calls until it answers."""
+        if self.worker is None:
+            raise InterpreterError("This executor was cleaned up.")
+        timeout = None
+        if kind == "run":
+            self.worker.runs += 1
+            if self.timeout is not None:
+                timeout = self.timeout + self.WORKER_KILL_GRACE_PERIOD
+        try:
+            self.worker.send(kind, payload)
+            while True:
+                message_kind, message = self.worker.receive(timeout=timeout)
+                if message_kind == "print":
+                    if self.output_sink is not None:
+                        self.output_sink(message)
+                elif message_kind == "tool_call":
+                    self._call_tool(*message)
+                elif message_kind == "error":
+                    error_message, self.state["_print_outputs"] = message
+                    raise InterpreterError(error_message)
+                else:
+                    return message
+        except InterpreterError as e:
+            if self.worker.is_alive() or kind == "init":
+                raise
+            # The worker died or hanged: lease a new one, the variables defined by previous code actions are lost
+            self.cleanup()
+            self._definitions = []
+            self._start_worker()
+            raise InterpreterError(f"{e} Its interpreter state was lost.") from None
+
+    def _call_tool(self, name: str, args: tuple, kwargs: dict):
+        try:
+            result = self.tools[name](*args, **kwargs)
+        except Exception as e:
+            try:
+                # Some exceptions, like AgentError, cannot be rebuilt from their pickled arguments
+                error = pickle.loads(pickle.dumps(e))
+            except Exception:
+                error = RuntimeError(f"{type(e).__name__}: {e}")
+            self.worker.send("tool_error", error)
+            return
+        try:
+            self.worker.send("tool_result", result)
+        except Exception as e:
+            self.worker.send(
+                "tool_error", RuntimeError(f"The output of tool {name} could not be sent to the worker: {e}")
+            )
+
+    def __call__(self, code_action: str) -> Tuple[Any, str, bool]:
+        self.state["_print_outputs"] = ""
+        self._definitions.extend(get_definitions(code_action))
+        try:
+            output, logs, is_final_answer = self._request("run", code_action)
+        finally:
+            if self.worker is not None and self.worker.is_alive():
+                self._recycle_worker_if_needed()
+        self.state["_print_outputs"] = logs
+        return output, logs, is_final_answer
+
+    def _recycle_worker_if_needed(self):
+        """Moves the interpreter state to a fresh worker if the worker reached a limit of the pool."""
+        if self.worker.runs < self.pool.max_runs_per_worker and (
+            self.pool.max_memory_per_worker is None or self._request("memory") <= self.pool.max_memory_per_worker
+        ):
+            return
+        variables = self._request("export_variables")
+        worker, self.worker = self.worker, None
+        self._worker_finalizer.detach()
+        self.pool.release(worker, recycle=True)
+        self._start_worker()
+        self._request("send_variables", variables)
+        self._request("restore_definitions", self._definitions)
+
+    def send_variables(self, variables: dict):
+        self._request("send_variables", variables)
+
+    def send_tools(self, tools: Dict[str, Tool]):
+        self.tools = dict(tools)
+        self._request("send_tools", list(self.tools))
+
+    def cleanup(self):
+        """Returns the worker to the pool."""
+        if self.worker is not None:
+            worker, self.worker = self.worker, None
+            self._worker_finalizer.detach()
+            self.pool.release(worker)
+
+    def delete(self):
+        """Ensure cleanup on deletion."""
+        self.cleanup()
+
+
+__all__ = ["E2BExecutor", "DockerExecutor", "SubprocessExecutor", "SubprocessWorkerPool"]
@@ -15,18 +15,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import ast
+import asyncio
+import copy
+import hashlib
 import inspect
 import json
 import logging
 import os
+import pickle
 import sys
 import tempfile
 import textwrap
+import threading
+import time
 import types
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from functools import wraps
+from functools import partial, wraps
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from huggingface_hub import (
     create_repo,
@@ -53,10 +61,15 @@ logger = logging.getLogger(__name__)
 
 def validate_after_init(cls):
     original_init = cls.__init__
+    init_signature = inspect.signature(original_init)
 
     @wraps(original_init)
     def new_init(self, *args, **kwargs):
         original_init(self, *args, **kwargs)
+        # The `__init__` of the class of the tool runs last, so the arguments of its subclasses' calls are overwritten
+        bound_arguments = init_signature.bind(self, *args, **kwargs)
+        bound_arguments.apply_defaults()
+        self._init_arguments = dict(list(bound_arguments.arguments.items())[1:])
         self.validate_arguments()
 
     cls.__init__ = new_init
@@ -79,6 +92,131 @@ AUTHORIZED_TYPES = [
 CONVERSION_DICT = {"str": "string", "int": "integer", "float": "number"}
 
 
+class ToolResultCache:
+    """
+    Cache of the results of the tools declaring themselves `cacheable`, keyed by the tool name, the implementation of
+    the tool (the module and qualified name of its class and of its `forward` function), the configuration of the tool
+    (see `cache_key_attributes`) and the arguments, and shared by all the agents of the process through
+    `TOOL_RESULT_CACHE`.
+
+    Each tool has its own in-memory LRU of at most `cache_max_size` results, which expire after `cache_ttl` seconds.
+    With a `directory`, the results are also pickled to disk, to be reused by other processes and later runs: results
+    that can't be pickled are only kept in memory. Calls with arguments that can't be serialized to JSON, like images,
+    or tools configured with values that can't be serialized to JSON, are not cached, nor are the calls raising errors.
+
+    Args:
+        directory (`str`, *optional*): Directory of the on-disk cache.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._entries: Dict[str, OrderedDict[str, Tuple[float, Any]]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool: "Tool", args: tuple, kwargs: dict) -> Optional[str]:
+        """
+        Returns the key of a call, made of the implementation and configuration of the tool and of the call arguments
+        normalized to keyword arguments, or `None` if the call can't be cached.
+        """
+        # Tools with the same name may be implemented differently, e.g. functions decorated with `@tool` in two modules
+        forward = getattr(tool.forward, "__func__", tool.forward)
+        implementation = [
+            f"{type(tool).__module__}.{type(tool).__qualname__}",
+            f"{getattr(forward, '__module__', None)}.{getattr(forward, '__qualname__', None)}",
+        ]
+        arguments = dict(zip(tool.inputs, args))
+        arguments.update(kwargs)
+        if tool.cache_key_attributes is not None:
+            configuration = {name: getattr(tool, name, None) for name in tool.cache_key_attributes}
+        else:
+            configuration = getattr(tool, "_init_arguments", {})
+        try:
+            return json.dumps(
+                {"implementation": implementation, "tool": configuration, "arguments": arguments}, sort_keys=True
+            )
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, tool: "Tool", key: str) -> Tuple[bool, Any]:
+        """Returns whether the result of a call is cached and not expired, and a copy of the result if so."""
+        with self._lock:
+            stats = self._stats.setdefault(tool.name, {"hits": 0, "misses": 0})
+            entries = self._entries.setdefault(tool.name, OrderedDict())
+            entry = entries.get(key)
+            if entry is None and self.directory is not None:
+                entry = self._read(tool.name, key)
+            if entry is None or (tool.cache_ttl is not None and time.time() - entry[0] > tool.cache_ttl):
+                entries.pop(key, None)
+                stats["misses"] += 1
+                return False, None
+            entries[key] = entry
+            entries.move_to_end(key)
+            self._evict(tool, entries)
+            stats["hits"] += 1
+        return True, self._copy(entry[1])
+
+    def set(self, tool: "Tool", key: str, value: Any):
+        entry = (time.time(), self._copy(value))
+        with self._lock:
+            entries = self._entries.setdefault(tool.name, OrderedDict())
+            entries[key] = entry
+            entries.move_to_end(key)
+            self._evict(tool, entries)
+            if self.directory is not None:
+                self._write(tool.name, key, entry)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns the hits, misses and in-memory size of the cache of each tool."""
+        with self._lock:
+            return {name: {**stats, "size": len(self._entries.get(name, ()))} for name, stats in self._stats.items()}
+
+    def clear(self):
+        """Clears the in-memory cache and the stats. The on-disk cache is left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        # Callers may mutate the results
+        try:
+            return copy.deepcopy(value)
+        except Exception:
+            return value
+
+    def _evict(self, tool: "Tool", entries: OrderedDict):
+        while len(entries) > tool.cache_max_size:
+            entries.popitem(last=False)
+
+    def _path(self, tool_name: str, key: str) -> Path:
+        return Path(self.directory) / tool_name / f"{hashlib.sha256(key.encode()).hexdigest()}.pkl"
+
+    def _read(self, tool_name: str, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            with open(self._path(tool_name, key), "rb") as file:
+                stored_key, entry = pickle.load(file)
+        except Exception:
+            return None
+        return entry if stored_key == key else None
+
+    def _write(self, tool_name: str, key: str, entry: Tuple[float, Any]):
+        path = self._path(tool_name, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Writing to a temporary file first, so that other processes never read a partial entry
+            temporary_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(temporary_path, "wb") as file:
+                pickle.dump((key, entry), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write the result of tool {tool_name} to the cache: {e}")
+
+
+TOOL_RESULT_CACHE = ToolResultCache()
+
+
 class Tool:
     """
     A base class for the functions used by the agent. Subclass this and implement the `forward` method as well as the
@@ -99,12 +237,33 @@ class Tool:
     You can also override the method [`~Tool.setup`] if your tool has an expensive operation to perform before being
     usable (such as loading a model). [`~Tool.setup`] will be called the first time you use your tool, but not at
     instantiation.
+
+    Deterministic tools can opt in to caching their results in `TOOL_RESULT_CACHE`, see [`ToolResultCache`], with the
+    following class attributes:
+
+    - **cacheable** (`bool`, defaults to `False`) -- Whether the results of the tool can be reused for calls with the
+      same arguments.
+    - **cache_ttl** (`float`, *optional*) -- Time after which a cached result expires, in seconds. Never expires if
+      unset.
+    - **cache_max_size** (`int`, defaults to `128`) -- Maximum number of results kept in memory.
+    - **cache_key_attributes** (`List[str]`, *optional*) -- Attributes configuring the tool, like the number of
+      results of a search, so that instances configured differently don't share results. Defaults to the arguments
+      passed to `__init__`. Like other complex attributes, set it in `__init__`.
+
+    Tools that can safely be called from several threads at once, like stateless tools waiting on the network, can set
+    **thread_safe** (`bool`, defaults to `False`) so that the [`ToolCallingAgent`] runs their calls concurrently when
+    the model returns several tool calls at once. Calls to the other tools run one after the other.
     """
 
     name: str
     description: str
     inputs: Dict[str, Dict[str, Union[str, type, bool]]]
     output_type: str
+    cacheable: bool = False
+    cache_ttl: Optional[float] = None
+    cache_max_size: int = 128
+    cache_key_attributes: Optional[List[str]] = None
+    thread_safe: bool = False
 
     def __init__(self, *args, **kwargs):
         self.is_initialized = False
@@ -173,9 +332,48 @@ class Tool:
         return NotImplementedError("Write this method in your subclass of `Tool`.")
 
     def __call__(self, *args, sanitize_inputs_outputs: bool = False, **kwargs):
-        if not self.is_initialized:
-            self.setup()
+        args, kwargs = self._prepare_arguments(args, kwargs, sanitize_inputs_outputs)
+        cache_key = TOOL_RESULT_CACHE.make_key(self, args, kwargs) if self.cacheable else None
+        is_cached = False
+        if cache_key is not None:
+            is_cached, outputs = TOOL_RESULT_CACHE.get(self, cache_key)
+        if not is_cached:
+            if not self.is_initialized:
+                self.setup()
+            outputs = self.forward(*args, **kwargs)
+            if inspect.isawaitable(outputs):  # `async def forward`
+                outputs = run_coroutine(outputs)
+            if cache_key is not None:
+                TOOL_RESULT_CACHE.set(self, cache_key, outputs)
+        if sanitize_inputs_outputs:
+            outputs = handle_agent_output_types(outputs, self.output_type)
+        return outputs
 
+    async def acall(self, *args, sanitize_inputs_outputs: bool = False, **kwargs):
+        """
+        Calls the tool from an event loop. If `forward` is defined with `async def`, it is awaited, otherwise the tool
+        is called in a worker thread, so that the event loop is not blocked.
+        """
+        if not inspect.iscoroutinefunction(self.forward):
+            return await asyncio.to_thread(
+                partial(self.__call__, *args, sanitize_inputs_outputs=sanitize_inputs_outputs, **kwargs)
+            )
+        args, kwargs = self._prepare_arguments(args, kwargs, sanitize_inputs_outputs)
+        cache_key = TOOL_RESULT_CACHE.make_key(self, args, kwargs) if self.cacheable else None
+        is_cached = False
+        if cache_key is not None:
+            is_cached, outputs = TOOL_RESULT_CACHE.get(self, cache_key)
+        if not is_cached:
+            if not self.is_initialized:
+                await asyncio.to_thread(self.setup)
+            outputs = await self.forward(*args, **kwargs)
+            if cache_key is not None:
+                TOOL_RESULT_CACHE.set(self, cache_key, outputs)
+        if sanitize_inputs_outputs:
+            outputs = handle_agent_output_types(outputs, self.output_type)
+        return outputs
+
+    def _prepare_arguments(self, args: tuple, kwargs: dict, sanitize_inputs_outputs: bool) -> Tuple[tuple, dict]:
         # Handle the arguments might be passed as a single dictionary
         if len(args) == 1 and len(kwargs) == 0 and isinstance(args[0], dict):
             potential_kwargs = args[0]
@@ -187,10 +385,7 @@ class Tool:
 
         if sanitize_inputs_outputs:
             args, kwargs = handle_agent_input_types(*args, **kwargs)
-        outputs = self.forward(*args, **kwargs)
-        if sanitize_inputs_outputs:
-            outputs = handle_agent_output_types(outputs, self.output_type)
-        return outputs
+        return args, kwargs
 
     def setup(self):
         """
@@ -824,9 +1019,23 @@ class ToolCollection:
             yield cls(tools)
 
 
+def run_coroutine(coroutine: Any) -> Any:
+    """
+    Runs a coroutine to completion from synchronous code and returns its result, for instance to call a tool with an
+    `async def forward` from an agent run synchronously. If an event loop is already running in this thread, the
+    coroutine is run in a new event loop in another thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
 def tool(tool_function: Callable) -> Tool:
     """
-    Converts a function into an instance of a Tool subclass.
+    Converts a function into an instance of a Tool subclass. The function can be defined with `async def`.
 
     Args:
         tool_function: Your function. Should have type hints for each input and a type hint for the output.
@@ -1061,6 +1270,8 @@ def get_tools_definition_code(tools: Dict[str, Tool]) -> str:
 __all__ = [
     "AUTHORIZED_TYPES",
     "Tool",
+    "ToolResultCache",
+    "TOOL_RESULT_CACHE",
     "tool",
     "load_tool",
     "launch_gradio_demo",
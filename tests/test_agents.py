@@ -12,8 +12,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
+import contextvars
 import os
 import tempfile
+import time
 import unittest
 import uuid
 from contextlib import nullcontext as does_not_raise
@@ -33,7 +36,7 @@ from smolagents.agents import (
     populate_template,
 )
 from smolagents.default_tools import DuckDuckGoSearchTool, FinalAnswerTool, PythonInterpreterTool, VisitWebpageTool
-from smolagents.memory import PlanningStep
+from smolagents.memory import ActionStep, ExecutionLogsDelta, PlanningStep
 from smolagents.models import (
     ChatMessage,
     ChatMessageToolCall,
@@ -849,7 +852,181 @@ class TestMultiStepAgent:
             )
 
 
+class TestToolCallingAgent:
+    @staticmethod
+    def make_model(calls):
+        def model(messages, tools_to_call_from=None, stop_sequences=None, grammar=None):
+            if len(messages) < 3:
+                tool_calls = [
+                    ChatMessageToolCall(
+                        id=f"call_{index}",
+                        type="function",
+                        function=ChatMessageToolCallDefinition(name=name, arguments=arguments),
+                    )
+                    for index, (name, arguments) in enumerate(calls)
+                ]
+            else:
+                tool_calls = [
+                    ChatMessageToolCall(
+                        id="call_final",
+                        type="function",
+                        function=ChatMessageToolCallDefinition(name="final_answer", arguments={"answer": "done"}),
+                    )
+                ]
+            return ChatMessage(role="assistant", content="", tool_calls=tool_calls)
+
+        return model
+
+    def test_parallel_tool_calls_run_concurrently(self):
+        @tool
+        def slow_search(query: str) -> str:
+            """Searches slowly.
+
+            Args:
+                query: The query
+            """
+            time.sleep(0.3)
+            return f"Results for {query}"
+
+        slow_search.thread_safe = True
+        model = self.make_model([("slow_search", {"query": f"query {index}"}) for index in range(4)])
+        agent = ToolCallingAgent(tools=[slow_search], model=model)
+        start_time = time.time()
+        assert agent.run("Search four things.") == "done"
+        assert time.time() - start_time < 1.0
+        step = agent.memory.steps[1]
+        assert [tool_call.id for tool_call in step.tool_calls] == ["call_0", "call_1", "call_2", "call_3"]
+        assert step.observations.split("\n\n") == [
+            f"Call id: call_{index}\nResults for query {index}" for index in range(4)
+        ]
+
+    def test_tool_calls_run_sequentially_unless_thread_safe(self):
+        class StatefulTool(Tool):
+            name = "stateful_tool"
+            description = "Records its calls."
+            inputs = {"query": {"type": "string", "description": "The query."}}
+            output_type = "string"
+
+            def __init__(self):
+                super().__init__()
+                self.running, self.max_running = 0, 0
+
+            def forward(self, query: str):
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+                time.sleep(0.05)
+                self.running -= 1
+                return query
+
+        stateful_tool = StatefulTool()
+        model = self.make_model([("stateful_tool", {"query": f"query {index}"}) for index in range(4)])
+        agent = ToolCallingAgent(tools=[stateful_tool], model=model)
+        assert agent.run("Call four times.") == "done"
+        assert stateful_tool.max_running == 1
+        assert agent.memory.steps[1].observations.split("\n\n") == [
+            f"Call id: call_{index}\nquery {index}" for index in range(4)
+        ]
+        stateful_tool.thread_safe = True
+        agent.run("Call four times.")
+        assert stateful_tool.max_running > 1
+
+    def test_failing_tool_call_keeps_other_observations(self):
+        @tool
+        def divide(number: float) -> float:
+            """Divides 1 by a number.
+
+            Args:
+                number: The number
+            """
+            return 1 / number
+
+        model = self.make_model([("divide", {"number": 0}), ("divide", {"number": 4})])
+        agent = ToolCallingAgent(tools=[divide], model=model, max_tool_threads=1)
+        assert agent.run("Divide.") == "done"
+        step = agent.memory.steps[1]
+        assert step.observations == "Call id: call_1\n0.25"
+        assert "ZeroDivisionError" in str(step.error)
+
+    def test_error_message_has_the_id_of_the_failing_call(self):
+        @tool
+        def divide(number: float) -> float:
+            """Divides 1 by a number.
+
+            Args:
+                number: The number
+            """
+            return 1 / number
+
+        model = self.make_model([("divide", {"number": 4}), ("divide", {"number": 0})])
+        agent = ToolCallingAgent(tools=[divide], model=model)
+        assert agent.run("Divide.") == "done"
+        step = agent.memory.steps[1]
+        assert step.error_tool_call_id == "call_1"
+        error_message = step.to_messages()[-1]["content"][0]["text"]
+        assert error_message.startswith("Call id: call_1\nError:")
+
+    def test_final_answer_is_returned_after_other_tool_calls(self):
+        model = self.make_model(
+            [("python_interpreter", {"code": "2 * 21"}), ("final_answer", {"answer": "forty-two"})]
+        )
+        agent = ToolCallingAgent(tools=[PythonInterpreterTool()], model=model)
+        assert agent.run("Compute and answer.") == "forty-two"
+        assert "42" in agent.memory.steps[1].observations
+
+    def test_arun_awaits_async_model_and_tools(self):
+        @tool
+        async def slow_search(query: str) -> str:
+            """Searches slowly.
+
+            Args:
+                query: The query
+            """
+            await asyncio.sleep(0.3)
+            return f"Results for {query}"
+
+        slow_search.thread_safe = True
+
+        class AsyncModel:
+            def __init__(self, model):
+                self.model = model
+
+            async def acall(self, messages, **kwargs):
+                return self.model(messages, **kwargs)
+
+        model = AsyncModel(self.make_model([("slow_search", {"query": f"query {index}"}) for index in range(4)]))
+        agents = [ToolCallingAgent(tools=[slow_search], model=model) for _ in range(3)]
+
+        async def run_agents():
+            return await asyncio.gather(*[agent.arun("Search four things.") for agent in agents])
+
+        start_time = time.time()
+        assert asyncio.run(run_agents()) == ["done"] * 3
+        assert time.time() - start_time < 1.0
+        assert agents[0].memory.steps[1].observations.split("\n\n") == [
+            f"Call id: call_{index}\nResults for query {index}" for index in range(4)
+        ]
+
+    def test_astream_yields_steps_then_final_answer(self):
+        model = self.make_model([("python_interpreter", {"code": "2 * 21"})])
+        agent = ToolCallingAgent(tools=[PythonInterpreterTool()], model=model)
+
+        async def collect_outputs():
+            return [output async for output in agent.astream("Compute.")]
+
+        outputs = asyncio.run(collect_outputs())
+        assert [type(output) for output in outputs[:-1]] == [ActionStep, ActionStep]
+        assert "42" in outputs[0].observations
+        assert outputs[-1] == "done"
+
+
 class TestCodeAgent:
+    def test_arun(self):
+        agent = CodeAgent(tools=[PythonInterpreterTool()], model=fake_code_model)
+        assert asyncio.run(agent.arun("What is 2 multiplied by 3.6452?")) == 7.2904
+        assert agent.memory.steps[2].tool_calls == [
+            ToolCall(name="python_interpreter", arguments="final_answer(7.2904)", id="call_2")
+        ]
+
     @pytest.mark.parametrize("provide_run_summary", [False, True])
     def test_call_with_provide_run_summary(self, provide_run_summary):
         agent = CodeAgent(tools=[], model=MagicMock(), provide_run_summary=provide_run_summary)
@@ -902,6 +1079,92 @@ class TestCodeAgent:
         answer = agent.run("Fake task.")
         assert answer == "2CUSTOM"
 
+    def test_local_executor_kwargs(self):
+        agent = CodeAgent(tools=[], model=MagicMock(), executor_kwargs={"timeout": 5, "max_memory": 1024**3})
+        assert agent.python_executor.timeout == 5
+        assert agent.python_executor.max_memory == 1024**3
+
+    def test_subprocess_executor(self):
+        @tool
+        def double(x: int) -> int:
+            """Doubles a number
+
+            Args:
+                x: The number to double
+            """
+            return 2 * x
+
+        def fake_code_model(messages, stop_sequences=None, grammar=None) -> str:
+            return ChatMessage(
+                role="assistant", content="Code:\n```py\nprint('running')\nfinal_answer(double(21))\n```"
+            )
+
+        agent = CodeAgent(tools=[double], model=fake_code_model, executor_type="subprocess")
+        assert agent.run("Fake task.") == 42
+        assert agent.memory.steps[1].observations.startswith("Execution logs:\nrunning\n")
+        agent.python_executor.cleanup()
+
+    def test_execution_profile(self):
+        @tool
+        def double(x: int) -> int:
+            """Doubles a number
+
+            Args:
+                x: The number to double
+            """
+            return 2 * x
+
+        def fake_code_model(messages, stop_sequences=None, grammar=None) -> str:
+            return ChatMessage(
+                role="assistant", content="Code:\n```py\ntotal = sum(range(10))\nfinal_answer(double(total))\n```"
+            )
+
+        agent = CodeAgent(tools=[double], model=fake_code_model, executor_kwargs={"profile": True})
+        assert agent.run("Fake task.") == 90
+        execution_profile = agent.memory.steps[1].dict()["execution_profile"]
+        assert [statement["line"] for statement in execution_profile["statements"]] == [1, 2]
+        assert [tool_stats["name"] for tool_stats in execution_profile["tools"]] == ["double", "final_answer"]
+
+    def test_stream_outputs(self):
+        def fake_code_model(messages, stop_sequences=None, grammar=None) -> str:
+            return ChatMessage(
+                role="assistant", content="Code:\n```py\nprint('first')\nprint('second')\nfinal_answer(3)\n```"
+            )
+
+        agent = CodeAgent(tools=[], model=fake_code_model, stream_outputs=True)
+        outputs = list(agent.run("Fake task.", stream=True))
+        assert outputs[:2] == [
+            ExecutionLogsDelta(step_number=1, content="first\n"),
+            ExecutionLogsDelta(step_number=1, content="second\n"),
+        ]
+        assert isinstance(outputs[2], ActionStep)
+        assert outputs[2].observations.startswith("Execution logs:\nfirst\nsecond\n")
+        assert outputs[3] == 3
+        assert agent.python_executor.output_sink is None
+        # Without streaming, only the final answer is returned
+        assert agent.run("Fake task.") == 3
+
+    def test_stream_outputs_stops_when_consumer_stops(self):
+        request_id = contextvars.ContextVar("request_id", default=None)
+        seen_request_ids = []
+
+        def fake_code_model(messages, stop_sequences=None, grammar=None) -> str:
+            seen_request_ids.append(request_id.get())
+            return ChatMessage(role="assistant", content="Code:\n```py\nprint('working')\n```")
+
+        agent = CodeAgent(tools=[], model=fake_code_model, stream_outputs=True, max_steps=10)
+        request_id.set("request-1")
+        outputs = agent.run("Fake task.", stream=True)
+        for output in outputs:
+            if isinstance(output, ActionStep):
+                break
+        outputs.close()
+        # The background run stopped after the step being executed, and ran in the caller's context
+        assert len(seen_request_ids) <= 2
+        assert set(seen_request_ids) == {"request-1"}
+        assert len(agent.memory.steps) == len(seen_request_ids) + 1
+        assert agent.python_executor.output_sink is None
+
 
 class MultiAgentsTests(unittest.TestCase):
     def test_multiagents_save(self):
@@ -922,7 +1185,7 @@ class MultiAgentsTests(unittest.TestCase):
             managed_agents=[web_agent, code_agent],
             max_print_outputs_length=1000,
             executor_type="local",
-            executor_kwargs={"max_workers": 2},
+            executor_kwargs={"timeout": 30},
         )
         agent.save("agent_export")
 
@@ -961,7 +1224,7 @@ class MultiAgentsTests(unittest.TestCase):
         assert set(agent2.authorized_imports) == set(["pandas", "datetime"] + BASE_BUILTIN_MODULES)
         assert agent2.max_print_outputs_length == 1000
         assert agent2.executor_type == "local"
-        assert agent2.executor_kwargs == {"max_workers": 2}
+        assert agent2.executor_kwargs == {"timeout": 30}
         assert (
             agent2.managed_agents["web_agent"].tools["web_search"].max_results == 10
         )  # For now tool init parameters are forgotten
@@ -14,28 +14,70 @@
 # limitations under the License.
 
 import ast
+import math
+import os
+import subprocess
+import sys
+import time
 import types
 import unittest
 from contextlib import nullcontext as does_not_raise
+from functools import partial
 from textwrap import dedent
 
 import numpy as np
 import pandas as pd
 import pytest
 
+from smolagents import local_python_executor
 from smolagents.default_tools import BASE_PYTHON_TOOLS
 from smolagents.local_python_executor import (
+    SAFE_RESULT_MARK,
+    AuthorizationIndex,
+    CodeCache,
+    ExecutionProfile,
     InterpreterError,
+    LazyIterator,
     LocalPythonExecutor,
+    OperationBudget,
     PrintContainer,
     check_module_authorized,
+    evaluate_ast,
     evaluate_condition,
     evaluate_delete,
     evaluate_python_code,
     evaluate_subscript,
+    find_independent_calls,
     fix_final_answer_code,
     get_safe_module,
 )
+from smolagents.tools import tool
+from smolagents.utils import truncate_content
+
+
+def pytest_generate_tests(metafunc):
+    # Run each test going through an entry point against both the tree-walking interpreter and the compiled closures
+    entry_points = {"evaluate_python_code", "LocalPythonExecutor"}
+    if "python_engine" in metafunc.fixturenames and entry_points & set(metafunc.function.__code__.co_names):
+        metafunc.parametrize("python_engine", [False, True], ids=["ast", "compiled"], indirect=True)
+
+
+@pytest.fixture(autouse=True)
+def python_engine(request, monkeypatch):
+    # unittest.TestCase classes can't be parametrized: they select the engine with a `compile_code` class attribute
+    compile_code = getattr(request, "param", getattr(request.cls, "compile_code", False))
+    test_module = sys.modules[__name__]
+    monkeypatch.setattr(
+        test_module,
+        "evaluate_python_code",
+        partial(local_python_executor.evaluate_python_code, compile_code=compile_code),
+    )
+    monkeypatch.setattr(
+        test_module,
+        "LocalPythonExecutor",
+        partial(local_python_executor.LocalPythonExecutor, compile_code=compile_code),
+    )
+    return compile_code
 
 
 # Fake function we will use as tool
@@ -55,14 +97,14 @@ class PythonInterpreterTester(unittest.TestCase):
         state = {}
         result, _ = evaluate_python_code(code, {}, state=state)
         assert result == 3
-        self.assertDictEqualNoPrint(state, {"x": 3, "_operations_count": 2})
+        self.assertDictEqualNoPrint(state, {"x": 3})
 
         code = "x = y"
         state = {"y": 5}
         result, _ = evaluate_python_code(code, {}, state=state)
         # evaluate returns the value of the last assignment.
         assert result == 5
-        self.assertDictEqualNoPrint(state, {"x": 5, "y": 5, "_operations_count": 2})
+        self.assertDictEqualNoPrint(state, {"x": 5, "y": 5})
 
         code = "a=1;b=None"
         result, _ = evaluate_python_code(code, {}, state={})
@@ -88,7 +130,7 @@ class PythonInterpreterTester(unittest.TestCase):
         state = {"x": 3}
         result, _ = evaluate_python_code(code, {"add_two": add_two}, state=state)
         assert result == 5
-        self.assertDictEqualNoPrint(state, {"x": 3, "y": 5, "_operations_count": 3})
+        self.assertDictEqualNoPrint(state, {"x": 3, "y": 5})
 
         # Should not work without the tool
         with pytest.raises(InterpreterError) as e:
@@ -100,14 +142,14 @@ class PythonInterpreterTester(unittest.TestCase):
         state = {}
         result, _ = evaluate_python_code(code, {}, state=state)
         assert result == 3
-        self.assertDictEqualNoPrint(state, {"x": 3, "_operations_count": 2})
+        self.assertDictEqualNoPrint(state, {"x": 3})
 
     def test_evaluate_dict(self):
         code = "test_dict = {'x': x, 'y': add_two(x)}"
         state = {"x": 3}
         result, _ = evaluate_python_code(code, {"add_two": add_two}, state=state)
         self.assertDictEqual(result, {"x": 3, "y": 5})
-        self.assertDictEqualNoPrint(state, {"x": 3, "test_dict": {"x": 3, "y": 5}, "_operations_count": 7})
+        self.assertDictEqualNoPrint(state, {"x": 3, "test_dict": {"x": 3, "y": 5}})
 
     def test_evaluate_expression(self):
         code = "x = 3\ny = 5"
@@ -115,7 +157,7 @@ class PythonInterpreterTester(unittest.TestCase):
         result, _ = evaluate_python_code(code, {}, state=state)
         # evaluate returns the value of the last assignment.
         assert result == 5
-        self.assertDictEqualNoPrint(state, {"x": 3, "y": 5, "_operations_count": 4})
+        self.assertDictEqualNoPrint(state, {"x": 3, "y": 5})
 
     def test_evaluate_f_string(self):
         code = "text = f'This is x: {x}.'"
@@ -123,23 +165,21 @@ class PythonInterpreterTester(unittest.TestCase):
         result, _ = evaluate_python_code(code, {}, state=state)
         # evaluate returns the value of the last assignment.
         assert result == "This is x: 3."
-        self.assertDictEqualNoPrint(state, {"x": 3, "text": "This is x: 3.", "_operations_count": 6})
+        self.assertDictEqualNoPrint(state, {"x": 3, "text": "This is x: 3."})
 
     def test_evaluate_f_string_with_format(self):
         code = "text = f'This is x: {x:.2f}.'"
         state = {"x": 3.336}
         result, _ = evaluate_python_code(code, {}, state=state)
         assert result == "This is x: 3.34."
-        self.assertDictEqualNoPrint(state, {"x": 3.336, "text": "This is x: 3.34.", "_operations_count": 8})
+        self.assertDictEqualNoPrint(state, {"x": 3.336, "text": "This is x: 3.34."})
 
     def test_evaluate_f_string_with_complex_format(self):
         code = "text = f'This is x: {x:>{width}.{precision}f}.'"
         state = {"x": 3.336, "width": 10, "precision": 2}
         result, _ = evaluate_python_code(code, {}, state=state)
         assert result == "This is x:       3.34."
-        self.assertDictEqualNoPrint(
-            state, {"x": 3.336, "width": 10, "precision": 2, "text": "This is x:       3.34.", "_operations_count": 14}
-        )
+        self.assertDictEqualNoPrint(state, {"x": 3.336, "width": 10, "precision": 2, "text": "This is x:       3.34."})
 
     def test_evaluate_if(self):
         code = "if x <= 3:\n    y = 2\nelse:\n    y = 5"
@@ -147,40 +187,40 @@ class PythonInterpreterTester(unittest.TestCase):
         result, _ = evaluate_python_code(code, {}, state=state)
         # evaluate returns the value of the last assignment.
         assert result == 2
-        self.assertDictEqualNoPrint(state, {"x": 3, "y": 2, "_operations_count": 6})
+        self.assertDictEqualNoPrint(state, {"x": 3, "y": 2})
 
         state = {"x": 8}
         result, _ = evaluate_python_code(code, {}, state=state)
         # evaluate returns the value of the last assignment.
         assert result == 5
-        self.assertDictEqualNoPrint(state, {"x": 8, "y": 5, "_operations_count": 6})
+        self.assertDictEqualNoPrint(state, {"x": 8, "y": 5})
 
     def test_evaluate_list(self):
         code = "test_list = [x, add_two(x)]"
         state = {"x": 3}
         result, _ = evaluate_python_code(code, {"add_two": add_two}, state=state)
         self.assertListEqual(result, [3, 5])
-        self.assertDictEqualNoPrint(state, {"x": 3, "test_list": [3, 5], "_operations_count": 5})
+        self.assertDictEqualNoPrint(state, {"x": 3, "test_list": [3, 5]})
 
     def test_evaluate_name(self):
         code = "y = x"
         state = {"x": 3}
         result, _ = evaluate_python_code(code, {}, state=state)
         assert result == 3
-        self.assertDictEqualNoPrint(state, {"x": 3, "y": 3, "_operations_count": 2})
+        self.assertDictEqualNoPrint(state, {"x": 3, "y": 3})
 
     def test_evaluate_subscript(self):
         code = "test_list = [x, add_two(x)]\ntest_list[1]"
         state = {"x": 3}
         result, _ = evaluate_python_code(code, {"add_two": add_two}, state=state)
         assert result == 5
-        self.assertDictEqualNoPrint(state, {"x": 3, "test_list": [3, 5], "_operations_count": 9})
+        self.assertDictEqualNoPrint(state, {"x": 3, "test_list": [3, 5]})
 
         code = "test_dict = {'x': x, 'y': add_two(x)}\ntest_dict['y']"
         state = {"x": 3}
         result, _ = evaluate_python_code(code, {"add_two": add_two}, state=state)
         assert result == 5
-        self.assertDictEqualNoPrint(state, {"x": 3, "test_dict": {"x": 3, "y": 5}, "_operations_count": 11})
+        self.assertDictEqualNoPrint(state, {"x": 3, "test_dict": {"x": 3, "y": 5}})
 
         code = "vendor = {'revenue': 31000, 'rent': 50312}; vendor['ratio'] = round(vendor['revenue'] / vendor['rent'], 2)"
         state = {}
@@ -204,14 +244,14 @@ for result in search_results:
         state = {}
         result, _ = evaluate_python_code(code, {"range": range}, state=state)
         assert result == 2
-        self.assertDictEqualNoPrint(state, {"x": 2, "i": 2, "_operations_count": 11})
+        self.assertDictEqualNoPrint(state, {"x": 2, "i": 2})
 
     def test_evaluate_binop(self):
         code = "y + x"
         state = {"x": 3, "y": 6}
         result, _ = evaluate_python_code(code, {}, state=state)
         assert result == 9
-        self.assertDictEqualNoPrint(state, {"x": 3, "y": 6, "_operations_count": 4})
+        self.assertDictEqualNoPrint(state, {"x": 3, "y": 6})
 
     def test_recursive_function(self):
         code = """
@@ -339,6 +379,24 @@ print(check_digits)
         result, _ = evaluate_python_code(code, {}, state={})
         assert result == 5
 
+    def test_local_scopes(self):
+        code = dedent("""\
+            def f(a):
+                local_variable = a + offset
+                return local_variable
+            offset = 10
+            result = f(1)
+            squares = [i**2 for i in range(3)]
+            pairs = {j: k for j, k in [(1, 2)]}
+            g = lambda m: m + offset
+            """)
+        state = {}
+        evaluate_python_code(code, {"range": range}, state=state)
+        assert state["result"] == 11
+        assert state["g"](1) == 11
+        # Function, comprehension and lambda variables do not leak into the enclosing state
+        assert not {"a", "local_variable", "i", "j", "k", "m"} & set(state)
+
     def test_dictcomp(self):
         code = "x = {i: i**2 for i in range(3)}"
         result, _ = evaluate_python_code(code, {"range": range}, state={})
@@ -386,6 +444,39 @@ while i < n and house_positions[i] <= loc:
         result, _ = evaluate_python_code(code, BASE_PYTHON_TOOLS, state={})
         assert result == [1, 4, 9, 16, 25]
 
+    def test_generator_is_lazy(self):
+        code = dedent("""\
+            seen = []
+            def check(x):
+                seen.append(x)
+                return x > 2
+            found = any(check(x) for x in range(10))
+            first = next(x for x in range(10**12) if x > 5)
+            pairs = list((x, y) for x in range(3) for y in range(x) if y != 1)
+            squares = (x**2 for x in range(3))
+            """)
+        state = {}
+        evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state)
+        assert state["found"] is True
+        assert state["seen"] == [0, 1, 2, 3]
+        assert state["first"] == 6
+        assert state["pairs"] == [(1, 0), (2, 0)]
+        assert isinstance(state["squares"], LazyIterator)
+        assert list(state["squares"]) == [0, 1, 4]
+
+    def test_generator_exposes_no_frame(self):
+        authorized_imports = []
+        code = dedent("""\
+            g = (x for x in [1])
+            g.gi_frame.f_locals["authorized_imports"].append("subprocess")
+            """)
+        with pytest.raises(InterpreterError, match="Forbidden access to attribute"):
+            evaluate_python_code(code, BASE_PYTHON_TOOLS, state={}, authorized_imports=authorized_imports)
+        for code in ["getattr((x for x in [1]), 'gi_frame')", "getattr((x for x in [1])._next.__self__, 'gi_code')"]:
+            with pytest.raises(InterpreterError, match="Forbidden access to attribute"):
+                evaluate_python_code(code, BASE_PYTHON_TOOLS, state={}, authorized_imports=authorized_imports)
+        assert authorized_imports == []
+
     def test_boolops(self):
         code = """if (not (a > b and a > c)) or d > e:
     best_city = "Brooklyn"
@@ -645,12 +736,22 @@ except ValueError as e:
     def test_tuple_id(self):
         code = """
 food_items = {"apple": 2, "banana": 3, "orange": 1, "pear": 1}
-unique_food_items = [item for item, count in food_item_counts.items() if count == 1]
+unique_food_items = [item for item, count in food_items.items() if count == 1]
 """
         state = {}
         result, is_final_answer = evaluate_python_code(code, {}, state=state)
         assert result == ["orange", "pear"]
 
+    def test_close_names_are_only_suggested(self):
+        code = """
+food_items = {"apple": 2, "banana": 3, "orange": 1, "pear": 1}
+unique_food_items = [item for item, count in food_item_counts.items() if count == 1]
+"""
+        with pytest.raises(InterpreterError, match="`food_item_counts` is not defined. Did you mean `food_items`?"):
+            evaluate_python_code(code, {}, state={})
+        with pytest.raises(InterpreterError, match="tried to execute lenn\\). Did you mean `len`?"):
+            evaluate_python_code("lenn([1])", {"len": len}, state={})
+
     def test_nonsimple_augassign(self):
         code = """
 counts_dict = {'a': 0}
@@ -998,6 +1099,10 @@ exec(compile('{unsafe_code}', 'no filename', 'exec'))
         evaluate_python_code(code, authorized_imports=["sklearn"])
 
 
+class CompiledPythonInterpreterTester(PythonInterpreterTester):
+    compile_code = True
+
+
 @pytest.mark.parametrize(
     "code, expected_result",
     [
@@ -1173,7 +1278,6 @@ def test_evaluate_delete(code, state, expectation):
         assert str(expectation) in str(exception_info.value)
     else:
         evaluate_delete(delete_node, state, {}, {}, [])
-        _ = state.pop("_operations_count", None)
         assert state == expectation
 
 
@@ -1323,12 +1427,12 @@ def test_evaluate_condition_with_pandas_exceptions(condition, state, expected_ex
         ("tup[:]", {"tup": (1, 2, 3)}, (1, 2, 3)),
         ("tup[::2]", {"tup": (1, 2, 3, 4)}, (1, 3)),
         ("tup[::-1]", {"tup": (1, 2, 3)}, (3, 2, 1)),
-        ("st[1]", {"str": "abc"}, "b"),
-        ("st[-1]", {"str": "abc"}, "c"),
-        ("st[1:3]", {"str": "abcd"}, "bc"),
-        ("st[:]", {"str": "abc"}, "abc"),
-        ("st[::2]", {"str": "abcd"}, "ac"),
-        ("st[::-1]", {"str": "abc"}, "cba"),
+        ("st[1]", {"st": "abc"}, "b"),
+        ("st[-1]", {"st": "abc"}, "c"),
+        ("st[1:3]", {"st": "abcd"}, "bc"),
+        ("st[:]", {"st": "abc"}, "abc"),
+        ("st[::2]", {"st": "abcd"}, "ac"),
+        ("st[::-1]", {"st": "abc"}, "cba"),
         ("arr[1]", {"arr": np.array([1, 2, 3])}, 2),
         ("arr[1:3]", {"arr": np.array([1, 2, 3, 4])}, np.array([2, 3])),
         ("arr[:]", {"arr": np.array([1, 2, 3])}, np.array([1, 2, 3])),
@@ -1439,6 +1543,47 @@ def test_get_safe_module_handle_lazy_imports():
     assert getattr(safe_module, "non_lazy_attribute") == "ok"
 
 
+def test_get_safe_module_is_cached_and_lazy():
+    fake_package = types.ModuleType("fake_package")
+    fake_package.__file__ = "fake_package/__init__.py"
+    fake_package.submodule = types.ModuleType("fake_package.submodule")
+    fake_package.submodule.value = 1
+
+    safe_module = get_safe_module(fake_package, authorized_imports=["fake_package"])
+    assert safe_module is get_safe_module(fake_package, authorized_imports=["fake_package"])
+    assert safe_module is not get_safe_module(fake_package, authorized_imports=["fake_package", "os"])
+    assert safe_module.__name__ == "fake_package"
+    assert safe_module.__file__ == "fake_package/__init__.py"
+    assert "submodule" in dir(safe_module)
+    # Submodules are wrapped on access and pick up later changes of the wrapped module
+    assert safe_module.submodule is get_safe_module(fake_package.submodule, authorized_imports=["fake_package"])
+    fake_package.submodule.value = 2
+    assert safe_module.submodule.value == 2
+    assert safe_module.__dict__["submodule"] is safe_module.submodule
+
+
+class TestAuthorizationIndex:
+    def test_index_is_reused_until_tools_or_imports_change(self):
+        static_tools = {"len": len}
+        authorized_imports = ["math"]
+        index = AuthorizationIndex.get(static_tools, authorized_imports)
+        assert AuthorizationIndex.get(static_tools, authorized_imports) is index
+        static_tools["abs"] = abs
+        assert AuthorizationIndex.get(static_tools, authorized_imports) is not index
+        assert AuthorizationIndex.get(static_tools, ["math", "os"]) is not index
+
+    def test_lookups(self):
+        index = AuthorizationIndex({"len": len, "eval": eval}, ["os"])
+        assert not index.is_forbidden_builtin(len)
+        assert index.is_forbidden_builtin(abs)
+        assert not index.is_forbidden_builtin([].append)
+        assert not index.is_forbidden_module("os", os.__file__)
+        assert index.is_forbidden_module("subprocess", subprocess.__file__)
+        assert not index.is_forbidden_module("subprocess", "fake_subprocess.py")
+        assert ("builtins", "exec") in index.forbidden_functions
+        assert ("builtins", "eval") not in index.forbidden_functions
+
+
 def test_non_standard_comparisons():
     code = dedent("""\
         class NonStdEqualsResult:
@@ -1494,6 +1639,32 @@ class TestPrintContainer:
         pc.append("Hello")
         assert len(pc) == 5
 
+    @pytest.mark.parametrize("max_length", [0, 1, 2, 7, 50])
+    def test_truncation_matches_truncate_content(self, max_length):
+        pc = PrintContainer(max_length=max_length)
+        printed = ""
+        for i in range(300):
+            text = f"line {i}\n" * (i % 3)
+            pc += text
+            printed += text
+            assert str(pc) == truncate_content(printed, max_length=max_length)
+
+    def test_output_sink(self):
+        printed = []
+        pc = PrintContainer(max_length=4, output_sink=printed.append)
+        pc += "Hello\n"
+        pc.append("World\n")
+        assert printed == ["Hello\n", "World\n"]
+        assert str(pc) == truncate_content("Hello\nWorld\n", max_length=4)
+
+    def test_memory_is_bounded(self):
+        pc = PrintContainer(max_length=100)
+        for i in range(100_000):
+            pc += f"{i}\n"
+        assert sum(len(chunk) for chunk in pc._chunks) <= 2 * 100 + len("99999\n")
+        assert str(pc).startswith("0\n1\n2\n")
+        assert str(pc).endswith("99998\n99999\n")
+
 
 @pytest.mark.parametrize(
     "module,authorized_imports,expected",
@@ -1525,6 +1696,48 @@ class TestLocalPythonExecutor:
         result, _, _ = executor(code)
         assert result == 11
 
+    def test_imported_modules_are_not_shared_mutably_between_executors(self):
+        first_executor, second_executor = LocalPythonExecutor([]), LocalPythonExecutor([])
+        first_executor.send_tools({})
+        second_executor.send_tools({})
+        for code in ["import math\nmath.pi = 3", "import math\nsetattr(math, 'pi', 3)"]:
+            with pytest.raises(InterpreterError, match="modules are read-only"):
+                first_executor(code)
+        assert second_executor("import math\nmath.pi")[0] == math.pi
+
+    def test_unsupported_comprehension_target_raises_interpreter_error(self):
+        executor = LocalPythonExecutor([])
+        executor.send_tools({})
+        with pytest.raises(InterpreterError):
+            executor("x = [0]\n[1 for x[0] in [1, 2]]")
+
+    @pytest.mark.parametrize(
+        "code,limits,expected_error",
+        [
+            (
+                "while True:\n    try:\n        pass\n    except Exception:\n        pass",
+                {"timeout": 0.2},
+                "time limit",
+            ),
+            ("x = []\nwhile True:\n    x.append('a' * 100000)", {"max_memory": 50 * 1024**2}, "memory limit"),
+        ],
+    )
+    def test_execution_limits(self, code, limits, expected_error):
+        executor = LocalPythonExecutor([], **limits)
+        executor.send_tools({})
+        with pytest.raises(InterpreterError, match=expected_error):
+            executor(code)
+        # The executor is still usable after a code action was stopped
+        assert executor("1 + 1")[0] == 2
+
+    def test_output_sink(self):
+        printed = []
+        executor = LocalPythonExecutor([], output_sink=printed.append)
+        executor.send_tools({})
+        _, logs, _ = executor("for i in range(3):\n    print(i)")
+        assert printed == ["0\n", "1\n", "2\n"]
+        assert logs == "0\n1\n2\n"
+
     @pytest.mark.parametrize(
         "code",
         [
@@ -1563,6 +1776,563 @@ class TestLocalPythonExecutor:
         with pytest.raises(InterpreterError, match=".*Cannot unpack tuple of wrong size"):
             executor(code)
 
+    def test_compiled_code_counts_operations_like_interpreter(self):
+        code = dedent("""
+            total = 0
+            for i in range(20):
+                if i % 3 == 0 and i > 2:
+                    total += i * 2
+                else:
+                    total = total - (1 if i else 0)
+            squares = {x: x**2 for x in range(5)}
+            text = f"{total:>5}" + str([x for x in range(4) if x % 2])
+            """)
+        states = []
+        for compile_code in [False, True]:
+            state = {}
+            local_python_executor.evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state, compile_code=compile_code)
+            states.append({key: value for key, value in state.items() if key != "_print_outputs"})
+        assert states[0] == states[1]
+
+
+@tool
+def slow_square(x: int) -> int:
+    """
+    Returns the square of a number after waiting a bit.
+
+    Args:
+        x: The number to square.
+    """
+    time.sleep(0.2)
+    if x < 0:
+        raise ValueError(f"Negative number: {x}")
+    return x * x
+
+
+class TestParallelToolCalls:
+    def test_parallel_map(self):
+        code = "parallel_map(slow_square, [1, 2, 3, 4])"
+        start_time = time.perf_counter()
+        result, _ = evaluate_python_code(code, {"slow_square": slow_square, **BASE_PYTHON_TOOLS}, state={})
+        assert result == [1, 4, 9, 16]
+        assert time.perf_counter() - start_time < 0.6
+
+    def test_parallel_map_with_defined_function(self):
+        code = "def add(a, b):\n    return a + b\nparallel_map(add, [1, 2], [10, 20], max_workers=1)"
+        result, _ = evaluate_python_code(code, BASE_PYTHON_TOOLS, state={})
+        assert result == [11, 22]
+
+    def test_parallel_map_raises_first_error_in_order(self):
+        code = "parallel_map(slow_square, [1, -2, -3])"
+        with pytest.raises(InterpreterError, match="Negative number: -2"):
+            evaluate_python_code(code, {"slow_square": slow_square, **BASE_PYTHON_TOOLS}, state={})
+
+    def test_find_independent_calls(self):
+        code = dedent(
+            """
+            a = f(1)
+            b = f(x, key=f"{y}")
+            f([a])
+            g(2)
+            h(3, *args)
+            c = f(4)
+            d = f(5)
+            """
+        )
+        assert find_independent_calls(ast.parse(code).body) == [[0, 1], [2, 3], [5, 6]]
+
+    def test_independent_tool_calls_are_concurrent(self):
+        executor = LocalPythonExecutor([], parallel_tool_calls=True)
+        executor.send_tools({"slow_square": slow_square})
+        start_time = time.perf_counter()
+        output, _, _ = executor("a = slow_square(2)\nb = slow_square(3)\nslow_square(4)")
+        assert time.perf_counter() - start_time < 0.4
+        assert (executor.state["a"], executor.state["b"], output) == (4, 9, 16)
+        start_time = time.perf_counter()
+        output, _, _ = executor("a = slow_square(2)\nslow_square(a)")
+        assert output == 16 and time.perf_counter() - start_time >= 0.4
+
+    def test_independent_tool_calls_raise_errors_in_order(self):
+        executor = LocalPythonExecutor([], parallel_tool_calls=True)
+        executor.send_tools({"slow_square": slow_square})
+        with pytest.raises(InterpreterError, match="'b = slow_square\\(-3\\)'.*Negative number: -3"):
+            executor("a = slow_square(2)\nb = slow_square(-3)\nc = slow_square(-4)")
+        assert executor.state["a"] == 4 and "b" not in executor.state and "c" not in executor.state
+
+
+class TestExecutorSnapshots:
+    def make_executor(self):
+        executor = LocalPythonExecutor([])
+        executor.send_tools({})
+        return executor
+
+    def test_restore(self):
+        executor = self.make_executor()
+        executor("items = [1]\ncount = 1")
+        snapshot = executor.snapshot()
+        executor("items.append(2)\ncount += 1\nnew_variable = 3")
+        executor.restore(snapshot)
+        assert executor.state["items"] == [1] and executor.state["count"] == 1
+        assert "new_variable" not in executor.state
+        executor("items.append(4)")
+        executor.restore(snapshot)
+        assert executor.state["items"] == [1]
+
+    def test_values_are_copied_on_use(self):
+        executor = self.make_executor()
+        executor("used = [1]\nunused = [2]\nalias = used")
+        snapshot = executor.snapshot()
+        executor("used.append(3)")
+        assert snapshot.state["used"] == [1]
+        assert executor.state["unused"] is snapshot.state["unused"]
+        assert executor.state["alias"] is executor.state["used"]
+
+    @pytest.mark.parametrize(
+        "code, copied",
+        [
+            ("n = len(items)", False),
+            (
+                "first = items[0][0]\ntotal = 0\nfor row in items:\n    total = total + row[0]\nprint(f'{items}')",
+                False,
+            ),
+            ("items[0].append(2)", True),
+            ("row = items[0]\nrow.append(2)", True),
+            ("for row in items:\n    row += [2]", True),
+            ("rows = sorted(items)", True),
+            ("copied = items.copy()", True),
+        ],
+    )
+    def test_values_are_only_copied_if_mutated(self, code, copied):
+        executor = self.make_executor()
+        executor("items = [[1]]")
+        snapshot = executor.snapshot()
+        executor(code)
+        assert (executor.state["items"] is not snapshot.state["items"]) is copied
+        assert snapshot.state["items"] == [[1]]
+
+    def test_values_used_by_functions_are_copied(self):
+        executor = self.make_executor()
+        executor("items = []\ndef add(value):\n    items.append(value)")
+        snapshot = executor.snapshot()
+        executor("add(1)")
+        assert executor.state["items"] == [1]
+        executor.restore(snapshot)
+        assert executor.state["items"] == []
+        executor("add(2)")
+        assert executor.state["items"] == [2]
+
+    def test_fork(self):
+        executor = self.make_executor()
+        executor("items = [1]\ndef double(x):\n    return 2 * x")
+        forks = [executor.fork() for _ in range(2)]
+        forks[0]("items.append(double(2))")
+        forks[1]("items.append(double(3))")
+        assert [fork.state["items"] for fork in forks] == [[1, 4], [1, 6]]
+        assert executor.state["items"] == [1]
+
+    @pytest.mark.parametrize("native_code", [False, True])
+    def test_fork_rebinds_functions(self, native_code):
+        executor = LocalPythonExecutor([], native_code=native_code)
+        executor.send_tools({})
+        executor(
+            dedent("""
+            items = []
+            def record(x):
+                items.append(x)
+                print(x)
+                return len(items)
+            def make_counter(offset):
+                def count():
+                    return len(items) + offset
+                return count
+            count = make_counter(10)
+            """)
+        )
+        fork = executor.fork()
+        output, logs, _ = fork("record(5)")
+        assert (output, logs) == (1, "5\n")
+        assert fork("count()")[0] == 11
+        assert fork.state["items"] == [5]
+        # Functions inherited by the fork don't read or write the variables of the parent executor
+        assert executor.state["items"] == []
+        assert executor("record(6)\ncount()")[0] == 11
+        assert fork.state["items"] == [5]
+
+
+class TestStateSpilling:
+    def make_executor(self, tmp_path, max_state_memory):
+        executor = LocalPythonExecutor(
+            ["numpy"], max_state_memory=max_state_memory, min_spill_size=1000, spill_directory=str(tmp_path)
+        )
+        executor.send_tools({})
+        return executor
+
+    def test_memory_usage(self, tmp_path):
+        executor = self.make_executor(tmp_path, None)
+        executor.send_variables({"array": np.zeros(1000), "frame": pd.DataFrame({"a": range(100)})})
+        executor("import numpy\nsmall = 1")
+        usage = executor.memory_usage()
+        assert usage["array"] == 8000
+        assert usage["frame"] == executor.state["frame"].memory_usage(deep=True).sum()
+        assert "numpy" not in usage and "_print_outputs" not in usage
+
+    def test_least_recently_used_values_are_spilled_and_loaded_back(self, tmp_path):
+        executor = self.make_executor(tmp_path, 50_000)
+        executor("old = list(range(1000))\nalias = old")
+        executor("recent = list(range(1000))")
+        executor("small = 1")
+        assert "old" not in executor.state and "alias" not in executor.state
+        assert "recent" in executor.state and len(os.listdir(tmp_path)) == 1
+        output, _, _ = executor("alias.append(-1)\nold[-1]")
+        assert output == -1 and executor.state["alias"] is executor.state["old"]
+        assert "recent" not in executor.state and len(os.listdir(tmp_path)) == 1
+        executor("recent = 0")
+        assert executor.state["recent"] == 0 and os.listdir(tmp_path) == []
+
+    def test_arrays_are_memory_mapped(self, tmp_path):
+        executor = self.make_executor(tmp_path, 1000)
+        executor.send_variables({"array": np.arange(1000)})
+        executor("small = 1")
+        assert "array" not in executor.state and os.listdir(tmp_path)[0].endswith(".npy")
+        output, _, _ = executor("array[0] = 5\nint(array.sum())")
+        assert output == sum(range(1000)) + 5
+
+    @pytest.mark.parametrize("native_code", [False, True])
+    @pytest.mark.parametrize("code", ["a.count()", "counters['big']()", "counters['nested'][0]()"])
+    def test_values_used_indirectly_are_loaded_back(self, tmp_path, native_code, code):
+        executor = LocalPythonExecutor(
+            [], max_state_memory=1000, min_spill_size=1000, spill_directory=str(tmp_path), native_code=native_code
+        )
+        executor.send_tools({})
+        executor(
+            dedent("""
+            class A:
+                def count(self):
+                    return len(big)
+            a = A()
+            counters = {"big": lambda: len(big), "nested": [lambda: big[-1] + 1]}
+            big = list(range(1000))
+            """)
+        )
+        assert "big" not in executor.state
+        output, _, _ = executor(code)
+        assert output == 1000
+
+    def test_spilled_values_are_kept_by_snapshots(self, tmp_path):
+        executor = self.make_executor(tmp_path, 1000)
+        executor("values = list(range(1000))")
+        assert "values" not in executor.state
+        snapshot = executor.snapshot()
+        executor("values.clear()")
+        executor.restore(snapshot)
+        output, _, _ = executor("len(values)")
+        assert output == 1000
+        assert len(os.listdir(tmp_path)) == 2
+        del snapshot
+        assert len(os.listdir(tmp_path)) == 1
+
+
+class TestCodeCache:
+    def test_get_counts_hits_and_misses(self):
+        cache = CodeCache()
+        parsed_code = cache.get("x = 1")
+        assert cache.get("x = 1") is parsed_code
+        cache.get("y = 2")
+        assert cache.stats() == {"hits": 1, "misses": 2, "size": 2, "max_size": 256}
+
+    def test_evicts_least_recently_used(self):
+        cache = CodeCache(max_size=2)
+        cache.get("a = 1")
+        cache.get("b = 1")
+        cache.get("a = 1")
+        cache.get("c = 1")
+        assert len(cache) == 2
+        cache.get("a = 1")
+        cache.get("b = 1")
+        assert cache.stats()["misses"] == 4
+
+    def test_syntax_errors_are_not_cached(self):
+        cache = CodeCache()
+        with pytest.raises(SyntaxError):
+            cache.get("x = ")
+        assert len(cache) == 0
+
+    def test_compiled_body_is_computed_once(self):
+        cache = CodeCache()
+        compiled_body = cache.get("x = 1\ny = x + 1").get_compiled_body()
+        assert len(compiled_body) == 2
+        assert cache.get("x = 1\ny = x + 1").get_compiled_body() is compiled_body
+
+    def test_cache_is_shared_across_executors(self, monkeypatch):
+        cache = CodeCache()
+        monkeypatch.setattr(local_python_executor, "CODE_CACHE", cache)
+        for _ in range(2):
+            executor = LocalPythonExecutor([])
+            executor.send_tools({})
+            assert executor("x = 2; x * 3")[0] == 6
+        assert cache.stats()["hits"] == 1
+
+
+class TestStaticSafetyCheck:
+    @pytest.mark.parametrize(
+        "code, expected_error",
+        [
+            ("print('started')\nimport os", "Import of os is not allowed"),
+            ("print('started')\nfrom os import path", "Import from os is not allowed"),
+            ("print('started')\nf = lambda: 0\nf.__globals__", "Forbidden access to module: builtins"),
+            ("def f():\n    import os\nprint('started')", "Import of os is not allowed"),
+        ],
+    )
+    def test_rejects_code_before_running_it(self, code, expected_error):
+        state = {}
+        with pytest.raises(InterpreterError, match=expected_error):
+            evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state)
+        assert str(state["_print_outputs"]) == ""
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "def g():\n    return 1\ny = g()",
+            "try:\n    import os\nexcept Exception:\n    y = 1",
+            "try:\n    undefined_function()\nexcept Exception:\n    y = 1",
+            "y = ValueError('error')",
+        ],
+    )
+    def test_allows_code_handling_its_errors(self, code):
+        state = {}
+        evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state)
+        assert state["y"] is not None
+
+    def test_leaves_undefined_names_to_runtime(self):
+        state = {}
+        evaluate_python_code("if False:\n    undefined_function()\ny = 1", BASE_PYTHON_TOOLS, state=state)
+        assert state["y"] == 1
+        with pytest.raises(InterpreterError, match="tried to execute undefined_functon.*undefined_function"):
+            evaluate_python_code(
+                "print('started')\nundefined_functon()",
+                BASE_PYTHON_TOOLS,
+                state={"undefined_function": lambda: None},
+            )
+
+    def test_analysis_is_cached_on_parsed_code(self):
+        cache = CodeCache()
+        analysis = cache.get("import os\nx = f()").get_static_analysis()
+        assert [(kind, name) for _, kind, name in analysis.findings] == [("import", "os")]
+        assert cache.get("import os\nx = f()").get_static_analysis() is analysis
+
+    def test_marks_safe_results(self):
+        parsed_code = CodeCache().get("x = [1] + [2]\ny = 1 if z else 'a'\nd = {'a': f}\nm = f(x)\nn = z or 1")
+        analysis = parsed_code.get_static_analysis()
+        assert [statement in analysis.safe_result_nodes for statement in parsed_code.module.body] == [
+            True,
+            True,
+            True,
+            False,
+            False,
+        ]
+        assert all(getattr(node, SAFE_RESULT_MARK) for node in analysis.safe_result_nodes)
+
+
+class TestNativeCode:
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "total = 0\nfor i in range(100):\n    if i % 3 == 0:\n        total += i * 2\ntotal",
+            "squares = {x: x * x for x in range(10) if x % 2}\nsum(squares.values())",
+            "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\nresult = fib(10)",
+            "class A:\n    def __init__(self, x):\n        self.x = x\nA(3).x",
+            "import math\nfrom collections import Counter\nCounter('abca').most_common(1)[0][0] * math.floor(2.5)",
+            "items = [3, 1, 2]\nitems.sort()\nprint(items, '{:.1f}'.format(1.25))",
+            "try:\n    import os\nexcept Exception as e:\n    message = str(e)\nmessage",
+        ],
+    )
+    def test_same_results_as_interpreter(self, code):
+        results = []
+        for native_code in [False, True]:
+            state = {}
+            result, _ = evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state, native_code=native_code)
+            results.append((result, str(state["_print_outputs"])))
+            assert "__builtins__" not in state
+        assert results[0] == results[1]
+
+    @pytest.mark.parametrize(
+        "code, native_safe",
+        [
+            ("def f(x):\n    return x * 2\ny = f(3)", True),
+            ("def f(x):\n    return x.__class__\ny = f(3)", False),
+            ("def f(x):\n    return x._private\ny = 3", False),
+            ("def f(x):\n    return getattr(x, 'real')\ny = f(3)", False),
+            ("def f(x):\n    return '{0.real}'.format(x)\ny = f(3)", False),
+            ("def f(x):\n    return x\n__builtins__ = {}\ny = 3", False),
+            ("def f(x):\n    return x.gi_frame\ny = 3", False),
+            ("def f(x):\n    return x.tb_frame.f_back\ny = 3", False),
+            ("def f(x):\n    try:\n        return x()\n    except:\n        return None\ny = 3", False),
+            ("def f(x):\n    try:\n        return x()\n    except BaseException:\n        return None\ny = 3", False),
+        ],
+    )
+    def test_falls_back_to_interpreter(self, code, native_safe):
+        state, custom_tools = {}, {}
+        evaluate_python_code(code, BASE_PYTHON_TOOLS, custom_tools, state=state, native_code=True)
+        # Functions defined natively are regular functions in the state
+        assert ("f" in state) is native_safe
+        assert ("f" in custom_tools) is not native_safe
+
+    def test_checks_values(self):
+        tools = {**BASE_PYTHON_TOOLS, "get_module": lambda: os}
+        with pytest.raises(InterpreterError, match="Forbidden access to module: os"):
+            evaluate_python_code("m = get_module()", tools, state={}, native_code=True)
+
+    def test_counts_operations(self):
+        with pytest.raises(InterpreterError, match="Reached the max number of operations"):
+            evaluate_python_code(
+                "while True:\n    pass",
+                BASE_PYTHON_TOOLS,
+                state={},
+                native_code=True,
+                budget=OperationBudget(max_operations=1000),
+            )
+
+    @pytest.mark.parametrize(
+        "code",
+        [
+            "n = 0\nwhile True:\n    n += 1",
+            "def f():\n    n = 0\n    while n >= 0:\n        n += 1\nf()",
+            "for i in range(3):\n    n = 0\n    while n < 10:\n        n += 1\nwhile True:\n    pass",
+        ],
+    )
+    def test_limits_while_iterations(self, code):
+        with pytest.raises(InterpreterError, match="Maximum number of 10 iterations in While loop exceeded"):
+            evaluate_python_code(
+                code, BASE_PYTHON_TOOLS, state={}, native_code=True, budget=OperationBudget(10**12, 10)
+            )
+
+    def test_checks_callees(self):
+        with pytest.raises(InterpreterError, match="Invoking a builtin function .* not allowed \\(eval\\)"):
+            evaluate_python_code("y = f('1 + 1')", BASE_PYTHON_TOOLS, state={"f": eval}, native_code=True)
+
+    def test_functions_use_the_budget_of_the_current_step(self):
+        executor = LocalPythonExecutor([], native_code=True, max_operations=100)
+        executor.send_tools({})
+        executor("def f():\n    for i in range(60):\n        pass")
+        for _ in range(3):
+            executor("f()")
+        fork = executor.fork()
+        for _ in range(3):
+            fork("f()")
+        with pytest.raises(InterpreterError, match="max number of operations of 100"):
+            executor("f()\nf()")
+
+    def test_static_tools_cannot_be_overwritten(self):
+        with pytest.raises(InterpreterError, match="Cannot assign to name 'len'"):
+            evaluate_python_code("len = 3", BASE_PYTHON_TOOLS, state={}, native_code=True)
+
+    def test_limit_is_raised_again_if_caught(self):
+        executor = LocalPythonExecutor(["time"], native_code=True, timeout=0.2)
+        executor.send_tools({})
+        code = dedent("""
+            import time
+            catch_all = Exception.mro()[1]
+            try:
+                while True:
+                    time.sleep(0.001)
+            except catch_all:
+                pass
+            while True:
+                time.sleep(0.001)
+        """)
+        with pytest.raises(InterpreterError, match="time limit"):
+            executor(code)
+        assert executor("1 + 1")[0] == 2
+
+    def test_local_executor(self):
+        executor = LocalPythonExecutor([], native_code=True)
+        executor.send_tools({})
+        executor("def double(x):\n    return 2 * x")
+        assert executor("double(21)")[0] == 42
+
+
+class TestOperationBudget:
+    def test_charges_calls_and_iterations(self):
+        code = "def f(x):\n    return x\ntotal = 0\nfor i in range(5):\n    total += f(i)\nsquares = [i * i for i in range(3)]"
+        budget = OperationBudget(call_cost=10)
+        state = {}
+        evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state, budget=budget)
+        # 5 loop iterations and 3 comprehension items, 5 calls to `f` and 2 calls to `range`
+        assert budget.operations == 8 + 10 * 7
+        assert "_operations_count" not in state
+
+    @pytest.mark.parametrize(
+        "code, budget, expected_error",
+        [
+            ("for i in range(100):\n    pass", OperationBudget(max_operations=50), "max number of operations of 50"),
+            ("def f():\n    return f()\nf()", OperationBudget(max_operations=50), "max number of operations of 50"),
+            ("while True:\n    pass", OperationBudget(max_while_iterations=10), "Maximum number of 10 iterations"),
+        ],
+    )
+    def test_limits(self, code, budget, expected_error):
+        with pytest.raises(InterpreterError, match=expected_error):
+            evaluate_python_code(code, BASE_PYTHON_TOOLS, state={}, budget=budget)
+
+    def test_local_executor_limits(self):
+        executor = LocalPythonExecutor([], max_operations=100, operation_costs={"iteration_cost": 10})
+        executor.send_tools({})
+        executor("for i in range(9):\n    pass")
+        with pytest.raises(InterpreterError, match="max number of operations of 100"):
+            executor("for i in range(11):\n    pass")
+
+    def test_direct_evaluations_have_their_own_budget(self):
+        loop = ast.parse("for i in range(5):\n    pass").body[0]
+        for _ in range(3):
+            evaluate_ast(loop, {}, BASE_PYTHON_TOOLS, {})
+        # The fallback budget only covered each evaluation, so direct callers never run out of operations
+        assert local_python_executor._OPERATION_BUDGET.get() is None
+
+
+class TestExecutionProfile:
+    def test_records_statements_lines_and_tools(self):
+        code = dedent(
+            """\
+            def square(x):
+                return x * x
+            total = 0
+            for i in range(10):
+                total += square(i)
+            wait()
+            """
+        )
+        tools = {**BASE_PYTHON_TOOLS, "wait": lambda: time.sleep(0.05)}
+        profile = ExecutionProfile()
+        state = {}
+        evaluate_python_code(code, tools, state=state, profile=profile)
+        assert state["total"] == 285
+        assert [statement["line"] for statement in profile.statements] == [1, 3, 4, 6]
+        lines = {line_stats["line"]: line_stats for line_stats in profile.dict()["lines"]}
+        assert lines[2]["hits"] == 10
+        assert lines[5]["hits"] == 10
+        # The time and operations of the loop body are not counted on the loop line
+        loop_statement = profile.statements[2]
+        assert lines[4]["operations"] < loop_statement["operations"]
+        assert loop_statement["operations"] == sum(lines[line]["operations"] for line in (2, 4, 5))
+        assert profile.tools == {"wait": {"name": "wait", "calls": 1, "time": pytest.approx(0.05, abs=0.04)}}
+        assert profile.total_time >= profile.tools["wait"]["time"]
+
+    def test_same_results_as_unprofiled(self):
+        code = "def f(x):\n    return [x * i for i in range(x)]\nresult = f(5)"
+        states = []
+        for profile in [None, ExecutionProfile()]:
+            state = {}
+            evaluate_python_code(code, BASE_PYTHON_TOOLS, state=state, compile_code=True, profile=profile)
+            states.append({key: value for key, value in state.items() if key != "_print_outputs"})
+        assert states[0] == states[1]
+
+    def test_local_executor(self):
+        executor = LocalPythonExecutor([], profile=True)
+        executor.send_tools({})
+        executor("x = 1\ny = 2")
+        assert len(executor.execution_profile.statements) == 2
+        executor("z = 3")
+        assert len(executor.execution_profile.statements) == 1
+
 
 class TestLocalPythonExecutorSecurity:
     @pytest.mark.parametrize(
@@ -1648,6 +2418,18 @@ class TestLocalPythonExecutorSecurity:
         ):
             executor("import os; os.popen")
 
+    @pytest.mark.parametrize(
+        "code",
+        [
+            'd = {"__name__": [1]}\nd',
+            "def f():\n    pass\nf.__module__ = [1]\nf",
+        ],
+    )
+    def test_unhashable_names_do_not_break_safety_checks(self, code):
+        executor = LocalPythonExecutor([])
+        executor.send_tools({})
+        executor(code)
+
     @pytest.mark.parametrize(
         "additional_authorized_imports, expected_error",
         [([], InterpreterError("Import of sys is not allowed")), (["os", "sys"], None)],
@@ -1803,6 +2585,25 @@ class TestLocalPythonExecutorSecurity:
                 )
             )
 
+    @pytest.mark.parametrize(
+        "additional_authorized_imports, expected_error",
+        [
+            ([], InterpreterError("Forbidden access to attribute: gi_frame")),
+            (["os", "sys"], InterpreterError("Forbidden access to attribute: gi_frame")),
+            # Frame attributes are allowed along with the builtins, but generators have no frame
+            (["builtins"], InterpreterError("object has no attribute 'gi_frame'")),
+        ],
+    )
+    def test_vulnerability_via_generator_frame(self, additional_authorized_imports, expected_error):
+        executor = LocalPythonExecutor(additional_authorized_imports)
+        executor.send_tools({})
+        with (
+            pytest.raises(type(expected_error), match=f".*{expected_error}")
+            if isinstance(expected_error, Exception)
+            else does_not_raise()
+        ):
+            executor("g = (x for x in [1])\nframe = g.gi_frame")
+
     @pytest.mark.parametrize("patch_builtin_import_module", [False, True])  # builtins_import.__module__ = None
     @pytest.mark.parametrize(
         "additional_authorized_imports, additional_tools, expected_error",
@@ -5,9 +5,11 @@ from smolagents.memory import (
     ActionStep,
     AgentMemory,
     ChatMessage,
+    ContextCompactor,
     MemoryStep,
     Message,
     MessageRole,
+    MessagesReference,
     PlanningStep,
     SystemPromptStep,
     TaskStep,
@@ -21,6 +23,148 @@ class TestAgentMemory:
         assert memory.system_prompt.system_prompt == system_prompt
         assert memory.steps == []
 
+    def test_get_messages_renders_each_step_once(self, monkeypatch):
+        rendered_steps = []
+        to_messages = ActionStep.to_messages
+
+        def counting_to_messages(self, **kwargs):
+            rendered_steps.append(self.step_number)
+            return to_messages(self, **kwargs)
+
+        monkeypatch.setattr(ActionStep, "to_messages", counting_to_messages)
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(TaskStep(task="Task"))
+        memory.steps.append(ActionStep(step_number=1, model_output="Output 1", observations="Observation 1"))
+        assert len(memory.get_messages()) == 4
+        memory.steps.append(ActionStep(step_number=2, model_output="Output 2"))
+        messages = memory.get_messages()
+        assert [message["role"] for message in messages] == [
+            MessageRole.SYSTEM,
+            MessageRole.USER,
+            MessageRole.ASSISTANT,
+            MessageRole.TOOL_RESPONSE,
+            MessageRole.ASSISTANT,
+        ]
+        assert rendered_steps == [1, 2]
+        messages.append("appended by the caller")
+        assert len(memory.get_messages(summary_mode=True)) == 2
+        assert rendered_steps == [1, 2, 1, 2]
+        assert len(memory.get_messages()) == 5
+
+    def test_get_messages_renders_changed_steps_again(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(ActionStep(step_number=1, observations="Observation", observations_images=["image"]))
+        memory.steps.append(ActionStep(step_number=2, model_output="Output"))
+        assert len(memory.get_messages()) == 4
+        memory.steps[0].observations_images = None
+        assert len(memory.get_messages()) == 3
+        memory.steps.pop(0)
+        assert [message["role"] for message in memory.get_messages()] == [MessageRole.SYSTEM, MessageRole.ASSISTANT]
+        memory.system_prompt = SystemPromptStep(system_prompt="New system prompt")
+        assert memory.get_messages()[0]["content"][0]["text"] == "New system prompt"
+        memory.reset()
+        assert len(memory.get_messages()) == 1
+
+    def test_reference_messages_share_the_message_log(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.steps.append(TaskStep(task="Task"))
+        first_messages = memory.get_messages()
+        first_reference = memory.reference_messages(first_messages)
+        memory.steps.append(ActionStep(step_number=1, model_output="Output"))
+        second_messages = memory.get_messages()
+        second_reference = memory.reference_messages(second_messages)
+        assert (second_reference.prefix_length, len(second_reference.delta)) == (2, 1)
+        assert second_reference.log is first_reference.log
+        assert first_reference.rebuild() == first_messages and second_reference.rebuild() == second_messages
+
+        memory.steps[0] = TaskStep(task="Changed task")
+        third_messages = memory.get_messages()
+        third_reference = memory.reference_messages(third_messages)
+        assert (third_reference.prefix_length, len(third_reference.delta)) == (1, 2)
+        assert third_reference.rebuild() == third_messages
+        assert second_reference.rebuild() == second_messages
+
+    def test_action_step_rebuilds_model_input_messages(self):
+        memory = AgentMemory(system_prompt="System prompt")
+        messages = memory.get_messages()
+        step = ActionStep(step_number=1, model_input_messages=memory.reference_messages(messages))
+        assert isinstance(step.model_input_messages, MessagesReference)
+        assert step.get_model_input_messages() == messages
+        assert step.dict()["model_input_messages"] == messages
+
+
+class TestContextCompactor:
+    def make_memory(self, max_tokens, keep_recent_steps=1):
+        memory = AgentMemory(system_prompt="System prompt")
+        memory.context_compactor = ContextCompactor(max_tokens, keep_recent_steps=keep_recent_steps)
+        memory.steps.append(TaskStep(task="Task"))
+        for step_number in range(1, 4):
+            memory.steps.append(
+                ActionStep(
+                    step_number=step_number,
+                    model_output=f"Output {step_number}",
+                    observations="x" * 4000,
+                    observations_images=["image"],
+                )
+            )
+        return memory
+
+    def test_messages_within_budget_are_kept(self):
+        memory = self.make_memory(max_tokens=100_000)
+        memory.context_compactor = None
+        messages = memory.get_messages()
+        memory.context_compactor = ContextCompactor(100_000)
+        assert memory.get_messages() == messages
+
+    def test_old_steps_are_compacted_first(self):
+        memory = self.make_memory(max_tokens=3000)
+        compactor = memory.context_compactor
+        messages = memory.get_messages()
+        assert sum(compactor.count_message_tokens(message) for message in messages) <= 3000
+        # Old steps lose their images and have their observations elided, the last step is kept verbatim
+        assert [message["role"] for message in messages] == [
+            MessageRole.SYSTEM,
+            MessageRole.USER,
+            MessageRole.ASSISTANT,
+            MessageRole.TOOL_RESPONSE,
+            MessageRole.ASSISTANT,
+            MessageRole.TOOL_RESPONSE,
+            MessageRole.ASSISTANT,
+            MessageRole.TOOL_RESPONSE,
+            MessageRole.USER,
+        ]
+        assert "characters elided" in messages[3]["content"][0]["text"]
+        assert "characters elided" not in messages[7]["content"][0]["text"]
+        # Compacted steps are cached until they change
+        assert memory.get_messages()[3] is messages[3]
+        memory.steps[1].observations = "Short observation"
+        assert "Short observation" in memory.get_messages()[3]["content"][0]["text"]
+
+    def test_compacted_steps_are_cached_per_summary_mode(self):
+        memory = self.make_memory(max_tokens=3000)
+        memory.get_messages()
+        summary_messages = memory.get_messages(summary_mode=True)
+        assert summary_messages == self.make_memory(max_tokens=3000).get_messages(summary_mode=True)
+        assert not any(message["role"] == MessageRole.ASSISTANT for message in summary_messages)
+
+    def test_oldest_steps_are_removed_when_compaction_is_not_enough(self):
+        memory = self.make_memory(max_tokens=2300)
+        compactor = memory.context_compactor
+        messages = memory.get_messages()
+        assert sum(compactor.count_message_tokens(message) for message in messages) <= 2300
+        assert messages[2]["content"][0]["text"] == (
+            "[1 earlier steps were removed to keep the context within its limit.]"
+        )
+        assert messages[3]["content"][0]["text"] == "Output 2"
+        assert messages[:2] == memory.get_messages()[:2]
+
+    def test_summarize_and_count_tokens_are_customizable(self):
+        compactor = ContextCompactor(10, keep_recent_steps=0, count_tokens=len, summarize=lambda text: "summary")
+        memory = AgentMemory(system_prompt="Sys")
+        memory.context_compactor = compactor
+        memory.steps.append(ActionStep(step_number=1, observations="Long observation"))
+        assert memory.get_messages()[1]["content"][0]["text"] == "summary"
+
 
 class TestMemoryStep:
     def test_initialization(self):
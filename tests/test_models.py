@@ -12,12 +12,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
 import json
 import sys
 import unittest
 from pathlib import Path
 from typing import Optional
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from transformers.testing_utils import get_tests_dir
@@ -28,6 +29,7 @@ from smolagents.models import (
     LiteLLMModel,
     MessageRole,
     MLXModel,
+    Model,
     OpenAIServerModel,
     TransformersModel,
     get_clean_message_list,
@@ -129,6 +131,15 @@ class ModelTests(unittest.TestCase):
         assert parsed_args == 3
 
 
+def test_model_acall_defaults_to_call_in_thread():
+    class EchoModel(Model):
+        def __call__(self, messages, stop_sequences=None, **kwargs):
+            return ChatMessage(role="assistant", content=f"{messages[0]['content']} until {stop_sequences}")
+
+    message = asyncio.run(EchoModel().acall([{"role": "user", "content": "Hello"}], stop_sequences=["end"]))
+    assert message.content == "Hello until ['end']"
+
+
 class TestHfApiModel:
     def test_call_with_custom_role_conversions(self):
         custom_role_conversions = {MessageRole.USER: MessageRole.SYSTEM}
@@ -141,6 +152,20 @@ class TestHfApiModel:
             "role conversion should be applied"
         )
 
+    def test_acall_uses_async_client(self):
+        model = HfApiModel(model_id="test-model")
+        model.client = MagicMock()
+        response = MagicMock()
+        response.choices[0].message = MagicMock(role="assistant", content="Hello", tool_calls=None)
+        response.usage.prompt_tokens, response.usage.completion_tokens = 5, 2
+        model.async_client = MagicMock(chat_completion=AsyncMock(return_value=response))
+        messages = [{"role": "user", "content": "Test message"}]
+        message = asyncio.run(model.acall(messages, stop_sequences=["stop"]))
+        assert message.content == "Hello"
+        assert model.async_client.chat_completion.call_args.kwargs["stop"] == ["stop"]
+        assert model.get_token_counts() == {"input_token_count": 5, "output_token_count": 2}
+        model.client.chat_completion.assert_not_called()
+
     @require_run_all
     def test_get_hfapi_message_no_tool(self):
         model = HfApiModel(model="Qwen/Qwen2.5-Coder-32B-Instruct", max_tokens=10)
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import unittest
 
 from smolagents import (
@@ -26,6 +27,7 @@ from smolagents.models import (
     ChatMessage,
     ChatMessageToolCall,
     ChatMessageToolCallDefinition,
+    TokenUsage,
 )
 from smolagents.monitoring import AgentLogger, LogLevel
 
@@ -124,6 +126,40 @@ class MonitoringTester(unittest.TestCase):
         self.assertEqual(agent.monitor.total_input_token_count, 20)  # Should have done two monitoring callbacks
         self.assertEqual(agent.monitor.total_output_token_count, 0)
 
+    def test_concurrent_runs_count_their_own_tokens(self):
+        class FakeAsyncLLMModel:
+            def __init__(self):
+                self.last_input_token_count = 0
+                self.last_output_token_count = 0
+
+            async def acall(self, messages, **kwargs):
+                input_tokens = 100 if "first" in str(messages) else 1
+                await asyncio.sleep(0.01)
+                # Other runs overwrite the counts of the shared model while this one is awaited
+                self.last_input_token_count = 1000
+                return ChatMessage(
+                    role="assistant",
+                    content="",
+                    tool_calls=[
+                        ChatMessageToolCall(
+                            id="fake_id",
+                            type="function",
+                            function=ChatMessageToolCallDefinition(name="final_answer", arguments={"answer": "done"}),
+                        )
+                    ],
+                    token_usage=TokenUsage(input_tokens=input_tokens, output_tokens=2),
+                )
+
+        model = FakeAsyncLLMModel()
+        agents = [ToolCallingAgent(tools=[], model=model, max_steps=1) for _ in range(2)]
+
+        async def run_agents():
+            return await asyncio.gather(agents[0].arun("first task"), agents[1].arun("second task"))
+
+        asyncio.run(run_agents())
+        self.assertEqual(agents[0].monitor.get_total_token_counts(), {"input": 100, "output": 2})
+        self.assertEqual(agents[1].monitor.get_total_token_counts(), {"input": 1, "output": 2})
+
     def test_streaming_agent_text_output(self):
         agent = CodeAgent(
             tools=[],
@@ -5,8 +5,10 @@ import docker
 import pytest
 from PIL import Image
 
+from smolagents.default_tools import FinalAnswerTool
+from smolagents.local_python_executor import InterpreterError
 from smolagents.monitoring import AgentLogger, LogLevel
-from smolagents.remote_executors import DockerExecutor, E2BExecutor
+from smolagents.remote_executors import DockerExecutor, E2BExecutor, SubprocessExecutor, SubprocessWorkerPool
 
 from .utils.markers import require_run_all
 
@@ -89,3 +91,92 @@ class TestDockerExecutor:
         client = docker.from_env()
         containers = [c.id for c in client.containers.list(all=True)]
         assert container_id not in containers, "Container should be removed"
+
+
+@pytest.fixture(scope="module")
+def subprocess_pool():
+    pool = SubprocessWorkerPool(size=1, max_runs_per_worker=3)
+    yield pool
+    pool.shutdown()
+
+
+class TestSubprocessExecutor:
+    @pytest.fixture(autouse=True)
+    def set_executor(self, subprocess_pool):
+        def add(a, b):
+            return a + b
+
+        def failing_tool():
+            raise ValueError("Tool failure")
+
+        self.printed = []
+        self.executor = SubprocessExecutor(["os"], pool=subprocess_pool, output_sink=self.printed.append)
+        self.executor.send_tools({"add": add, "failing_tool": failing_tool, "final_answer": FinalAnswerTool()})
+        self.executor.send_variables({"y": 2})
+        yield
+        self.executor.cleanup()
+
+    def test_state_persistence(self):
+        self.executor("x = y + 1")
+        assert self.executor("x * 2")[0] == 6
+
+    def test_tool_calls_are_proxied(self):
+        output, logs, is_final_answer = self.executor("result = add(1, b=y)\nprint(result)\nfinal_answer(result)")
+        assert output == 3
+        assert logs == "3\n"
+        assert is_final_answer
+        assert self.printed == ["3\n"]
+
+    def test_concurrent_tool_calls(self):
+        code = "def add_one(i):\n    print(i)\n    return add(i, 1)\nparallel_map(add_one, list(range(40)))"
+        output, logs, _ = self.executor(code)
+        assert output == list(range(1, 41))
+        assert sorted(self.printed, key=int) == [f"{i}\n" for i in range(40)]
+
+    def test_errors(self):
+        with pytest.raises(InterpreterError, match="ValueError: Tool failure"):
+            self.executor("print('before')\nfailing_tool()")
+        assert self.executor.state["_print_outputs"] == "before\n"
+        with pytest.raises(InterpreterError, match="could not be sent back"):
+            self.executor("(x for x in range(3))")
+
+    def test_crash_recovery(self):
+        with pytest.raises(InterpreterError, match="crashed with exit code 3"):
+            self.executor("import os\nos._exit(3)")
+        assert self.executor("add(1, 1)")[0] == 2
+        with pytest.raises(InterpreterError, match="`y` is not defined"):
+            self.executor("y")
+
+    def test_hung_worker_is_killed(self):
+        self.executor.timeout = 0.1
+        self.executor.WORKER_KILL_GRACE_PERIOD = 0.1
+        with pytest.raises(InterpreterError, match="did not answer"):
+            self.executor("import os\nos.read(os.pipe()[0], 1)")
+        assert self.executor("add(1, 1)")[0] == 2
+
+    @pytest.mark.parametrize("pool_kwargs", [{"max_runs_per_worker": 1}, {"max_memory_per_worker": 1}])
+    def test_leased_worker_is_recycled_with_its_state(self, pool_kwargs):
+        pool = SubprocessWorkerPool(size=1, **pool_kwargs)
+        executor = SubprocessExecutor(["os"], pool=pool)
+        try:
+            executor.send_tools({"add": lambda a, b: a + b})
+            executor.send_variables({"y": 2})
+            pid = executor(
+                "import os\nitems = [1]\ndef double(x):\n    return 2 * x\nclass A:\n    value = 3\nos.getpid()"
+            )[0]
+            assert executor("items.append(double(A.value))\nos.getpid()")[0] != pid
+            assert executor("items, double(2), y, add(1, 2)")[0] == ([1, 6], 4, 2, 3)
+        finally:
+            executor.cleanup()
+            pool.shutdown()
+
+    def test_workers_are_recycled(self, subprocess_pool):
+        pid = self.executor("import os\nos.getpid()")[0]
+        self.executor.cleanup()
+        executor = SubprocessExecutor(["os"], pool=subprocess_pool)
+        assert executor("import os\nos.getpid()")[0] == pid
+        executor("1")
+        executor.cleanup()
+        executor = SubprocessExecutor(["os"], pool=subprocess_pool)
+        assert executor("import os\nos.getpid()")[0] != pid
+        executor.cleanup()
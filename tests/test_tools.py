@@ -12,6 +12,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import asyncio
 import os
 import tempfile
 import unittest
@@ -28,7 +29,7 @@ from transformers import is_torch_available, is_vision_available
 from transformers.testing_utils import get_tests_dir
 
 from smolagents.agent_types import _AGENT_TYPE_MAPPING, AgentAudio, AgentImage, AgentText
-from smolagents.tools import AUTHORIZED_TYPES, Tool, ToolCollection, tool
+from smolagents.tools import AUTHORIZED_TYPES, Tool, ToolCollection, ToolResultCache, tool
 
 
 if is_torch_available():
@@ -478,6 +479,178 @@ class ToolTests(unittest.TestCase):
                 source_code = f.read()
                 compile(source_code, f.name, "exec")
 
+    def test_tool_with_async_forward(self):
+        @tool
+        async def fetch_page(url: str) -> str:
+            """Fetches a page.
+
+            Args:
+                url: The url of the page.
+            """
+            await asyncio.sleep(0.01)
+            return f"Content of {url}"
+
+        assert fetch_page(url="a") == "Content of a"
+        assert asyncio.run(fetch_page.acall(url="b")) == "Content of b"
+
+        async def call_synchronously_from_event_loop():
+            return fetch_page(url="c")
+
+        assert asyncio.run(call_synchronously_from_event_loop()) == "Content of c"
+
+    def test_acall_runs_sync_tool_in_thread(self):
+        @tool
+        def add_one(number: int) -> int:
+            """Adds one.
+
+            Args:
+                number: The number.
+            """
+            return number + 1
+
+        assert asyncio.run(add_one.acall({"number": 1})) == 2
+
+
+class CountingTool(Tool):
+    name = "counting_tool"
+    description = "Returns its query in a list, along with the number of calls so far."
+    inputs = {
+        "query": {"type": "string", "description": "The query."},
+        "limit": {"type": "integer", "description": "A limit.", "nullable": True},
+    }
+    output_type = "object"
+    cacheable = True
+    cache_max_size = 2
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def forward(self, query: str, limit: Optional[int] = None):
+        self.calls += 1
+        if query == "error":
+            raise ValueError("Failed query")
+        return [query, self.calls]
+
+
+class TestToolResultCache:
+    @pytest.fixture(autouse=True)
+    def cache(self, monkeypatch):
+        cache = ToolResultCache()
+        monkeypatch.setattr("smolagents.tools.TOOL_RESULT_CACHE", cache)
+        return cache
+
+    def test_results_are_reused(self, cache):
+        counting_tool = CountingTool()
+        assert counting_tool("a", 1) == ["a", 1]
+        assert counting_tool(limit=1, query="a") == ["a", 1]
+        assert counting_tool({"query": "a", "limit": 1}, sanitize_inputs_outputs=True) == ["a", 1]
+        assert counting_tool("a") == ["a", 2]
+        assert cache.stats() == {"counting_tool": {"hits": 2, "misses": 2, "size": 2}}
+
+    def test_results_are_copied(self):
+        counting_tool = CountingTool()
+        counting_tool("a").append("mutated")
+        assert counting_tool("a") == ["a", 1]
+
+    def test_least_recently_used_results_are_evicted(self):
+        counting_tool = CountingTool()
+        counting_tool("a")
+        counting_tool("b")
+        counting_tool("a")
+        counting_tool("c")
+        assert counting_tool("a") == ["a", 1]
+        assert counting_tool("b") == ["b", 4]
+
+    def test_results_expire(self, monkeypatch):
+        counting_tool = CountingTool()
+        counting_tool.cache_ttl = 10
+        current_time = 1000.0
+        monkeypatch.setattr("smolagents.tools.time.time", lambda: current_time)
+        counting_tool("a")
+        current_time += 5
+        assert counting_tool("a") == ["a", 1]
+        current_time += 10
+        assert counting_tool("a") == ["a", 2]
+
+    def test_errors_and_uncacheable_tools_are_not_cached(self, cache):
+        counting_tool = CountingTool()
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                counting_tool("error")
+        assert counting_tool.calls == 2
+        counting_tool.cacheable = False
+        counting_tool("a")
+        assert counting_tool("a") == ["a", 4]
+        assert cache.stats()["counting_tool"]["misses"] == 2
+
+    def test_tools_configured_differently_do_not_share_results(self):
+        class PrefixTool(Tool):
+            name = "prefix_tool"
+            description = "Prefixes its query."
+            inputs = {"query": {"type": "string", "description": "The query."}}
+            output_type = "string"
+            cacheable = True
+
+            def __init__(self, prefix: str = ""):
+                super().__init__()
+                self.prefix = prefix
+
+            def forward(self, query: str):
+                return self.prefix + query
+
+        assert PrefixTool("a-")("x") == "a-x"
+        assert PrefixTool(prefix="b-")("x") == "b-x"
+        assert PrefixTool()("x") == "x"
+        assert PrefixTool(prefix="")("x") == "x"
+        PrefixTool.cache_key_attributes = ["prefix"]
+        tool = PrefixTool("c-")
+        tool.prefix = "d-"
+        assert tool("x") == "d-x"
+
+    def test_tools_implemented_differently_do_not_share_results(self):
+        class OtherCountingTool(CountingTool):
+            def forward(self, query: str, limit: Optional[int] = None):
+                return [query, "other"]
+
+        def first_module():
+            @tool
+            def suffix_tool(query: str) -> str:
+                """Suffixes its query.
+
+                Args:
+                    query: The query.
+                """
+                return query + "-first"
+
+            return suffix_tool
+
+        def second_module():
+            @tool
+            def suffix_tool(query: str) -> str:
+                """Suffixes its query.
+
+                Args:
+                    query: The query.
+                """
+                return query + "-second"
+
+            return suffix_tool
+
+        assert CountingTool()("a") == ["a", 1]
+        assert OtherCountingTool()("a") == ["a", "other"]
+        for make_tool in [first_module, second_module]:
+            suffix_tool = make_tool()
+            suffix_tool.cacheable = True
+            assert suffix_tool("x") == "x-" + make_tool.__name__.split("_")[0]
+
+    def test_disk_cache_is_shared(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("smolagents.tools.TOOL_RESULT_CACHE", ToolResultCache(directory=str(tmp_path)))
+        CountingTool()("a")
+        monkeypatch.setattr("smolagents.tools.TOOL_RESULT_CACHE", ToolResultCache(directory=str(tmp_path)))
+        assert CountingTool()("a") == ["a", 1]
+        assert len(list((tmp_path / "counting_tool").iterdir())) == 1
+
 
 @pytest.fixture
 def mock_server_parameters():